@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import logging
+import string
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import reserve_id_block
+
+
+logger = logging.getLogger(__name__)
+
+# short_name уникален без учёта регистра, поэтому алфавит только из строчных букв:
+# в base62 "a" и "A" дали бы одно и то же имя
+BASE36_ALPHABET = string.digits + string.ascii_lowercase
+SCRAMBLED_LENGTH = 7
+SCRAMBLED_SPACE = len(BASE36_ALPHABET) ** SCRAMBLED_LENGTH
+FEISTEL_ROUNDS = 6
+
+
+def encode_base36(value: int, length: int = 0) -> str:
+    if value < 0:
+        raise ValueError("value must be non-negative")
+
+    digits = []
+    while value:
+        value, remainder = divmod(value, len(BASE36_ALPHABET))
+        digits.append(BASE36_ALPHABET[remainder])
+    encoded = "".join(reversed(digits)) or BASE36_ALPHABET[0]
+    return encoded.rjust(length, BASE36_ALPHABET[0])
+
+
+def permute(value: int, key: bytes, space: int) -> int:
+    """Ключевая перестановка [0, space): сеть Фейстеля с обходом цикла"""
+    # Сеть работает на 2^(2*half) значений, то есть на большем диапазоне, чем space;
+    # результаты за его пределами прогоняются через сеть ещё раз, пока не попадут
+    # внутрь. Перестановка остаётся биекцией на [0, space), а в среднем нужно
+    # меньше четырёх проходов
+    half = ((space - 1).bit_length() + 1) // 2
+    mask = (1 << half) - 1
+    while True:
+        left, right = value >> half, value & mask
+        for round_index in range(FEISTEL_ROUNDS):
+            digest = hashlib.blake2b(
+                round_index.to_bytes(1, "big") + right.to_bytes(8, "big"), key=key, digest_size=8
+            ).digest()
+            left, right = right, left ^ (int.from_bytes(digest, "big") & mask)
+        value = left << half | right
+        if value < space:
+            return value
+
+
+class ShortNameAllocator:
+    """Выдаёт короткие имена из блоков последовательности, зарезервированных в БД"""
+
+    sequence_name = "short_names"
+
+    def __init__(self, block_size: int = 1000, scramble: bool = True, secret: str = ""):
+        self.block_size = block_size
+        self.scramble = scramble
+        self.reserved_blocks = 0
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+        self._key = hashlib.sha256(secret.encode()).digest()
+
+    def encode(self, value: int) -> str:
+        # Перестановка [0, 36^7) взаимно однозначна, поэтому перемешанные имена
+        # не пересекаются; за пределами этого диапазона имена длиннее 7 символов
+        # и тоже не совпадают с перемешанными
+        if self.scramble and value < SCRAMBLED_SPACE:
+            value = permute(value, self._key, SCRAMBLED_SPACE)
+            return encode_base36(value, SCRAMBLED_LENGTH)
+        return encode_base36(value)
+
+    async def allocate(self, session: AsyncSession) -> str:
+        while self._next >= self._end:
+            async with self._lock:
+                if self._next >= self._end:
+                    self._next, self._end = await reserve_id_block(
+                        session, self.sequence_name, self.block_size
+                    )
+                    self.reserved_blocks += 1
+                    logger.info(f"Reserved short name block [{self._next}, {self._end})")
+
+        value = self._next
+        self._next += 1
+        return self.encode(value)
+
+    def reset(self) -> None:
+        self._next = 0
+        self._end = 0
+        self.reserved_blocks = 0
+
+    def stats(self) -> dict:
+        return {
+            "block_size": self.block_size,
+            "scramble": self.scramble,
+            "reserved_blocks": self.reserved_blocks,
+            "remaining_in_block": max(self._end - self._next, 0),
+        }
+
+
+short_name_allocator = ShortNameAllocator(
+    block_size=settings.short_name_block_size,
+    scramble=settings.short_name_scramble,
+    secret=settings.short_name_secret,
+)
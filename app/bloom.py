@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import count_links, iter_short_names, read_engine
+from app.models import short_name_key
+
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Битовый Bloom-фильтр с двойным хешированием"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        array = self._array
+        return all(
+            array[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    def false_positive_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+class ShortNameFilter:
+    """Bloom-фильтр существующих short_name, отсекающий заведомо несуществующие ссылки"""
+
+    def __init__(self, error_rate: float = 0.001, min_capacity: int = 100_000):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.rejected = 0
+        self.removed_since_rebuild = 0
+        self.last_rebuild_seconds: float | None = None
+        self._filter: BloomFilter | None = None
+        # Имена, добавленные во время каждой из идущих перестроек: перестройки могут
+        # пересекаться (переполнение, шина изменений, админский эндпоинт)
+        self._rebuild_adds: list[list[str]] = []
+        self._rebuild_task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def might_contain(self, short_name: str) -> bool:
+        if self._filter is None:
+            return True
+        if short_name_key(short_name) in self._filter:
+            return True
+        self.rejected += 1
+        return False
+
+    def add(self, short_name: str) -> None:
+        key = short_name_key(short_name)
+        for adds in self._rebuild_adds:
+            adds.append(key)
+        if self._filter is not None:
+            self._filter.add(key)
+            self._schedule_rebuild()
+
+    def remove(self, short_name: str) -> None:
+        # Из Bloom-фильтра нельзя удалить элемент: удалённое имя остаётся
+        # ложноположительным до следующей перестройки
+        self.removed_since_rebuild += 1
+        self._schedule_rebuild()
+
+    def _schedule_rebuild(self) -> None:
+        if not self.needs_rebuild:
+            return
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+        logger.info("Short name filter is saturated, scheduling rebuild")
+        self._rebuild_task = asyncio.create_task(self.rebuild())
+
+    @property
+    def needs_rebuild(self) -> bool:
+        if self._filter is None:
+            return False
+        return (
+            self._filter.count > self._filter.capacity
+            or self.removed_since_rebuild > self._filter.capacity // 2
+        )
+
+    async def _build(self, connection) -> BloomFilter:
+        total = await count_links(connection)
+        bloom = BloomFilter(capacity=max(self.min_capacity, total * 2), error_rate=self.error_rate)
+        async for short_name in iter_short_names(connection):
+            bloom.add(short_name_key(short_name))
+        return bloom
+
+    async def rebuild(self, session: AsyncSession | None = None) -> None:
+        started = time.perf_counter()
+        adds: list[str] = []
+        self._rebuild_adds.append(adds)
+        try:
+            if session is not None:
+                bloom = await self._build(session)
+            else:
+                async with read_engine.connect() as conn:
+                    bloom = await self._build(conn)
+            for key in adds:
+                bloom.add(key)
+        finally:
+            # По идентичности: у параллельных перестроек списки могут быть равны
+            self._rebuild_adds = [other for other in self._rebuild_adds if other is not adds]
+
+        self._filter = bloom
+        self.removed_since_rebuild = 0
+        self.last_rebuild_seconds = time.perf_counter() - started
+        logger.info(
+            f"Short name filter rebuilt with {bloom.count} names "
+            f"in {self.last_rebuild_seconds:.3f}s ({bloom.size_bytes} bytes)"
+        )
+
+    def reset(self) -> None:
+        self._filter = None
+        self._rebuild_task = None
+        self.rejected = 0
+        self.removed_since_rebuild = 0
+        self.last_rebuild_seconds = None
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        return {
+            "ready": bloom is not None,
+            "items": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "size_bytes": bloom.size_bytes if bloom else 0,
+            "hashes": bloom.hashes if bloom else 0,
+            "false_positive_rate": round(bloom.false_positive_rate(), 6) if bloom else None,
+            "target_false_positive_rate": self.error_rate,
+            "rejected": self.rejected,
+            "removed_since_rebuild": self.removed_since_rebuild,
+            "last_rebuild_seconds": self.last_rebuild_seconds,
+        }
+
+
+short_name_filter = ShortNameFilter(
+    error_rate=settings.short_name_filter_error_rate,
+    min_capacity=settings.short_name_filter_min_capacity,
+)
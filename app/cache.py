@@ -0,0 +1,130 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.config import settings
+from app.models import short_name_key
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class CachedLink:
+    link_id: int
+    original_url: str
+    expires_at: float
+
+
+class RedirectCache:
+    """LRU-кеш short_name -> original_url с ограничением по размеру и TTL
+
+    generation растёт при каждой инвалидации. Редирект запоминает его до запроса к БД
+    и передаёт в set(): если за время запроса ссылку изменили или удалили, прочитанное
+    значение может быть устаревшим и в кеш не попадает.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_fills = 0
+        self.generation = 0
+        self._entries: OrderedDict[str, CachedLink] = OrderedDict()
+        self._keys_by_id: dict[int, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, short_name: str) -> CachedLink | None:
+        if not self.enabled:
+            return None
+
+        key = short_name_key(short_name)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(
+        self, short_name: str, link_id: int, original_url: str, generation: int | None = None
+    ) -> None:
+        if not self.enabled:
+            return
+        if generation is not None and generation != self.generation:
+            self.stale_fills += 1
+            return
+
+        key = short_name_key(short_name)
+        self._remove(key)
+        self._entries[key] = CachedLink(
+            link_id=link_id,
+            original_url=original_url,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._keys_by_id[link_id] = key
+
+        while len(self._entries) > self.maxsize:
+            oldest_key, oldest = self._entries.popitem(last=False)
+            self._drop_reverse(oldest_key, oldest)
+            self.evictions += 1
+
+    def invalidate(self, link_id: int | None = None, short_name: str | None = None) -> None:
+        self.generation += 1
+        if link_id is not None:
+            key = self._keys_by_id.get(link_id)
+            if key is not None:
+                self._remove(key)
+        if short_name is not None:
+            self._remove(short_name_key(short_name))
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._keys_by_id.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_fills = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_fills": self.stale_fills,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._drop_reverse(key, entry)
+
+    def _drop_reverse(self, key: str, entry: CachedLink) -> None:
+        if self._keys_by_id.get(entry.link_id) == key:
+            del self._keys_by_id[entry.link_id]
+
+
+redirect_cache = RedirectCache(
+    maxsize=settings.redirect_cache_size,
+    ttl=settings.redirect_cache_ttl,
+)
@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import (
+    async_session_maker,
+    compact_click_rollups,
+    compact_link_counter,
+    record_clicks,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClickTracker:
+    """Копит клики в памяти и пачками сбрасывает их в БД из фоновой задачи"""
+
+    def __init__(
+        self,
+        flush_interval: float = 1.0,
+        flush_threshold: int = 1000,
+        minute_retention: timedelta = timedelta(hours=24),
+        compaction_interval: float = 600.0,
+    ):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.minute_retention = minute_retention
+        self.compaction_interval = compaction_interval
+        # Первое сжатие через интервал после старта, а не сразу во всех воркерах
+        self.last_compaction = time.monotonic()
+        self.flushed_clicks = 0
+        self.flushes = 0
+        self._pending: dict[int, list] = {}
+        self._pending_total = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def record(self, link_id: int) -> None:
+        now = datetime.utcnow()
+        minute = now.replace(second=0, microsecond=0)
+        entry = self._pending.get(link_id)
+        if entry is None:
+            self._pending[link_id] = [1, now, {minute: 1}]
+        else:
+            entry[0] += 1
+            entry[1] = now
+            minutes = entry[2]
+            minutes[minute] = minutes.get(minute, 0) + 1
+
+        self._pending_total += 1
+        if self._pending_total >= self.flush_threshold:
+            self._wakeup.set()
+
+    def pending(self, link_id: int) -> tuple[int, datetime | None]:
+        entry = self._pending.get(link_id)
+        if entry is None:
+            return 0, None
+        return entry[0], entry[1]
+
+    def discard(self, link_id: int) -> None:
+        entry = self._pending.pop(link_id, None)
+        if entry is not None:
+            self._pending_total -= entry[0]
+
+    async def flush(self, session: AsyncSession | None = None) -> int:
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, {}
+        total, self._pending_total = self._pending_total, 0
+        deltas = [(link_id, entry[0], entry[1]) for link_id, entry in batch.items()]
+        buckets = [
+            (link_id, minute, count)
+            for link_id, entry in batch.items()
+            for minute, count in entry[2].items()
+        ]
+
+        try:
+            if session is None:
+                async with async_session_maker() as own_session:
+                    await record_clicks(own_session, deltas, buckets)
+            else:
+                await record_clicks(session, deltas, buckets)
+        except BaseException:
+            # Отмена задачи тоже не должна терять клики
+            self._restore(batch)
+            raise
+
+        self.flushes += 1
+        self.flushed_clicks += total
+        logger.debug(f"Flushed {total} clicks for {len(deltas)} links")
+        return total
+
+    def _restore(self, batch: dict[int, list]) -> None:
+        for link_id, (count, accessed_at, minutes) in batch.items():
+            entry = self._pending.setdefault(link_id, [0, accessed_at, {}])
+            entry[0] += count
+            entry[1] = max(entry[1], accessed_at)
+            for minute, minute_count in minutes.items():
+                entry[2][minute] = entry[2].get(minute, 0) + minute_count
+            self._pending_total += count
+
+    async def compact(self, session: AsyncSession | None = None) -> int:
+        cutoff = (datetime.utcnow() - self.minute_retention).replace(
+            minute=0, second=0, microsecond=0
+        )
+        self.last_compaction = time.monotonic()
+        if session is not None:
+            return await compact_click_rollups(session, cutoff)
+        async with async_session_maker() as own_session:
+            return await compact_click_rollups(own_session, cutoff)
+
+    async def run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush clicks: {e}", exc_info=True)
+
+            if time.monotonic() - self.last_compaction >= self.compaction_interval:
+                try:
+                    await self.compact()
+                except Exception as e:
+                    logger.error(f"Failed to compact click rollups: {e}", exc_info=True)
+                # Тот же период обслуживания складывает изменения счётчика ссылок
+                try:
+                    async with async_session_maker() as session:
+                        await compact_link_counter(session)
+                except Exception as e:
+                    logger.error(f"Failed to compact links row counter: {e}", exc_info=True)
+
+    def start(self) -> None:
+        if self._task is None:
+            logger.info("Starting click tracker")
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        logger.info("Flushing remaining clicks")
+        await self.flush()
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._pending_total = 0
+        self.flushed_clicks = 0
+        self.flushes = 0
+
+    def stats(self) -> dict:
+        return {
+            "pending_clicks": self._pending_total,
+            "pending_links": len(self._pending),
+            "flushed_clicks": self.flushed_clicks,
+            "flushes": self.flushes,
+            "minute_retention_hours": self.minute_retention.total_seconds() / 3600,
+        }
+
+
+click_tracker = ClickTracker(
+    flush_interval=settings.click_flush_interval_ms / 1000,
+    flush_threshold=settings.click_flush_threshold,
+    minute_retention=timedelta(hours=settings.click_minute_retention_hours),
+    compaction_interval=settings.click_compaction_interval,
+)
@@ -9,5 +9,65 @@ class Settings(BaseSettings):
     app_version: str = "1.0.0"
     debug: bool = os.getenv("DEBUG", "False").lower() == "true"
 
+    db_init_on_startup: bool = os.getenv("DB_INIT_ON_STARTUP", "True").lower() == "true"
+
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", "0"))
+    uvicorn_socket: str = os.getenv("UVICORN_SOCKET", "/run/uvicorn/uvicorn.sock")
+    uvicorn_keepalive_timeout: int = int(os.getenv("UVICORN_KEEPALIVE_TIMEOUT", "75"))
+
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"
+
+    sqlite_tuned: bool = os.getenv("SQLITE_TUNED", "True").lower() == "true"
+    sqlite_read_pool_size: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+    sqlite_busy_timeout: int = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+    sqlite_cache_size: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))
+
+    click_flush_interval_ms: int = int(os.getenv("CLICK_FLUSH_INTERVAL_MS", "1000"))
+    click_flush_threshold: int = int(os.getenv("CLICK_FLUSH_THRESHOLD", "1000"))
+    click_minute_retention_hours: int = int(os.getenv("CLICK_MINUTE_RETENTION_HOURS", "24"))
+    click_compaction_interval: int = int(os.getenv("CLICK_COMPACTION_INTERVAL", "600"))
+
+    short_name_block_size: int = int(os.getenv("SHORT_NAME_BLOCK_SIZE", "1000"))
+    short_name_scramble: bool = os.getenv("SHORT_NAME_SCRAMBLE", "True").lower() == "true"
+    short_name_secret: str = os.getenv("SHORT_NAME_SECRET", "")
+
+    short_name_filter_error_rate: float = float(os.getenv("SHORT_NAME_FILTER_ERROR_RATE", "0.001"))
+    short_name_filter_min_capacity: int = int(os.getenv("SHORT_NAME_FILTER_MIN_CAPACITY", "100000"))
+
+    bulk_chunk_size: int = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+    export_batch_size: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    import_batch_size: int = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+    import_transaction_size: int = int(os.getenv("IMPORT_TRANSACTION_SIZE", "100000"))
+
+    link_count_mode: str = os.getenv("LINK_COUNT_MODE", "counter")
+    link_count_estimate_threshold: int = int(os.getenv("LINK_COUNT_ESTIMATE_THRESHOLD", "1000000"))
+
+    redirect_fast_path: bool = os.getenv("REDIRECT_FAST_PATH", "True").lower() == "true"
+    redirect_cache_size: int = int(os.getenv("REDIRECT_CACHE_SIZE", "10000"))
+    redirect_cache_ttl: float = float(os.getenv("REDIRECT_CACHE_TTL", "300"))
+
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    metrics_dir: str = os.getenv("METRICS_DIR", "")
+    metrics_flush_interval: float = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+    slow_query_log: bool = os.getenv("SLOW_QUERY_LOG", "True").lower() == "true"
+    slow_query_threshold_ms: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+    slow_query_log_size: int = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+    slow_query_explain: bool = os.getenv("SLOW_QUERY_EXPLAIN", "True").lower() == "true"
+
+    profiling_token: str = os.getenv("PROFILING_TOKEN", "")
+    profiling_sample_rate: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    profiling_store_size: int = int(os.getenv("PROFILING_STORE_SIZE", "20"))
+    profiling_dir: str = os.getenv("PROFILING_DIR", "")
+
+    invalidation_bus: bool = os.getenv("INVALIDATION_BUS", "True").lower() == "true"
+    invalidation_poll_interval_ms: int = int(os.getenv("INVALIDATION_POLL_INTERVAL_MS", "500"))
+    invalidation_retention: int = int(os.getenv("INVALIDATION_RETENTION", "3600"))
+
 
 settings = Settings()
@@ -1,12 +1,33 @@
+import json
 import logging
-from collections.abc import AsyncGenerator
-
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.pool import NullPool, StaticPool
+from collections.abc import AsyncGenerator, AsyncIterator
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Text, bindparam, case, cast, delete, event, inspect, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Row
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import StaticPool
 from sqlmodel import SQLModel, func, select
 
 from app.config import settings
-from app.models import ShortenedLink
+from app.models import (
+    POSTGRES_ONLY_INDEXES,
+    ClickRollup,
+    IdSequence,
+    LinkChange,
+    RowCount,
+    RowCountDelta,
+    ShortenedLink,
+    short_name_lower_index,
+)
+from app.pool import InstrumentedAsyncQueuePool
 
 
 logger = logging.getLogger(__name__)
@@ -36,56 +57,301 @@ async_database_url = get_async_database_url(settings.database_url)
 
 logger.info(f"Using database: {async_database_url[:50]}...")
 
-if async_database_url.startswith("sqlite"):
-    engine = create_async_engine(
-        async_database_url,
+
+def _is_memory_sqlite(url: str) -> bool:
+    return ":memory:" in url or url.rstrip("/").endswith("sqlite+aiosqlite:")
+
+
+def apply_sqlite_pragmas(dbapi_connection, read_only: bool = False) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout)}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def create_sqlite_engines(url: str) -> tuple[AsyncEngine, AsyncEngine]:
+    if _is_memory_sqlite(url) or not settings.sqlite_tuned:
+        shared = create_async_engine(
+            url,
+            echo=False,
+            future=True,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        return shared, shared
+
+    # В WAL читатели не блокируются писателем, поэтому держим одно соединение
+    # для записи и небольшой пул соединений только для чтения
+    writer = create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        connect_args={"check_same_thread": False},
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.db_pool_timeout,
+    )
+    reader = create_async_engine(
+        url,
         echo=False,
         future=True,
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=settings.sqlite_read_pool_size,
+        max_overflow=0,
+        pool_timeout=settings.db_pool_timeout,
+    )
+
+    event.listen(
+        writer.sync_engine, "connect", lambda dbapi_conn, _: apply_sqlite_pragmas(dbapi_conn)
+    )
+    event.listen(
+        reader.sync_engine,
+        "connect",
+        lambda dbapi_conn, _: apply_sqlite_pragmas(dbapi_conn, read_only=True),
     )
+    return writer, reader
+
+
+if async_database_url.startswith("sqlite"):
+    engine, read_engine = create_sqlite_engines(async_database_url)
 else:
     engine = create_async_engine(
         async_database_url,
         echo=False,
         future=True,
-        pool_pre_ping=True,
-        poolclass=NullPool,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
     )
+    read_engine = engine
+
+
+def _index_exists(conn: Connection, name: str) -> bool:
+    # Рефлексия SQLite пропускает индексы по выражениям, поэтому смотрим в каталог напрямую
+    if conn.dialect.name == "sqlite":
+        statement = text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name")
+    elif conn.dialect.name == "postgresql":
+        statement = text("SELECT 1 FROM pg_indexes WHERE indexname = :name")
+    else:
+        return name in {index["name"] for index in inspect(conn).get_indexes("links")}
+    return conn.execute(statement, {"name": name}).first() is not None
+
+
+def _add_missing_columns(conn: Connection) -> None:
+    existing_columns = {column["name"] for column in inspect(conn).get_columns("links")}
+    for column in ShortenedLink.__table__.columns:
+        if column.name in existing_columns:
+            continue
+        ddl = f"ALTER TABLE links ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+        if column.server_default is not None:
+            ddl += f" DEFAULT {column.server_default.arg}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+        logger.info(f"Adding column links.{column.name}")
+        conn.execute(text(ddl))
+
+
+def _deferrable_indexes(conn: Connection):
+    return [
+        index
+        for index in ShortenedLink.__table__.indexes
+        if not index.unique
+        and (conn.dialect.name == "postgresql" or index.name not in POSTGRES_ONLY_INDEXES)
+    ]
+
+
+def _create_missing_indexes(conn: Connection) -> list[str]:
+    created = []
+    for index in _deferrable_indexes(conn):
+        if not _index_exists(conn, index.name):
+            logger.info(f"Creating index {index.name}")
+            index.create(conn)
+            created.append(index.name)
+    return created
+
+
+SQLITE_COUNT_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS links_count_insert AFTER INSERT ON links BEGIN "
+    "UPDATE row_counts SET value = value + 1 WHERE name = 'links'; END",
+    "CREATE TRIGGER IF NOT EXISTS links_count_delete AFTER DELETE ON links BEGIN "
+    "UPDATE row_counts SET value = value - 1 WHERE name = 'links'; END",
+)
+
+# В PostgreSQL триггер уровня оператора добавляет строку в row_count_deltas, а не
+# обновляет row_counts: UPDATE единственной строки держал бы её блокировку до COMMIT,
+# и импорт или массовая вставка останавливали бы все остальные записи в links.
+# Оператор, не изменивший ни одной строки (конфликт ON CONFLICT DO NOTHING), ничего не пишет
+POSTGRES_COUNT_FUNCTIONS = (
+    "CREATE OR REPLACE FUNCTION links_count_insert() RETURNS trigger LANGUAGE plpgsql AS $$ "
+    "BEGIN INSERT INTO row_count_deltas (name, delta) "
+    "SELECT 'links', count(*) FROM new_rows HAVING count(*) > 0; RETURN NULL; END $$",
+    "CREATE OR REPLACE FUNCTION links_count_delete() RETURNS trigger LANGUAGE plpgsql AS $$ "
+    "BEGIN INSERT INTO row_count_deltas (name, delta) "
+    "SELECT 'links', -count(*) FROM old_rows HAVING count(*) > 0; RETURN NULL; END $$",
+)
+POSTGRES_COUNT_TRIGGERS = {
+    "links_count_insert": "CREATE TRIGGER links_count_insert AFTER INSERT ON links "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION links_count_insert()",
+    "links_count_delete": "CREATE TRIGGER links_count_delete AFTER DELETE ON links "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION links_count_delete()",
+}
+
+
+def _postgres_count_trigger_statements(conn: Connection) -> list[str]:
+    # CREATE/DROP TRIGGER блокирует links для записи и ждёт долгих транзакций вроде
+    # выгрузки, поэтому при рестарте создаём только отсутствующие триггеры
+    existing = set(
+        conn.execute(
+            text(
+                "SELECT tgname FROM pg_trigger "
+                "WHERE tgrelid = 'links'::regclass AND tgname = ANY(:names)"
+            ),
+            {"names": list(POSTGRES_COUNT_TRIGGERS)},
+        ).scalars()
+    )
+    return [
+        *POSTGRES_COUNT_FUNCTIONS,
+        *(ddl for name, ddl in POSTGRES_COUNT_TRIGGERS.items() if name not in existing),
+    ]
+
+
+def _install_count_triggers(conn: Connection) -> None:
+    """Счётчик строк links, который триггеры обновляют в той же транзакции"""
+    if conn.dialect.name == "sqlite":
+        statements = SQLITE_COUNT_TRIGGERS
+    elif conn.dialect.name == "postgresql":
+        statements = _postgres_count_trigger_statements(conn)
+    else:
+        return
+    # Триггеры ставятся до подсчёта: блокировка links держится до конца транзакции,
+    # поэтому вставки между COUNT и созданием триггера невозможны
+    for statement in statements:
+        conn.execute(text(statement))
+
+    counts = RowCount.__table__
+    if conn.execute(select(counts.c.value).where(counts.c.name == "links")).first() is None:
+        total = conn.execute(select(func.count()).select_from(ShortenedLink.__table__)).scalar()
+        logger.info(f"Initializing links row counter with {total}")
+        conn.execute(counts.insert().values(name="links", value=total))
+
+
+def _recreate_link_changes(conn: Connection) -> None:
+    """Пересоздаёт журнал изменений SQLite, созданный без AUTOINCREMENT"""
+    if conn.dialect.name != "sqlite":
+        return
+    ddl = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'link_changes'")
+    ).scalar()
+    if ddl is None or "AUTOINCREMENT" in ddl.upper():
+        return
+    # Журнал временный: воркеры замечают сброс нумерации и перечитывают состояние
+    logger.info("Recreating link_changes with AUTOINCREMENT ids")
+    LinkChange.__table__.drop(conn)
+    LinkChange.__table__.create(conn)
+
+
+def migrate_schema(conn: Connection) -> None:
+    """Доводит существующую схему до текущей модели (create_all не трогает старые таблицы)"""
+    _recreate_link_changes(conn)
+    _add_missing_columns(conn)
+    _create_missing_indexes(conn)
+    _install_count_triggers(conn)
+
+    if not _index_exists(conn, short_name_lower_index.name):
+        lowered = func.lower(ShortenedLink.short_name)
+        duplicates = conn.execute(
+            select(lowered).group_by(lowered).having(func.count() > 1).limit(10)
+        ).all()
+        if duplicates:
+            names = ", ".join(row[0] for row in duplicates)
+            logger.error(
+                f"Cannot create {short_name_lower_index.name}: short names differ only by case "
+                f"({names}). Rename them and restart to enable index lookups."
+            )
+        else:
+            logger.info(f"Creating index {short_name_lower_index.name}")
+            short_name_lower_index.create(conn)
 
 
 async def init_db():
     try:
         async with engine.begin() as conn:
             await conn.run_sync(SQLModel.metadata.create_all)
+            await conn.run_sync(migrate_schema)
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}", exc_info=True)
         raise
 
 
+def _dialect_name(executor: AsyncSession | AsyncConnection) -> str:
+    if isinstance(executor, AsyncConnection):
+        return executor.dialect.name
+    return executor.get_bind().dialect.name
+
+
+def dialect_insert(session: AsyncSession, table):
+    """INSERT с поддержкой ON CONFLICT для текущего диалекта"""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+# Фабрики создаются один раз при импорте, а не на каждый запрос
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async_session_maker = async_sessionmaker(
-        engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
     async with async_session_maker() as session:
         yield session
 
 
+async def get_read_connection() -> AsyncGenerator[AsyncConnection, None]:
+    """Соединение для GET-запросов: Core-select возвращает строки без ORM-сессии и identity map"""
+    async with read_engine.connect() as connection:
+        yield connection
+
+
 async def get_link_by_short_name(session: AsyncSession, short_name: str) -> ShortenedLink | None:
     logger.debug(f"Fetching link with short_name: {short_name}")
-    statement = select(ShortenedLink).where(ShortenedLink.short_name.ilike(short_name))
+    statement = select(ShortenedLink).where(
+        func.lower(ShortenedLink.short_name) == func.lower(short_name)
+    )
     result = await session.execute(statement)
-    return result.scalar_one_or_none()
+    return result.scalars().first()
 
 
-async def get_link_by_id(session: AsyncSession, link_id: int) -> ShortenedLink | None:
+async def get_redirect_target(
+    connection: AsyncSession | AsyncConnection, short_name: str
+) -> tuple[int, str] | None:
+    """Только id и original_url без загрузки ORM-объекта — для быстрого пути редиректа"""
+    links = ShortenedLink.__table__
+    statement = select(links.c.id, links.c.original_url).where(
+        func.lower(links.c.short_name) == func.lower(short_name)
+    )
+    row = (await connection.execute(statement)).first()
+    return (row.id, row.original_url) if row else None
+
+
+async def get_link_by_id(connection: AsyncSession | AsyncConnection, link_id: int) -> Row | None:
     logger.debug(f"Fetching link with id: {link_id}")
-    statement = select(ShortenedLink).where(ShortenedLink.id == link_id)
-    result = await session.execute(statement)
-    return result.scalar_one_or_none()
+    links = ShortenedLink.__table__
+    statement = select(*links.c).where(links.c.id == link_id)
+    result = await connection.execute(statement)
+    return result.first()
 
 
 async def get_all_links(session: AsyncSession) -> list[ShortenedLink]:
@@ -95,50 +361,317 @@ async def get_all_links(session: AsyncSession) -> list[ShortenedLink]:
     return result.scalars().all()
 
 
+async def count_links(session: AsyncSession | AsyncConnection) -> int:
+    result = await session.execute(select(func.count(ShortenedLink.id)))
+    return result.scalar() or 0
+
+
+async def get_link_counter(session: AsyncSession | AsyncConnection) -> int | None:
+    counts = RowCount.__table__
+    deltas = RowCountDelta.__table__
+    pending = (
+        select(func.coalesce(func.sum(deltas.c.delta), 0))
+        .where(deltas.c.name == "links")
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        select(cast(counts.c.value + pending, BigInteger)).where(counts.c.name == "links")
+    )
+    return result.scalar()
+
+
+def _claim_count_deltas():
+    """DELETE ... RETURNING накопленных изменений счётчика для CTE (только PostgreSQL)"""
+    deltas = RowCountDelta.__table__
+    return deltas.delete().where(deltas.c.name == "links").returning(deltas.c.delta).cte("claimed")
+
+
+async def compact_link_counter(session: AsyncSession) -> None:
+    """Складывает накопленные изменения в row_counts одним запросом"""
+    if _dialect_name(session) != "postgresql":
+        return
+    counts = RowCount.__table__
+    claimed = _claim_count_deltas()
+    total = select(func.coalesce(func.sum(claimed.c.delta), 0)).scalar_subquery()
+    try:
+        await session.execute(
+            update(counts)
+            .where(counts.c.name == "links")
+            .values(value=counts.c.value + total)
+            .add_cte(claimed)
+        )
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to compact links row counter: {e}", exc_info=True)
+        raise
+
+
+async def refresh_link_counter(session: AsyncSession) -> int:
+    """Пересчитывает счётчик по COUNT(*), если он разошёлся с таблицей"""
+    logger.info("Refreshing links row counter")
+    counts = RowCount.__table__
+    total = select(func.count()).select_from(ShortenedLink.__table__).scalar_subquery()
+    statement = update(counts).where(counts.c.name == "links").values(value=total)
+    if _dialect_name(session) == "postgresql":
+        # Изменения удаляются тем же оператором, что и считает строки: оба видят
+        # один и тот же набор зафиксированных транзакций
+        statement = statement.add_cte(_claim_count_deltas())
+    try:
+        result = await session.execute(statement)
+        if result.rowcount == 0:
+            await session.execute(counts.insert().values(name="links", value=total))
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to refresh links row counter: {e}", exc_info=True)
+        raise
+    return await get_link_counter(session)
+
+
+async def _estimate_link_count(session: AsyncSession | AsyncConnection) -> int | None:
+    # reltuples обновляется VACUUM/ANALYZE; -1 означает, что статистики ещё нет
+    result = await session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'links'::regclass")
+    )
+    estimate = result.scalar()
+    if estimate is None or estimate < settings.link_count_estimate_threshold:
+        return None
+    return estimate
+
+
+async def total_link_count(session: AsyncSession | AsyncConnection, mode: str | None = None) -> int:
+    """Общее число ссылок: exact — COUNT(*), counter — счётчик, estimate — оценка планировщика"""
+    mode = mode or settings.link_count_mode
+    if mode == "estimate" and _dialect_name(session) == "postgresql":
+        estimate = await _estimate_link_count(session)
+        if estimate is not None:
+            return estimate
+    if mode in ("counter", "estimate"):
+        counter = await get_link_counter(session)
+        if counter is not None:
+            return counter
+    return await count_links(session)
+
+
+async def iter_short_names(
+    session: AsyncSession | AsyncConnection, batch_size: int = 10000
+) -> AsyncIterator[str]:
+    logger.info("Streaming all short names")
+    result = await session.stream(select(ShortenedLink.short_name))
+    async for partition in result.partitions(batch_size):
+        for row in partition:
+            yield row[0]
+
+
+async def iter_link_batches(
+    session: AsyncSession | AsyncConnection, batch_size: int = 1000
+) -> AsyncIterator[list]:
+    logger.info(f"Streaming all links in batches of {batch_size}")
+    links = ShortenedLink.__table__
+    statement = select(*links.c).order_by(links.c.id).execution_options(yield_per=batch_size)
+    result = await session.stream(statement)
+    async for partition in result.partitions(batch_size):
+        yield partition
+
+
 async def get_paginated_links(
-    session: AsyncSession, start: int = 0, end: int = 10
-) -> tuple[list[ShortenedLink], int]:
-    logger.info(f"Fetching paginated links: start={start}, end={end}")
-    count_statement = select(func.count(ShortenedLink.id))
-    count_result = await session.execute(count_statement)
-    total = count_result.scalar() or 0
-
-    statement = select(ShortenedLink).order_by(ShortenedLink.id).offset(start).limit(end - start)
+    session: AsyncSession | AsyncConnection,
+    start: int = 0,
+    end: int | None = 10,
+    after_id: int | None = None,
+    conditions: list | None = None,
+    sort_field: str = "id",
+    descending: bool = False,
+) -> tuple[list[Row], int]:
+    logger.info(
+        f"Fetching paginated links: start={start}, end={end}, after_id={after_id}, "
+        f"sort={sort_field} {'DESC' if descending else 'ASC'}"
+    )
+    if conditions:
+        count_statement = select(func.count(ShortenedLink.id)).where(*conditions)
+        count_result = await session.execute(count_statement)
+        total = count_result.scalar() or 0
+    else:
+        total = await total_link_count(session)
+    conditions = conditions or []
+
+    columns = ShortenedLink.__table__.c
+    # id добавляется вторым ключом, чтобы порядок страниц был однозначным
+    order_columns = [columns[sort_field]]
+    if sort_field != "id":
+        order_columns.append(columns.id)
+    order = [column.desc() if descending else column.asc() for column in order_columns]
+    statement = select(*columns).where(*conditions).order_by(*order)
+    if after_id is not None:
+        # Keyset-пагинация: стоимость не зависит от глубины страницы
+        statement = statement.where(columns.id < after_id if descending else columns.id > after_id)
+    elif start:
+        statement = statement.offset(start)
+    if end is not None:
+        statement = statement.limit(max(end - start, 0))
+
     result = await session.execute(statement)
-    links = result.scalars().all()
+    links = result.all()
 
     logger.info(f"Found {len(links)} links out of {total} total")
     return links, total
 
 
-async def create_link(session: AsyncSession, link: ShortenedLink) -> ShortenedLink:
+async def create_link(
+    session: AsyncSession, link: ShortenedLink, change_origin: str | None = None
+) -> ShortenedLink | None:
     logger.info(f"Creating link with short_name: {link.short_name}")
+    links = ShortenedLink.__table__
+    # Один запрос вместо SELECT + INSERT + refresh; конфликт по любому
+    # уникальному индексу (в т.ч. lower(short_name)) возвращает пустой результат
+    statement = (
+        dialect_insert(session, links)
+        .values(**link.model_dump(exclude={"id"}))
+        .on_conflict_do_nothing()
+        .returning(*links.c)
+    )
+    # В PostgreSQL NOTIFY идёт в том же запросе, создание остаётся одним обращением к БД
+    notify = change_origin is not None and _dialect_name(session) == "postgresql"
+    if notify:
+        statement = _notify_created(statement, change_origin)
     try:
-        session.add(link)
+        row = (await session.execute(statement)).first()
+        if row is not None and not notify:
+            await stage_link_changes(session, change_origin, [("created", row.id, row.short_name)])
         await session.commit()
-        await session.refresh(link)
+        if row is None:
+            logger.warning(f"Short name already exists: {link.short_name}")
+            return None
         logger.info(f"Link created successfully: {link.short_name}")
-        return link
+        return ShortenedLink(**{key: row._mapping[key] for key in links.c.keys()})
     except Exception as e:
         await session.rollback()
         logger.error(f"Failed to create link: {e}", exc_info=True)
         raise
 
 
+async def bulk_create_links(
+    session: AsyncSession, rows: list[dict], change_origin: str | None = None
+) -> list[tuple[int, str]]:
+    logger.info(f"Bulk creating {len(rows)} links")
+    links = ShortenedLink.__table__
+    statement = (
+        dialect_insert(session, links)
+        .values(rows)
+        .on_conflict_do_nothing()
+        .returning(links.c.id, links.c.short_name)
+    )
+    try:
+        result = await session.execute(statement)
+        created = [(row.id, row.short_name) for row in result]
+        await stage_link_changes(
+            session, change_origin, [("created", link_id, name) for link_id, name in created]
+        )
+        await session.commit()
+        logger.info(f"Bulk created {len(created)} of {len(rows)} links")
+        return created
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to bulk create links: {e}", exc_info=True)
+        raise
+
+
+IMPORT_COLUMNS = ("short_name", "original_url", "created_at", "clicks")
+
+
+async def _copy_links(session: AsyncSession, rows: list[dict]) -> int:
+    # COPY во временную таблицу и один INSERT ... SELECT: конфликты по уникальным
+    # индексам отбрасываются на стороне сервера
+    await session.execute(
+        text(
+            "CREATE TEMP TABLE IF NOT EXISTS links_import "
+            "(short_name VARCHAR(255), original_url VARCHAR(2048), "
+            "created_at TIMESTAMP, clicks INTEGER) ON COMMIT DELETE ROWS"
+        )
+    )
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        "links_import",
+        records=[tuple(row[column] for column in IMPORT_COLUMNS) for row in rows],
+        columns=IMPORT_COLUMNS,
+    )
+    columns = ", ".join(IMPORT_COLUMNS)
+    result = await session.execute(
+        text(
+            f"INSERT INTO links ({columns}) SELECT {columns} FROM links_import "
+            "ON CONFLICT DO NOTHING"
+        )
+    )
+    await session.execute(text("TRUNCATE links_import"))
+    return result.rowcount
+
+
+async def import_links(session: AsyncSession, rows: list[dict]) -> int:
+    """Загружает пачку ссылок в текущую транзакцию без commit; возвращает число вставленных"""
+    logger.debug(f"Importing {len(rows)} links")
+    try:
+        if session.get_bind().dialect.name == "postgresql":
+            return await _copy_links(session, rows)
+        statement = dialect_insert(session, ShortenedLink.__table__).on_conflict_do_nothing()
+        result = await session.execute(statement, rows)
+        return result.rowcount
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to import links: {e}", exc_info=True)
+        raise
+
+
+async def drop_deferrable_indexes(session: AsyncSession) -> list[str]:
+    """Удаляет неуникальные индексы links перед массовой загрузкой"""
+
+    def drop(conn: Connection) -> list[str]:
+        dropped = []
+        for index in _deferrable_indexes(conn):
+            if _index_exists(conn, index.name):
+                logger.info(f"Dropping index {index.name} for import")
+                index.drop(conn)
+                dropped.append(index.name)
+        return dropped
+
+    connection = await session.connection()
+    dropped = await connection.run_sync(drop)
+    await session.commit()
+    return dropped
+
+
+async def create_deferred_indexes(session: AsyncSession) -> list[str]:
+    """Создаёт неуникальные индексы links, отсутствующие в БД"""
+    connection = await session.connection()
+    created = await connection.run_sync(_create_missing_indexes)
+    await session.commit()
+    return created
+
+
 async def update_link(
-    session: AsyncSession, link_id: int, original_url: str, short_name: str
+    session: AsyncSession,
+    link_id: int,
+    original_url: str,
+    short_name: str,
+    change_origin: str | None = None,
 ) -> ShortenedLink | None:
     logger.info(f"Updating link {link_id}")
+    statement = (
+        update(ShortenedLink)
+        .where(ShortenedLink.id == link_id)
+        .values(original_url=original_url, short_name=short_name)
+        .returning(ShortenedLink)
+    )
     try:
-        link = await get_link_by_id(session, link_id)
+        link = (await session.execute(statement)).scalar_one_or_none()
+        if link is not None:
+            await stage_link_changes(session, change_origin, [("updated", link_id, short_name)])
+        await session.commit()
         if not link:
             logger.warning(f"Link not found: {link_id}")
             return None
 
-        link.original_url = original_url
-        link.short_name = short_name
-        await session.commit()
-        await session.refresh(link)
         logger.info(f"Link updated successfully: {link_id}")
         return link
     except Exception as e:
@@ -147,19 +680,312 @@ async def update_link(
         raise
 
 
-async def delete_link(session: AsyncSession, link_id: int) -> bool:
+async def delete_link(
+    session: AsyncSession, link_id: int, change_origin: str | None = None
+) -> str | None:
     logger.info(f"Deleting link: {link_id}")
+    statement = (
+        delete(ShortenedLink).where(ShortenedLink.id == link_id).returning(ShortenedLink.short_name)
+    )
     try:
-        link = await get_link_by_id(session, link_id)
-        if not link:
+        short_name = (await session.execute(statement)).scalar_one_or_none()
+        if short_name is None:
+            await session.rollback()
             logger.warning(f"Link not found: {link_id}")
-            return False
+            return None
 
-        await session.delete(link)
+        await session.execute(
+            ClickRollup.__table__.delete().where(ClickRollup.__table__.c.link_id == link_id)
+        )
+        await stage_link_changes(session, change_origin, [("deleted", link_id, short_name)])
         await session.commit()
         logger.info(f"Link deleted successfully: {link_id}")
-        return True
+        return short_name
     except Exception as e:
         await session.rollback()
         logger.error(f"Failed to delete link: {e}", exc_info=True)
         raise
+
+
+async def delete_links(
+    session: AsyncSession, link_ids: list[int], change_origin: str | None = None
+) -> list[tuple[int, str]]:
+    logger.info(f"Deleting {len(link_ids)} links")
+    links = ShortenedLink.__table__
+    statement = (
+        links.delete().where(links.c.id.in_(link_ids)).returning(links.c.id, links.c.short_name)
+    )
+    try:
+        deleted = [(row.id, row.short_name) for row in await session.execute(statement)]
+        if deleted:
+            rollups = ClickRollup.__table__
+            await session.execute(
+                rollups.delete().where(rollups.c.link_id.in_([link_id for link_id, _ in deleted]))
+            )
+            await stage_link_changes(
+                session, change_origin, [("deleted", link_id, name) for link_id, name in deleted]
+            )
+        await session.commit()
+        logger.info(f"Deleted {len(deleted)} of {len(link_ids)} links")
+        return deleted
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to delete links: {e}", exc_info=True)
+        raise
+
+
+async def _upsert_rollups(session: AsyncSession, rows: list[dict]) -> None:
+    rollups = ClickRollup.__table__
+    statement = dialect_insert(session, rollups)
+    statement = statement.on_conflict_do_update(
+        index_elements=[rollups.c.link_id, rollups.c.granularity, rollups.c.bucket],
+        set_={"clicks": rollups.c.clicks + statement.excluded.clicks},
+    )
+    await session.execute(statement, rows)
+
+
+async def record_clicks(
+    session: AsyncSession,
+    deltas: list[tuple[int, int, datetime]],
+    buckets: list[tuple[int, datetime, int]] = (),
+) -> None:
+    logger.debug(f"Flushing clicks for {len(deltas)} links, {len(buckets)} minute buckets")
+    links = ShortenedLink.__table__
+    accessed_at = bindparam("accessed_at")
+    statement = (
+        update(links)
+        .where(links.c.id == bindparam("link_id"))
+        .values(
+            clicks=links.c.clicks + bindparam("delta"),
+            # Воркеры сбрасывают клики независимо: время последнего перехода не уменьшаем
+            last_accessed_at=case(
+                (links.c.last_accessed_at.is_(None), accessed_at),
+                (links.c.last_accessed_at < accessed_at, accessed_at),
+                else_=links.c.last_accessed_at,
+            ),
+        )
+    )
+    try:
+        await session.execute(
+            statement,
+            [
+                {"link_id": link_id, "delta": delta, "accessed_at": accessed_at}
+                for link_id, delta, accessed_at in deltas
+            ],
+        )
+        if buckets:
+            await _upsert_rollups(
+                session,
+                [
+                    {"link_id": link_id, "granularity": "minute", "bucket": bucket, "clicks": count}
+                    for link_id, bucket, count in buckets
+                ],
+            )
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to record clicks: {e}", exc_info=True)
+        raise
+
+
+async def get_click_rollups(
+    session: AsyncSession | AsyncConnection, link_id: int, start: datetime, end: datetime
+) -> list[tuple[datetime, int]]:
+    logger.debug(f"Fetching click rollups for link {link_id}: {start} - {end}")
+    rollups = ClickRollup.__table__
+    statement = (
+        select(rollups.c.bucket, rollups.c.clicks)
+        .where(
+            rollups.c.link_id == link_id,
+            rollups.c.granularity.in_(("minute", "hour")),
+            rollups.c.bucket >= start,
+            rollups.c.bucket < end,
+        )
+        .order_by(rollups.c.bucket)
+    )
+    result = await session.execute(statement)
+    return [(row.bucket, row.clicks) for row in result]
+
+
+async def compact_click_rollups(session: AsyncSession, cutoff: datetime) -> int:
+    logger.info(f"Compacting minute click rollups older than {cutoff}")
+    rollups = ClickRollup.__table__
+    # DELETE ... RETURNING забирает строки атомарно: параллельный воркер, удаляющий
+    # те же строки, дождётся блокировки и не получит их второй раз
+    statement = (
+        rollups.delete()
+        .where(rollups.c.granularity == "minute", rollups.c.bucket < cutoff)
+        .returning(rollups.c.link_id, rollups.c.bucket, rollups.c.clicks)
+    )
+    try:
+        hours: dict[tuple[int, datetime], int] = {}
+        compacted = 0
+        for row in await session.execute(statement):
+            key = (row.link_id, row.bucket.replace(minute=0, second=0, microsecond=0))
+            hours[key] = hours.get(key, 0) + row.clicks
+            compacted += 1
+
+        if hours:
+            await _upsert_rollups(
+                session,
+                [
+                    {"link_id": link_id, "granularity": "hour", "bucket": bucket, "clicks": count}
+                    for (link_id, bucket), count in hours.items()
+                ],
+            )
+        await session.commit()
+        logger.info(f"Compacted {compacted} minute buckets into {len(hours)} hour buckets")
+        return compacted
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to compact click rollups: {e}", exc_info=True)
+        raise
+
+
+async def reserve_id_block(session: AsyncSession, name: str, size: int) -> tuple[int, int]:
+    logger.info(f"Reserving {size} ids from sequence {name}")
+    sequences = IdSequence.__table__
+    statement = (
+        update(sequences)
+        .where(sequences.c.name == name)
+        .values(next_value=sequences.c.next_value + size)
+        .returning(sequences.c.next_value)
+    )
+    try:
+        end = (await session.execute(statement)).scalar()
+        if end is None:
+            await session.execute(
+                dialect_insert(session, sequences)
+                .values(name=name, next_value=1)
+                .on_conflict_do_nothing(index_elements=[sequences.c.name])
+            )
+            end = (await session.execute(statement)).scalar()
+        await session.commit()
+        return end - size, end
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to reserve id block: {e}", exc_info=True)
+        raise
+
+
+LINK_CHANGE_CHANNEL = "link_changes"
+
+# NOTIFY ограничивает сообщение 8000 байтами
+MAX_NOTIFY_PAYLOAD_BYTES = 7000
+
+
+def encode_link_changes(origin: str, changes: list[tuple]) -> list[str]:
+    """Упаковывает изменения в JSON-сообщения, каждое не больше MAX_NOTIFY_PAYLOAD_BYTES"""
+    envelope = len(json.dumps({"origin": origin, "changes": []}).encode())
+    payloads = []
+    batch: list[tuple] = []
+    size = envelope
+    for change in changes:
+        # Элемент списка плюс разделитель ", "
+        item_size = len(json.dumps(change).encode()) + 2
+        if batch and size + item_size > MAX_NOTIFY_PAYLOAD_BYTES:
+            payloads.append(json.dumps({"origin": origin, "changes": batch}))
+            batch, size = [], envelope
+        batch.append(change)
+        size += item_size
+    if batch:
+        payloads.append(json.dumps({"origin": origin, "changes": batch}))
+    return payloads
+
+
+async def stage_link_changes(
+    session: AsyncSession, origin: str | None, changes: list[tuple]
+) -> None:
+    """Добавляет изменения ссылок (action, link_id, short_name) в текущую транзакцию
+
+    Другие процессы видят их только вместе с самим изменением: NOTIFY доставляется
+    при COMMIT, строки link_changes фиксируются той же транзакцией. origin=None —
+    журнал изменений выключен.
+    """
+    if origin is None or not changes:
+        return
+    if _dialect_name(session) == "postgresql":
+        # Один запрос на все сообщения: unnest разворачивает массив в строки
+        await session.execute(
+            text(
+                "SELECT pg_notify(:channel, payload) "
+                "FROM unnest(CAST(:payloads AS text[])) AS payload"
+            ),
+            {"channel": LINK_CHANGE_CHANNEL, "payloads": encode_link_changes(origin, changes)},
+        )
+        return
+    now = datetime.utcnow()
+    await session.execute(
+        LinkChange.__table__.insert(),
+        [
+            {
+                "origin": origin,
+                "action": action,
+                "link_id": link_id,
+                "short_name": short_name,
+                "created_at": now,
+            }
+            for action, link_id, short_name in changes
+        ],
+    )
+
+
+def _notify_created(statement, origin: str):
+    """INSERT ... RETURNING и NOTIFY о созданной ссылке одним запросом"""
+    created = statement.cte("created")
+    payload = func.json_build_object(
+        "origin",
+        origin,
+        "changes",
+        func.json_build_array(func.json_build_array("created", created.c.id, created.c.short_name)),
+    )
+    return select(
+        *created.c, func.pg_notify(LINK_CHANGE_CHANNEL, cast(payload, Text)).label("notified")
+    )
+
+
+async def trim_link_changes(session: AsyncSession, before: datetime) -> int:
+    """Удаляет из журнала изменения старше before"""
+    changes = LinkChange.__table__
+    try:
+        result = await session.execute(changes.delete().where(changes.c.created_at < before))
+        await session.commit()
+        return result.rowcount
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"Failed to trim link changes: {e}", exc_info=True)
+        raise
+
+
+async def get_data_version(connection: AsyncConnection) -> int:
+    """Меняется, когда другое соединение фиксирует изменения в файле SQLite"""
+    return (await connection.execute(text("PRAGMA data_version"))).scalar()
+
+
+async def get_last_link_change_id(connection: AsyncConnection) -> int:
+    """Наибольший выданный id журнала; в SQLite не уменьшается и после его очистки"""
+    if connection.dialect.name == "sqlite":
+        issued = await connection.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = 'link_changes'")
+        )
+        seq = issued.scalar()
+        if seq is not None:
+            return seq
+    changes = LinkChange.__table__
+    return (await connection.execute(select(func.max(changes.c.id)))).scalar() or 0
+
+
+async def get_link_changes(connection: AsyncConnection, after_id: int) -> list[Row]:
+    changes = LinkChange.__table__
+    result = await connection.execute(
+        select(
+            changes.c.id,
+            changes.c.origin,
+            changes.c.action,
+            changes.c.link_id,
+            changes.c.short_name,
+        )
+        .where(changes.c.id > after_id)
+        .order_by(changes.c.id)
+    )
+    return result.all()
@@ -0,0 +1,105 @@
+import json
+import logging
+from urllib.parse import quote
+
+from app.bloom import short_name_filter
+from app.cache import redirect_cache
+from app.clicks import click_tracker
+from app.database import get_redirect_target, read_engine
+
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_PREFIX = "/r/"
+# Те же безопасные символы, что и в starlette.responses.RedirectResponse
+LOCATION_SAFE_CHARS = ":/%#?=@[]!$&'()*+,;"
+
+
+class RedirectFastPath:
+    """ASGI-middleware, отвечающее на GET /r/{short_name} без роутинга и DI FastAPI
+
+    Остальные запросы передаются приложению без изменений. Соединение берётся из
+    connect (по умолчанию пул читателей); dependency_overrides FastAPI сюда не
+    доходят, тесты передают свою фабрику соединений.
+    """
+
+    def __init__(self, app, connect=None):
+        self.app = app
+        self.connect = connect or read_engine.connect
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(REDIRECT_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        short_name = scope["path"][len(REDIRECT_PREFIX) :]
+        if not short_name or "/" in short_name:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.redirect(scope, send, short_name)
+        except Exception as e:
+            logger.error(f"Failed to redirect {short_name}: {e}", exc_info=True)
+            await send_json(send, 500, {"detail": "Failed to redirect"})
+
+    async def redirect(self, scope, send, short_name: str) -> None:
+        cached = redirect_cache.get(short_name)
+        if cached:
+            click_tracker.record(cached.link_id)
+            logger.debug(f"Redirecting {short_name} to {cached.original_url} (cached)")
+            await send_redirect(send, cached.original_url)
+            return
+
+        if not short_name_filter.might_contain(short_name):
+            logger.warning(f"Short link not found (filtered): {short_name}")
+            await send_json(send, 404, {"detail": "Short link not found"})
+            return
+
+        generation = redirect_cache.generation
+        async with self.connect() as connection:
+            target = await get_redirect_target(connection, short_name)
+
+        if target is None:
+            logger.warning(f"Short link not found: {short_name}")
+            await send_json(send, 404, {"detail": "Short link not found"})
+            return
+
+        link_id, original_url = target
+        redirect_cache.set(short_name, link_id, original_url, generation)
+        click_tracker.record(link_id)
+        logger.debug(f"Redirecting {short_name} to {original_url}")
+        await send_redirect(send, original_url)
+
+
+async def send_redirect(send, url: str) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 301,
+            "headers": [
+                (b"location", quote(url, safe=LOCATION_SAFE_CHARS).encode("latin-1")),
+                (b"content-length", b"0"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def send_json(send, status: int, content: dict) -> None:
+    body = json.dumps(content).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
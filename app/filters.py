@@ -0,0 +1,139 @@
+import json
+import operator
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+
+from app.models import ShortenedLink, byte_order
+
+
+MAX_FILTER_IDS = 1000
+
+RANGE_OPERATORS = {
+    "_gte": operator.ge,
+    "_lte": operator.le,
+    "_gt": operator.gt,
+    "_lt": operator.lt,
+}
+
+SORTABLE_FIELDS = ("id", "short_name", "original_url", "created_at")
+
+
+class FilterError(ValueError):
+    """Некорректный параметр filter/sort в запросе списка"""
+
+
+def parse_filter(raw: str | None) -> dict:
+    """Разбирает JSON-фильтр react-admin (`filter={"id":[1,2]}`)"""
+    if not raw:
+        return {}
+    try:
+        filters = json.loads(raw)
+    except ValueError as e:
+        raise FilterError(f"Invalid filter JSON: {e}") from e
+    if not isinstance(filters, dict):
+        raise FilterError("Filter must be a JSON object")
+    return filters
+
+
+def parse_ids(value) -> list[int]:
+    values = value if isinstance(value, list) else [value]
+    if len(values) > MAX_FILTER_IDS:
+        raise FilterError(f"Too many ids in filter (max {MAX_FILTER_IDS})")
+    try:
+        return [int(item) for item in values]
+    except (TypeError, ValueError) as e:
+        raise FilterError(f"Invalid id in filter: {e}") from e
+
+
+def coerce_value(column, value):
+    """Приводит значение из JSON к типу колонки (даты приходят строками)"""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        # AutoString из SQLModel не сообщает python_type — строки передаём как есть
+        return value
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(value) if isinstance(value, str) else value
+        return python_type(value)
+    except (TypeError, ValueError) as e:
+        raise FilterError(f"Invalid value for {column.name}: {value!r}") from e
+
+
+def prefix_condition(expression, prefix: str):
+    """Поиск по префиксу диапазоном, чтобы работал обычный B-tree индекс по выражению
+
+    Граница диапазона — следующий символ по коду, поэтому сравнение побайтное.
+    """
+    expression = byte_order(expression)
+    conditions = [expression >= prefix, expression.startswith(prefix, autoescape=True)]
+    if prefix and ord(prefix[-1]) < 0x10FFFF:
+        conditions.append(expression < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return and_(*conditions)
+
+
+def short_name_prefix(value) -> object:
+    # В SQLite lower(short_name) покрыт уникальным ix_links_short_name_lower,
+    # в PostgreSQL — ix_links_short_name_lower_bytes с COLLATE "C"
+    return prefix_condition(func.lower(ShortenedLink.__table__.c.short_name), str(value).lower())
+
+
+def original_url_prefix(value) -> object:
+    return prefix_condition(ShortenedLink.__table__.c.original_url, str(value))
+
+
+def build_link_conditions(filters: dict) -> list:
+    """Превращает фильтр в условия WHERE
+
+    `id` — IN, `q`, `short_name` и `original_url` — поиск по префиксу,
+    суффиксы `_gte`/`_lte`/`_gt`/`_lt` — диапазон, остальные поля — равенство.
+    """
+    columns = ShortenedLink.__table__.c
+    conditions = []
+    for field, value in filters.items():
+        if field == "id":
+            # getMany передаёт список id, getManyReference — одно значение
+            conditions.append(columns.id.in_(parse_ids(value)))
+            continue
+        if field == "q":
+            conditions.append(or_(short_name_prefix(value), original_url_prefix(value)))
+            continue
+        if field == "short_name" and not isinstance(value, list):
+            conditions.append(short_name_prefix(value))
+            continue
+        if field == "original_url" and not isinstance(value, list):
+            conditions.append(original_url_prefix(value))
+            continue
+
+        suffix = next((suffix for suffix in RANGE_OPERATORS if field.endswith(suffix)), None)
+        if suffix and field[: -len(suffix)] in columns:
+            column = columns[field[: -len(suffix)]]
+            conditions.append(RANGE_OPERATORS[suffix](column, coerce_value(column, value)))
+            continue
+
+        column = columns.get(field)
+        if column is None:
+            raise FilterError(f"Unknown filter field: {field}")
+        if isinstance(value, list):
+            conditions.append(column.in_([coerce_value(column, item) for item in value]))
+        else:
+            conditions.append(column == coerce_value(column, value))
+    return conditions
+
+
+def parse_sort(raw: str | None) -> tuple[str, bool]:
+    """Разбирает `sort=["created_at","DESC"]`; возвращает поле и признак убывания"""
+    if not raw:
+        return "id", False
+    try:
+        field, order = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise FilterError(f"Sort must be a JSON array [field, order]: {e}") from e
+    if field not in SORTABLE_FIELDS:
+        raise FilterError(f"Cannot sort by {field}; allowed: {', '.join(SORTABLE_FIELDS)}")
+    if str(order).upper() not in ("ASC", "DESC"):
+        raise FilterError(f"Sort order must be ASC or DESC, got {order}")
+    return field, str(order).upper() == "DESC"
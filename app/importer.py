@@ -0,0 +1,246 @@
+"""Массовый импорт ссылок из CSV/NDJSON: python -m app.importer links.csv"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import sys
+import time
+from collections.abc import AsyncIterator, Iterable
+from datetime import datetime
+
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.bloom import short_name_filter
+from app.config import settings
+from app.database import (
+    create_deferred_indexes,
+    drop_deferrable_indexes,
+    engine,
+    import_links,
+    init_db,
+    stage_link_changes,
+)
+from app.invalidation import link_change_bus
+from app.models import SHORT_NAME_PATTERN
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportRecord(BaseModel):
+    """Строка импорта; лишние поля (например, id и short_url из выгрузки) игнорируются"""
+
+    short_name: str = Field(..., min_length=1, max_length=255, pattern=SHORT_NAME_PATTERN)
+    original_url: str = Field(..., min_length=1, max_length=2048)
+    created_at: datetime | None = None
+    clicks: int = Field(0, ge=0)
+
+
+def detect_format(name: str) -> str:
+    return "csv" if name.lower().endswith(".csv") else "ndjson"
+
+
+async def iter_raw_records(
+    lines: AsyncIterator[str], format: str
+) -> AsyncIterator[tuple[int, object]]:
+    """Разбирает строки входа; номер строки считается с 1, ошибки разбора — как ValueError"""
+    header = None
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        if format == "ndjson":
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f"Invalid JSON: {e}")
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = values
+            continue
+        if len(values) != len(header):
+            yield number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        # Пустая ячейка CSV означает отсутствие значения
+        yield number, {key: value for key, value in zip(header, values, strict=True) if value}
+
+
+class LinkImporter:
+    """Валидирует входные строки пачками и загружает их крупными транзакциями"""
+
+    def __init__(self, batch_size: int = 5000, transaction_size: int = 100_000):
+        self.batch_size = batch_size
+        self.transaction_size = max(transaction_size, batch_size)
+        self.total = 0
+        self.inserted = 0
+        self.invalid = 0
+        self.errors: list[dict] = []
+        self._started = time.perf_counter()
+        self._uncommitted = 0
+        self._announced = True
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def _validate(self, number: int, raw: object, now: datetime) -> dict | None:
+        try:
+            if isinstance(raw, ValueError):
+                raise raw
+            record = ImportRecord.model_validate(raw)
+        except ValidationError as e:
+            return self._reject(number, e.errors(include_url=False, include_context=False))
+        except ValueError as e:
+            return self._reject(number, str(e))
+        return {
+            "short_name": record.short_name,
+            "original_url": record.original_url,
+            "created_at": record.created_at or now,
+            "clicks": record.clicks,
+        }
+
+    def _reject(self, number: int, errors) -> None:
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": number, "errors": errors})
+
+    async def _load(self, session: AsyncSession, batch: list[tuple[int, object]]) -> None:
+        now = datetime.utcnow()
+        rows = [row for number, raw in batch if (row := self._validate(number, raw, now))]
+        self.total += len(batch)
+        if rows:
+            inserted = await import_links(session, rows)
+            self.inserted += inserted
+            if inserted:
+                self._announced = False
+            for row in rows:
+                # Имя могло уже существовать — для Bloom-фильтра это не важно
+                short_name_filter.add(row["short_name"])
+
+        self._uncommitted += len(batch)
+        if self._uncommitted >= self.transaction_size:
+            await self._commit(session)
+            self.log_progress()
+
+    async def _commit(self, session: AsyncSession) -> None:
+        if not self._announced:
+            # Остальные воркеры перестраивают фильтр, увидев уже зафиксированный импорт
+            await stage_link_changes(
+                session, link_change_bus.change_origin, [("imported", None, None)]
+            )
+            self._announced = True
+        await session.commit()
+        self._uncommitted = 0
+
+    def log_progress(self) -> None:
+        logger.info(
+            f"Imported {self.total} rows: {self.inserted} inserted, {self.invalid} invalid "
+            f"({self.rows_per_second:.0f} rows/s)"
+        )
+
+    async def run(self, session: AsyncSession, records: AsyncIterator[tuple[int, object]]) -> dict:
+        batch = []
+        try:
+            async for item in records:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    await self._load(session, batch)
+                    batch = []
+            if batch:
+                await self._load(session, batch)
+            if self._uncommitted:
+                await self._commit(session)
+                self.log_progress()
+        except Exception:
+            await session.rollback()
+            raise
+
+        return self.summary()
+
+    def summary(self) -> dict:
+        valid = self.total - self.invalid
+        return {
+            "total": self.total,
+            "inserted": self.inserted,
+            "skipped": valid - self.inserted,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second),
+        }
+
+
+async def iter_file_lines(stream: Iterable[str]) -> AsyncIterator[str]:
+    for line in stream:
+        yield line
+
+
+async def import_file(
+    path: str, format: str | None = None, defer_indexes: bool = False, **options
+) -> dict:
+    format = format or detect_format(path)
+    await init_db()
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            if defer_indexes:
+                await drop_deferrable_indexes(session)
+            try:
+                with (
+                    sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+                ) as stream:
+                    records = iter_raw_records(iter_file_lines(stream), format)
+                    return await LinkImporter(**options).run(session, records)
+            finally:
+                if defer_indexes:
+                    await create_deferred_indexes(session)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Import links from a CSV or NDJSON file")
+    parser.add_argument("path", help="file to import, '-' for stdin")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="defaults to file extension")
+    parser.add_argument("--batch-size", type=int, default=settings.import_batch_size)
+    parser.add_argument("--transaction-size", type=int, default=settings.import_transaction_size)
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="drop non-unique indexes during import and rebuild them afterwards",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    summary = asyncio.run(
+        import_file(
+            args.path,
+            format=args.format,
+            defer_indexes=args.defer_indexes,
+            batch_size=args.batch_size,
+            transaction_size=args.transaction_size,
+        )
+    )
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if link_change_bus.change_origin is None:
+        logger.info("Running instances pick up imported names after POST /api/admin/filter/rebuild")
+    else:
+        logger.info("Running instances rebuild their short name filters from the change bus")
+
+
+if __name__ == "__main__":
+    main()
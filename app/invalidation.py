@@ -0,0 +1,276 @@
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, async_sessionmaker
+
+from app.bloom import ShortNameFilter, short_name_filter
+from app.cache import RedirectCache, redirect_cache
+from app.clicks import ClickTracker, click_tracker
+from app.config import settings
+from app.database import (
+    LINK_CHANGE_CHANNEL,
+    _is_memory_sqlite,
+    async_session_maker,
+    get_data_version,
+    get_last_link_change_id,
+    get_link_changes,
+    read_engine,
+    trim_link_changes,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Как часто воркер в режиме poll удаляет из журнала записи старше retention
+TRIM_INTERVAL = 300.0
+
+
+def decode_notification(payload: str) -> tuple[str, list[tuple]]:
+    message = json.loads(payload)
+    return message["origin"], [tuple(change) for change in message["changes"]]
+
+
+class LinkChangeBus:
+    """Рассылает изменения ссылок между воркерами, чтобы их кеши не отдавали устаревшие редиректы
+
+    Изменения попадают в шину в той же транзакции, что и сама запись ссылки
+    (database.stage_link_changes с origin из change_origin): Postgres доставляет их
+    через LISTEN/NOTIFY, в SQLite они пишутся в журнал link_changes, а воркеры раз в
+    poll_interval сверяют PRAGMA data_version и читают журнал, только если файл менялся.
+    После каждой (пере)подписки Bloom-фильтр перестраивается: имена, созданные до неё,
+    иначе никогда бы в него не попали.
+    """
+
+    def __init__(
+        self,
+        cache: RedirectCache,
+        name_filter: ShortNameFilter,
+        tracker: ClickTracker,
+        engine: AsyncEngine | None = None,
+        session_maker: async_sessionmaker | None = None,
+        poll_interval: float = 0.5,
+        retention: timedelta = timedelta(hours=1),
+        enabled: bool = True,
+    ):
+        self.cache = cache
+        self.name_filter = name_filter
+        self.tracker = tracker
+        self.engine = engine or read_engine
+        self.session_maker = session_maker or async_session_maker
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.enabled = enabled
+        self.origin = uuid4().hex
+        self.received = 0
+        self.failures = 0
+        self.last_received_at: datetime | None = None
+        self._rebuild_pending = False
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._rebuild_task: asyncio.Task | None = None
+
+    @property
+    def mode(self) -> str:
+        if not self.enabled:
+            return "disabled"
+        if self.engine.dialect.name == "postgresql":
+            return "notify"
+        if _is_memory_sqlite(str(self.engine.url)):
+            # Базу в памяти видит только этот процесс
+            return "local"
+        return "poll"
+
+    @property
+    def change_origin(self) -> str | None:
+        """origin для database.stage_link_changes; None — изменения никому не рассылаются"""
+        if self.mode in ("notify", "poll"):
+            return self.origin
+        return None
+
+    def apply(self, action: str, link_id: int | None, short_name: str | None) -> None:
+        """Применяет чужое изменение к кешу, Bloom-фильтру и буферу кликов этого процесса
+
+        created/updated — имя появилось, updated/deleted — запись в кеше устарела,
+        imported — импорт добавил имена, которые перечислять слишком дорого.
+        """
+        if action in ("updated", "deleted"):
+            self.cache.invalidate(link_id=link_id, short_name=short_name)
+        if action in ("created", "updated") and short_name:
+            self.name_filter.add(short_name)
+        if action == "deleted":
+            self.tracker.discard(link_id)
+            if short_name:
+                self.name_filter.remove(short_name)
+        if action == "imported":
+            self._schedule_rebuild()
+
+    def receive(self, origin: str, changes: list[tuple]) -> None:
+        if origin == self.origin:
+            return
+        for action, link_id, short_name in changes:
+            self.apply(action, link_id, short_name)
+        self.received += len(changes)
+        self.last_received_at = datetime.utcnow()
+
+    async def _rebuild_filter(self) -> None:
+        async with self.engine.connect() as connection:
+            await self.name_filter.rebuild(connection)
+
+    def _schedule_rebuild(self) -> None:
+        if not self.name_filter.ready:
+            return
+        # Импорт, пришедший во время перестройки, мог не попасть в её выборку
+        self._rebuild_pending = True
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return
+        self._rebuild_task = asyncio.create_task(self._rebuild_after_import())
+
+    async def _rebuild_after_import(self) -> None:
+        while self._rebuild_pending:
+            self._rebuild_pending = False
+            logger.info("Links were imported by another process, rebuilding short name filter")
+            try:
+                await self._rebuild_filter()
+            except Exception as e:
+                logger.error(f"Failed to rebuild short name filter: {e}", exc_info=True)
+                self._rebuild_pending = True
+                await asyncio.sleep(self.poll_interval)
+
+    async def _subscribed(self) -> None:
+        """Подписка уже получает изменения: строим фильтр и отмечаем готовность"""
+        await self._rebuild_filter()
+        self._ready.set()
+
+    async def _listen(self, connection: AsyncConnection) -> None:
+        raw = await connection.get_raw_connection()
+        driver = raw.driver_connection
+        queue: asyncio.Queue[str | None] = asyncio.Queue()
+
+        def on_notification(*args) -> None:
+            queue.put_nowait(args[-1])
+
+        def on_termination(_) -> None:
+            queue.put_nowait(None)
+
+        try:
+            await driver.add_listener(LINK_CHANGE_CHANNEL, on_notification)
+            driver.add_termination_listener(on_termination)
+            # Уведомления, пришедшие во время перестройки, ждут в очереди
+            await self._subscribed()
+            while True:
+                payload = await queue.get()
+                if payload is None:
+                    raise ConnectionError("Listener connection closed")
+                try:
+                    self.receive(*decode_notification(payload))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Ignoring malformed link change notification: {e}")
+        finally:
+            driver.remove_termination_listener(on_termination)
+            try:
+                await driver.remove_listener(LINK_CHANGE_CHANNEL, on_notification)
+            except Exception as e:
+                # Соединение с подпиской нельзя возвращать в пул: его получит обычный запрос
+                logger.warning(f"Failed to unlisten, discarding connection: {e}")
+                await connection.invalidate()
+
+    async def _trim(self) -> None:
+        try:
+            async with self.session_maker() as session:
+                await trim_link_changes(session, datetime.utcnow() - self.retention)
+        except Exception as e:
+            logger.warning(f"Failed to trim link changes: {e}")
+
+    async def _poll(self, connection: AsyncConnection) -> None:
+        version = await get_data_version(connection)
+        last_id = await get_last_link_change_id(connection)
+        # Соединение не держит открытую транзакцию между опросами, иначе WAL не чекпоинтится
+        await connection.rollback()
+        # Изменения после last_id повторно применятся к новому фильтру в цикле ниже
+        await self._subscribed()
+        trimmed = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await get_data_version(connection)
+            if current != version:
+                version = current
+                if await get_last_link_change_id(connection) < last_id:
+                    # Нумерация журнала началась заново (старая таблица без AUTOINCREMENT
+                    # или пересозданная): какие изменения пропущены, неизвестно
+                    raise LookupError("Link change log was reset")
+                for change in await get_link_changes(connection, last_id):
+                    last_id = change.id
+                    self.receive(
+                        change.origin, [(change.action, change.link_id, change.short_name)]
+                    )
+            await connection.rollback()
+            if time.monotonic() - trimmed >= TRIM_INTERVAL:
+                trimmed = time.monotonic()
+                await self._trim()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                async with self.engine.connect() as connection:
+                    if self.mode == "notify":
+                        await self._listen(connection)
+                    else:
+                        await self._poll(connection)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Link change bus failed, reconnecting: {e}", exc_info=True)
+            # Изменения за время сбоя потеряны, поэтому кеш этого процесса больше не надёжен
+            self._ready.clear()
+            self.cache.clear()
+            await asyncio.sleep(self.poll_interval)
+
+    async def start(self, timeout: float = 5.0) -> None:
+        """Подписывается на изменения и строит Bloom-фильтр коротких имён"""
+        if self._task is not None:
+            return
+        if self.mode in ("disabled", "local"):
+            await self._rebuild_filter()
+            return
+        logger.info(f"Starting link change bus ({self.mode})")
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+        # Не блокируем запуск: пока фильтр не построен, он пропускает все имена
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+
+    async def stop(self) -> None:
+        for task in (self._task, self._rebuild_task):
+            if task is not None:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+        self._task = None
+        self._rebuild_task = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "listening": self._ready.is_set(),
+            "origin": self.origin,
+            "received": self.received,
+            "failures": self.failures,
+            "last_received_at": (
+                self.last_received_at.isoformat() if self.last_received_at else None
+            ),
+            "poll_interval": self.poll_interval,
+        }
+
+
+link_change_bus = LinkChangeBus(
+    redirect_cache,
+    short_name_filter,
+    click_tracker,
+    poll_interval=settings.invalidation_poll_interval_ms / 1000,
+    retention=timedelta(seconds=settings.invalidation_retention),
+    enabled=settings.invalidation_bus,
+)
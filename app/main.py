@@ -3,10 +3,17 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
+from app.clicks import click_tracker
 from app.config import settings
-from app.database import init_db
-from app.routes import health, links
+from app.database import engine, init_db, read_engine
+from app.fastpath import RedirectFastPath
+from app.invalidation import link_change_bus
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, instrument_engine, registry
+from app.profiling import ProfilingMiddleware, profiling_enabled
+from app.routes import admin, bulk, health, links
+from app.slowlog import slow_query_log
 
 
 logging.basicConfig(
@@ -18,12 +25,29 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up application")
-    await init_db()
-    logger.info("Database initialized")
+    if settings.short_name_scramble and not settings.short_name_secret:
+        logger.warning("SHORT_NAME_SECRET is empty: scrambled short names are predictable")
+    if settings.db_init_on_startup:
+        await init_db()
+        logger.info("Database initialized")
+    click_tracker.start()
+    if settings.metrics_enabled:
+        registry.start(settings.metrics_flush_interval)
+    # Bloom-фильтр строится после подписки на изменения, см. LinkChangeBus
+    await link_change_bus.start()
     yield
     logger.info("Shutting down application")
+    await link_change_bus.stop()
+    await click_tracker.stop()
+    await registry.stop()
 
 
+if settings.slow_query_log:
+    # EXPLAIN для запросов писателя SQLite идёт через читателя: у писателя одно соединение
+    slow_query_log.instrument(engine, "main", explain_engine=read_engine)
+    if read_engine is not engine:
+        slow_query_log.instrument(read_engine, "read")
+
 app = FastAPI(
     title=settings.app_name,
     description="URL Shortener Service",
@@ -37,15 +61,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Range", "X-Total-Count"],
+    expose_headers=["Content-Range", "X-Total-Count", "X-Next-After-Id"],
 )
 
+# Добавлено после CORS, поэтому выполняется раньше него: /r/ не проходит CORS и роутинг
+if settings.redirect_fast_path:
+    app.add_middleware(RedirectFastPath)
+
+# Метрики подключаются последними и оборачивают всё, включая fast path
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine, "main")
+    if read_engine is not engine:
+        instrument_engine(read_engine, "read")
+
+# Профилировщик снаружи всех middleware; выключенный не добавляет ни одного вызова
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
 app.include_router(health.router, tags=["health"])
 
-app.include_router(links.router, tags=["redirect"])
+app.include_router(links.redirect_router, tags=["redirect"])
+
+# bulk подключается раньше links, чтобы /links/export не попадал в /links/{link_id}
+app.include_router(bulk.router, prefix="/api", tags=["links"])
 
 app.include_router(links.router, prefix="/api", tags=["links"])
 
+app.include_router(admin.router, prefix="/api", tags=["admin"])
+
 
 @app.get("/", tags=["root"])
 async def root():
@@ -57,6 +101,13 @@ async def root():
     }
 
 
+if settings.metrics_enabled:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
 
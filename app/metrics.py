@@ -0,0 +1,423 @@
+"""Метрики в текстовом формате Prometheus без сторонних зависимостей"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import re
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.cache import redirect_cache
+from app.clicks import click_tracker
+from app.config import settings
+from app.database import engine, read_engine
+from app.pool import describe_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Секунды; редирект из кеша укладывается в первые бакеты, импорт — в последние
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+KNOWN_METHODS = frozenset(("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"))
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [
+        f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик; значения по наборам меток хранятся в обычном словаре
+
+    callback, если задан, возвращает пары (метки, значение) в момент сбора — для
+    счётчиков, которые уже ведут другие компоненты.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.callback = callback
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def collect(self) -> dict[tuple, float]:
+        if self.callback is not None:
+            self.values = dict(self.callback())
+        return self.values
+
+    @staticmethod
+    def merge(total: dict[tuple, float], values: dict[tuple, float]) -> None:
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def samples(self, extra: str, values: dict[tuple, float] | None = None):
+        if values is None:
+            values = self.collect()
+        for labels, value in values.items():
+            yield f"{self.name}{format_labels(self.labels, labels, extra)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    """Значение, которое может уменьшаться"""
+
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        self.values[labels] = value
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами
+
+    observe() увеличивает один некумулятивный бакет, найденный bisect; кумулятивные
+    значения, которых ждёт Prometheus, считаются только при сборе.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: счётчики бакетов, последний — +Inf, затем сумма
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, labels: tuple = ()) -> int:
+        series = self.series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def collect(self) -> dict[tuple, list]:
+        return self.series
+
+    @staticmethod
+    def merge(total: dict[tuple, list], series: dict[tuple, list]) -> None:
+        for labels, values in series.items():
+            current = total.get(labels)
+            if current is None:
+                total[labels] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    current[index] += value
+
+    def samples(self, extra: str, values: dict[tuple, list] | None = None):
+        for labels, series in (self.series if values is None else values).items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), series[:-1], strict=True):
+                cumulative += bucket_count
+                bucket_labels = format_labels(
+                    (*self.labels, "le"), (*labels, format_value(bound)), extra
+                )
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            series_labels = format_labels(self.labels, labels, extra)
+            yield f"{self.name}_count{series_labels} {cumulative}"
+            yield f"{self.name}_sum{series_labels} {format_value(series[-1])}"
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """Набор метрик процесса
+
+    Все обновления идут из потока event loop (события SQLAlchemy в async-режиме тоже
+    вызываются в нём), поэтому метрикам не нужны блокировки. Без directory каждый
+    воркер отдаёт свои значения с меткой worker. С directory воркеры раз в
+    flush_interval сохраняют значения в <worker>.json общего каталога, и /metrics
+    любого воркера суммирует их: счётчики и гистограммы — по всем процессам, в том
+    числе завершившимся, gauge — только по живым.
+    """
+
+    def __init__(self, worker: str | None = None, directory: str = ""):
+        self.metrics: list = []
+        self.worker = worker if worker is not None else str(os.getpid())
+        self.directory = directory
+        self._task: asyncio.Task | None = None
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> dict:
+        return {
+            metric.name: [[list(labels), value] for labels, value in metric.collect().items()]
+            for metric in self.metrics
+        }
+
+    def write(self) -> None:
+        path = os.path.join(self.directory, f"{self.worker}.json")
+        # Читатель видит либо прежний файл, либо новый целиком
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def _read_workers(self) -> list[tuple[bool, dict]]:
+        workers = [(True, self.snapshot())]
+        for name in os.listdir(self.directory):
+            worker, extension = os.path.splitext(name)
+            if extension != ".json" or worker == self.worker:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            workers.append((worker.isdigit() and process_alive(int(worker)), snapshot))
+        return workers
+
+    def _merged(self) -> dict[str, dict]:
+        merged = {metric.name: {} for metric in self.metrics}
+        for alive, snapshot in self._read_workers():
+            for metric in self.metrics:
+                if metric.kind == "gauge" and not alive:
+                    continue
+                values = {tuple(labels): value for labels, value in snapshot.get(metric.name, ())}
+                metric.merge(merged[metric.name], values)
+        return merged
+
+    def render(self) -> str:
+        merged = self._merged() if self.directory else {}
+        # Сумма по воркерам — одна серия, метка worker нужна только значениям процесса
+        extra = (
+            f'worker="{escape_label(self.worker)}"' if self.worker and not self.directory else ""
+        )
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(extra, merged.get(metric.name)))
+        return "\n".join(lines) + "\n"
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning(f"Failed to write metrics to {self.directory}: {e}")
+
+    def start(self, interval: float) -> None:
+        if self.directory and self._task is None:
+            self.write()
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            # Счётчики завершившегося воркера остаются в сумме
+            self.write()
+
+
+registry = MetricsRegistry(directory=settings.metrics_dir)
+
+http_requests = registry.register(
+    Counter(
+        "http_requests_total", "HTTP requests by route and status", ("route", "method", "status")
+    )
+)
+http_request_duration = registry.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency by route", ("route",))
+)
+http_requests_in_progress = registry.register(
+    Gauge("http_requests_in_progress", "HTTP requests being served", ("route",))
+)
+db_query_duration = registry.register(
+    Histogram("db_query_duration_seconds", "SQL statement execution time", ("engine", "operation"))
+)
+db_query_errors = registry.register(
+    Counter("db_query_errors_total", "SQL statements that raised an error", ("engine",))
+)
+
+
+# Маршрут определяется по пути до роутинга: fast path отвечает раньше FastAPI,
+# а неизвестные пути сводятся к "other", чтобы не плодить серии
+API_ROUTES = (
+    ("GET", re.compile(r"/api/links"), "list"),
+    ("POST", re.compile(r"/api/links"), "create"),
+    ("POST", re.compile(r"/api/links/bulk"), "bulk_create"),
+    ("POST", re.compile(r"/api/links/import"), "import"),
+    ("GET", re.compile(r"/api/links/export"), "export"),
+    ("GET", re.compile(r"/api/links/\d+"), "get"),
+    ("GET", re.compile(r"/api/links/\d+/stats"), "stats"),
+    ("PUT", re.compile(r"/api/links/\d+"), "update"),
+    ("DELETE", re.compile(r"/api/links(/\d+)?"), "delete"),
+)
+
+
+def route_name(method: str, path: str) -> str:
+    if path.startswith("/r/"):
+        return "redirect"
+    if path.startswith("/api/links"):
+        for route_method, pattern, name in API_ROUTES:
+            if method == route_method and pattern.fullmatch(path):
+                return name
+        return "other"
+    if path.startswith("/api/admin/"):
+        return "admin"
+    if path == "/metrics":
+        return "metrics"
+    if path == "/ping":
+        return "health"
+    return "other"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: число запросов, задержка и запросы в работе по маршрутам
+
+    Подключается последним, чтобы охватывать и fast path редиректа.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = (route_name(method, scope["path"]),)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_progress.inc(route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(time.perf_counter() - started, route)
+            http_requests_in_progress.dec(route)
+            http_requests.inc(
+                (route[0], method if method in KNOWN_METHODS else "other", str(status))
+            )
+
+
+def statement_operation(statement: str) -> str:
+    keyword = statement.lstrip()[:8].split(None, 1)
+    operation = keyword[0].lower() if keyword else ""
+    return operation if operation in ("select", "insert", "update", "delete", "with") else "other"
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Замеряет каждый SQL-запрос движка через события before/after_cursor_execute"""
+    sync_engine = engine.sync_engine
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            db_query_duration.observe(
+                time.perf_counter() - started, (name, statement_operation(statement))
+            )
+
+    def handle_error(exception_context):
+        db_query_errors.inc((name,))
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+
+def pool_connections():
+    pools = {"main": engine.pool}
+    if read_engine is not engine:
+        pools["read"] = read_engine.pool
+    return [
+        ((name, state), describe_pool(pool).get(state, 0))
+        for name, pool in pools.items()
+        for state in ("checked_out", "idle")
+    ]
+
+
+# Состояние, которое уже ведут кеш, буфер кликов и пулы, читается в момент сбора
+registry.register(
+    Gauge(
+        "redirect_cache_entries",
+        "Entries in the redirect cache",
+        callback=lambda: [((), redirect_cache.stats()["size"])],
+    )
+)
+registry.register(
+    Counter(
+        "redirect_cache_lookups_total",
+        "Redirect cache lookups by result",
+        ("result",),
+        callback=lambda: [(("hit",), redirect_cache.hits), (("miss",), redirect_cache.misses)],
+    )
+)
+registry.register(
+    Gauge(
+        "clicks_pending",
+        "Clicks buffered in memory and not yet flushed",
+        callback=lambda: [((), click_tracker.stats()["pending_clicks"])],
+    )
+)
+registry.register(
+    Gauge(
+        "db_pool_connections",
+        "Database pool connections by state",
+        ("engine", "state"),
+        callback=pool_connections,
+    )
+)
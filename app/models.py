@@ -1,6 +1,10 @@
+import string
 from datetime import datetime
 
-from sqlmodel import Field, SQLModel
+from sqlalchemy import BigInteger, Index
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlmodel import Field, SQLModel, func
 
 
 class ShortenedLink(SQLModel, table=True):
@@ -8,8 +12,130 @@ class ShortenedLink(SQLModel, table=True):
 
     id: int | None = Field(default=None, primary_key=True)
     short_name: str = Field(index=True, unique=True, min_length=1, max_length=255)
-    original_url: str = Field(min_length=1, max_length=2048)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    original_url: str = Field(index=True, min_length=1, max_length=2048)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    clicks: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    last_accessed_at: datetime | None = Field(default=None)
 
     def __repr__(self):
         return f"<Link(id={self.id}, short_name={self.short_name})>"
+
+
+# lower() в SQLite меняет регистр только у ASCII, а в PostgreSQL — у любых букв. Чтобы
+# уникальность без учёта регистра совпадала, имена ограничены печатными ASCII-символами
+SHORT_NAME_PATTERN = r"^[\x20-\x7e]+$"
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def short_name_key(short_name: str) -> str:
+    """Ключ имени в кеше и Bloom-фильтре: приводится к нижнему регистру так же, как lower() в БД"""
+    return short_name.translate(_ASCII_LOWER)
+
+
+class ClickRollup(SQLModel, table=True):
+    __tablename__ = "click_rollups"
+
+    link_id: int = Field(primary_key=True)
+    granularity: str = Field(primary_key=True, max_length=8)
+    bucket: datetime = Field(primary_key=True)
+    clicks: int = Field(default=0)
+
+    def __repr__(self):
+        return f"<ClickRollup(link_id={self.link_id}, {self.granularity}={self.bucket})>"
+
+
+class IdSequence(SQLModel, table=True):
+    __tablename__ = "id_sequences"
+
+    name: str = Field(primary_key=True, max_length=64)
+    next_value: int = Field(default=1, sa_type=BigInteger)
+
+    def __repr__(self):
+        return f"<IdSequence(name={self.name}, next_value={self.next_value})>"
+
+
+class RowCount(SQLModel, table=True):
+    __tablename__ = "row_counts"
+
+    name: str = Field(primary_key=True, max_length=64)
+    value: int = Field(default=0, sa_type=BigInteger)
+
+    def __repr__(self):
+        return f"<RowCount(name={self.name}, value={self.value})>"
+
+
+class RowCountDelta(SQLModel, table=True):
+    """Изменения счётчика от триггеров PostgreSQL, ещё не сложенные в row_counts"""
+
+    __tablename__ = "row_count_deltas"
+
+    id: int | None = Field(default=None, primary_key=True)
+    name: str = Field(max_length=64, index=True)
+    delta: int = Field(sa_type=BigInteger)
+
+
+class LinkChange(SQLModel, table=True):
+    __tablename__ = "link_changes"
+    # Без AUTOINCREMENT SQLite снова выдаёт id 1 после очистки журнала, и воркеры,
+    # ждущие id больше последнего прочитанного, пропускают новые изменения
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: int | None = Field(default=None, primary_key=True)
+    origin: str = Field(max_length=32)
+    action: str = Field(max_length=16)
+    link_id: int | None = Field(default=None)
+    short_name: str | None = Field(default=None, max_length=255)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<LinkChange(id={self.id}, action={self.action}, link_id={self.link_id})>"
+
+
+# Регистронезависимый поиск по short_name идёт через равенство с lower(short_name),
+# поэтому редирект и проверка дубликатов используют этот индекс
+short_name_lower_index = Index(
+    "ix_links_short_name_lower",
+    func.lower(ShortenedLink.short_name),
+    unique=True,
+)
+
+
+class byte_order(FunctionElement):
+    """Выражение, которое в PostgreSQL сравнивается побайтно (COLLATE "C")
+
+    Поиск по префиксу берёт верхнюю границу как следующий символ по коду, а
+    сравнение с collation вроде en_US.UTF-8 ставит знаки раньше букв и цифр.
+    В SQLite сравнение и так побайтное (BINARY), выражение выводится как есть.
+    """
+
+    inherit_cache = True
+    name = "byte_order"
+
+    def __init__(self, expression):
+        super().__init__(expression)
+        self.type = expression.type
+
+
+@compiles(byte_order)
+def _compile_byte_order(element, compiler, **kw):
+    (expression,) = element.clauses
+    return compiler.process(expression, **kw)
+
+
+@compiles(byte_order, "postgresql")
+def _compile_byte_order_postgresql(element, compiler, **kw):
+    (expression,) = element.clauses
+    return f'{compiler.process(expression, **kw)} COLLATE "C"'
+
+
+# Индексы для поиска по префиксу в PostgreSQL: планировщик использует индекс, только
+# если его collation совпадает с collation сравнения
+short_name_prefix_index = Index(
+    "ix_links_short_name_lower_bytes",
+    byte_order(func.lower(ShortenedLink.short_name)),
+).ddl_if(dialect="postgresql")
+original_url_prefix_index = Index(
+    "ix_links_original_url_bytes",
+    byte_order(ShortenedLink.original_url),
+).ddl_if(dialect="postgresql")
+POSTGRES_ONLY_INDEXES = (short_name_prefix_index.name, original_url_prefix_index.name)
@@ -0,0 +1,82 @@
+import time
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+
+class PoolStats:
+    """Время ожидания соединения из пула и число таймаутов"""
+
+    def __init__(self, window: int = 1000):
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent: deque[float] = deque(maxlen=window)
+
+    def record(self, wait: float) -> None:
+        self.acquisitions += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self._recent.append(wait)
+
+    def reset(self) -> None:
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent.clear()
+
+    def snapshot(self) -> dict:
+        recent = sorted(self._recent)
+        p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+        avg = self.total_wait / self.acquisitions if self.acquisitions else 0.0
+        return {
+            "acquisitions": self.acquisitions,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(avg * 1000, 3),
+            "wait_p95_ms": round(p95 * 1000, 3),
+            "wait_max_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool, который замеряет время получения соединения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+def describe_pool(pool: Pool) -> dict:
+    info = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        info.update(
+            {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            }
+        )
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        info.update(pool.stats.snapshot())
+    return info
@@ -0,0 +1,271 @@
+"""Профилирование отдельных запросов cProfile по заголовку или выборке"""
+
+import contextlib
+import cProfile
+import hmac
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+# Просмотр профилей сам не профилируется, иначе выборка засоряет хранилище
+EXCLUDED_PREFIX = "/api/admin/profiles"
+SORT_KEYS = ("cumulative", "tottime", "ncalls", "filename")
+# <PID воркера>-<n>; проверяется до обращения к файлам профилей
+PROFILE_ID = re.compile(r"\d+-\d+")
+
+
+@dataclass(slots=True)
+class RequestProfile:
+    id: str
+    method: str
+    path: str
+    trigger: str
+    profile: cProfile.Profile | None
+    status: int = 500
+    duration_ms: float = 0.0
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    # Профиль, сохранённый в общий каталог, читается из файла
+    stats_path: str | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "status": self.status,
+            "duration_ms": round(self.duration_ms, 3),
+            "started_at": self.started_at.isoformat(),
+        }
+
+    def report(self, sort: str = "cumulative", limit: int = 40) -> str:
+        """Текстовый отчёт pstats"""
+        stream = io.StringIO()
+        stats = pstats.Stats(self.stats_path or self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self) -> bytes:
+        """Формат файла cProfile.dump_stats: открывается pstats, snakeviz и т. п."""
+        if self.stats_path is not None:
+            with open(self.stats_path, "rb") as f:
+                return f.read()
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+class ProfileStore:
+    """Последние профили; старые вытесняются при переполнении
+
+    Без directory профили живут в памяти процесса. С directory каждый профиль
+    сохраняется как <id>.prof и <id>.json, и любой воркер отдаёт профили всех
+    воркеров; capacity тогда ограничивает их общее число.
+    """
+
+    def __init__(self, capacity: int = 20, directory: str = ""):
+        self.capacity = capacity
+        self.directory = directory
+        self.profiles: deque[RequestProfile] = deque(maxlen=capacity)
+        self.skipped = 0
+        self._next_id = 1
+
+    def create(self, method: str, path: str, trigger: str) -> RequestProfile:
+        # PID в номере: воркеры нумеруют профили независимо
+        entry = RequestProfile(
+            id=f"{os.getpid()}-{self._next_id}",
+            method=method,
+            path=path,
+            trigger=trigger,
+            profile=cProfile.Profile(),
+        )
+        self._next_id += 1
+        return entry
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}{extension}")
+
+    def _stored(self) -> list[dict]:
+        """Метаданные сохранённых профилей, новые первыми"""
+        stored = []
+        for name in os.listdir(self.directory):
+            profile_id, extension = os.path.splitext(name)
+            if extension != ".json" or not PROFILE_ID.fullmatch(profile_id):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    stored.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(stored, key=lambda meta: meta["started_at"], reverse=True)
+
+    def _remove(self, profile_id: str) -> None:
+        for extension in (".json", ".prof"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._path(profile_id, extension))
+
+    def add(self, entry: RequestProfile) -> None:
+        if not self.directory:
+            self.profiles.append(entry)
+            return
+        try:
+            with open(self._path(entry.id, ".prof"), "wb") as f:
+                f.write(entry.dump())
+            # Метаданные пишутся последними: по ним профиль считается сохранённым
+            with open(self._path(entry.id, ".json.tmp"), "w") as f:
+                json.dump(entry.to_dict(), f)
+            os.replace(self._path(entry.id, ".json.tmp"), self._path(entry.id, ".json"))
+            for meta in self._stored()[self.capacity :]:
+                self._remove(meta["id"])
+        except OSError as e:
+            logger.warning(f"Failed to save profile {entry.id} to {self.directory}: {e}")
+
+    def get(self, profile_id: str) -> RequestProfile | None:
+        if not self.directory:
+            for entry in self.profiles:
+                if entry.id == profile_id:
+                    return entry
+            return None
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, ".json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stats_path = self._path(profile_id, ".prof")
+        if not os.path.exists(stats_path):
+            return None
+        return RequestProfile(
+            id=meta["id"],
+            method=meta["method"],
+            path=meta["path"],
+            trigger=meta["trigger"],
+            profile=None,
+            status=meta["status"],
+            duration_ms=meta["duration_ms"],
+            started_at=datetime.fromisoformat(meta["started_at"]),
+            stats_path=stats_path,
+        )
+
+    def clear(self) -> None:
+        self.profiles.clear()
+        self.skipped = 0
+        if self.directory:
+            for meta in self._stored():
+                self._remove(meta["id"])
+
+    def snapshot(self) -> dict:
+        if self.directory:
+            profiles = self._stored()[: self.capacity]
+        else:
+            profiles = [entry.to_dict() for entry in reversed(self.profiles)]
+        return {
+            "enabled": profiling_enabled(),
+            "sample_rate": settings.profiling_sample_rate,
+            "capacity": self.capacity,
+            "skipped": self.skipped,
+            "profiles": profiles,
+        }
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.profiling_token) or settings.profiling_sample_rate > 0
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware, запускающее cProfile вокруг запроса
+
+    Профилируется запрос с заголовком `X-Profile: <PROFILING_TOKEN>` или случайная
+    доля запросов PROFILING_SAMPLE_RATE; номер профиля возвращается в X-Profile-Id.
+    cProfile ловит все вызовы потока event loop, поэтому в профиль попадают и
+    запросы, выполнявшиеся параллельно. Одновременно активен один профилировщик:
+    пока он работает, следующие запросы выполняются без профилирования.
+
+    Если профилирование выключено, middleware не подключается вовсе.
+    """
+
+    def __init__(self, app, store: ProfileStore | None = None):
+        self.app = app
+        self.store = store or profile_store
+        self.token = settings.profiling_token.encode()
+        self.sample_rate = settings.profiling_sample_rate
+        self.active = False
+
+    def trigger(self, scope) -> str | None:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    if hmac.compare_digest(value, self.token):
+                        return "header"
+                    break
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        trigger = self.trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        if self.active:
+            self.store.skipped += 1
+            await self.app(scope, receive, send)
+            return
+
+        entry = self.store.create(scope["method"], scope["path"], trigger)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                entry.status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER, entry.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            entry.profile.enable()
+        except ValueError as e:
+            # Профилировщик уже включён снаружи, например отладчиком
+            logger.warning(f"Failed to start profiler: {e}")
+            self.store.skipped += 1
+            await self.app(scope, receive, send)
+            return
+
+        self.active = True
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            entry.profile.disable()
+            entry.duration_ms = (time.perf_counter() - started) * 1000
+            self.active = False
+            self.store.add(entry)
+            logger.info(
+                f"Profiled {entry.method} {entry.path} ({trigger}): "
+                f"profile {entry.id}, {entry.duration_ms:.1f} ms"
+            )
+
+
+profile_store = ProfileStore(
+    capacity=settings.profiling_store_size, directory=settings.profiling_dir
+)
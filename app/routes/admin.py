@@ -0,0 +1,168 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.allocator import short_name_allocator
+from app.bloom import short_name_filter
+from app.cache import redirect_cache
+from app.clicks import click_tracker
+from app.config import settings
+from app.database import (
+    count_links,
+    engine,
+    get_link_counter,
+    get_read_connection,
+    get_session,
+    read_engine,
+    refresh_link_counter,
+)
+from app.invalidation import link_change_bus
+from app.pool import describe_pool
+from app.profiling import SORT_KEYS, profile_store
+from app.slowlog import slow_query_log
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin")
+
+
+@router.get("/cache")
+async def cache_stats():
+    """Статистика кеша редиректов"""
+    logger.debug("Cache stats endpoint called")
+    return redirect_cache.stats()
+
+
+@router.delete("/cache", status_code=204)
+async def clear_cache():
+    """Очистить кеш редиректов"""
+    logger.info("Clearing redirect cache")
+    redirect_cache.clear()
+    return None
+
+
+@router.get("/pool")
+async def pool_stats():
+    """Состояние пула соединений с БД"""
+    logger.debug("Pool stats endpoint called")
+    stats = describe_pool(engine.pool)
+    if read_engine is not engine:
+        stats["read_pool"] = describe_pool(read_engine.pool)
+    return stats
+
+
+@router.get("/clicks")
+async def clicks_stats():
+    """Состояние буфера кликов"""
+    logger.debug("Click tracker stats endpoint called")
+    return click_tracker.stats()
+
+
+@router.get("/allocator")
+async def allocator_stats():
+    """Состояние генератора коротких имён"""
+    logger.debug("Allocator stats endpoint called")
+    return short_name_allocator.stats()
+
+
+@router.get("/filter")
+async def filter_stats():
+    """Состояние Bloom-фильтра коротких имён"""
+    logger.debug("Short name filter stats endpoint called")
+    return short_name_filter.stats()
+
+
+@router.post("/filter/rebuild")
+async def rebuild_filter():
+    """Перестроить Bloom-фильтр коротких имён"""
+    logger.info("Rebuilding short name filter")
+    await short_name_filter.rebuild()
+    return short_name_filter.stats()
+
+
+@router.get("/invalidation")
+async def invalidation_stats():
+    """Состояние шины инвалидации между воркерами"""
+    logger.debug("Invalidation bus stats endpoint called")
+    return link_change_bus.stats()
+
+
+@router.get("/slow-queries")
+async def slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """Медленные SQL-запросы: последние и агрегаты по отпечаткам с планами"""
+    logger.debug("Slow query log endpoint called")
+    return slow_query_log.snapshot(limit)
+
+
+@router.delete("/slow-queries", status_code=204)
+async def clear_slow_queries():
+    """Очистить журнал медленных запросов"""
+    logger.info("Clearing slow query log")
+    slow_query_log.clear()
+    return None
+
+
+@router.get("/profiles")
+async def profiles():
+    """Последние профили запросов (всех воркеров, если задан PROFILING_DIR)"""
+    logger.debug("Profiles endpoint called")
+    return profile_store.snapshot()
+
+
+@router.delete("/profiles", status_code=204)
+async def clear_profiles():
+    """Удалить сохранённые профили"""
+    logger.info("Clearing request profiles")
+    profile_store.clear()
+    return None
+
+
+def get_profile_or_404(profile_id: str):
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        logger.warning(f"Profile not found: {profile_id}")
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return entry
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def profile_report(
+    profile_id: str,
+    sort: str = Query("cumulative", pattern=f"^({'|'.join(SORT_KEYS)})$"),
+    limit: int = Query(40, ge=1, le=1000),
+):
+    """Текстовый отчёт pstats по профилю"""
+    entry = get_profile_or_404(profile_id)
+    return PlainTextResponse(entry.report(sort, limit))
+
+
+@router.get("/profiles/{profile_id}/pstats")
+async def profile_dump(profile_id: str):
+    """Профиль в формате cProfile.dump_stats"""
+    entry = get_profile_or_404(profile_id)
+    return Response(
+        entry.dump(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'},
+    )
+
+
+@router.get("/counts")
+async def count_stats(connection: AsyncConnection = Depends(get_read_connection)):
+    """Счётчик ссылок в сравнении с точным COUNT(*)"""
+    logger.debug("Link count stats endpoint called")
+    return {
+        "mode": settings.link_count_mode,
+        "counter": await get_link_counter(connection),
+        "exact": await count_links(connection),
+    }
+
+
+@router.post("/counts/refresh")
+async def refresh_counts(session: AsyncSession = Depends(get_session)):
+    """Пересчитать счётчик ссылок"""
+    logger.info("Refreshing link counter")
+    return {"mode": settings.link_count_mode, "counter": await refresh_link_counter(session)}
@@ -0,0 +1,270 @@
+import csv
+import io
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.allocator import short_name_allocator
+from app.bloom import short_name_filter
+from app.config import settings
+from app.database import bulk_create_links, get_read_connection, get_session, iter_link_batches
+from app.importer import LinkImporter, iter_raw_records
+from app.invalidation import link_change_bus
+from app.routes.links import MAX_ALLOCATION_ATTEMPTS, CreateLinkRequest
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+def is_ndjson(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in NDJSON_MEDIA_TYPES
+
+
+async def iter_ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    """Построчно читает тело запроса, не загружая его целиком"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def iter_bulk_items(request: Request) -> AsyncIterator[tuple[int, object]]:
+    """Отдаёт элементы JSON-массива или NDJSON-потока; ошибки разбора — как ValueError"""
+    if is_ndjson(request):
+        index = 0
+        async for line in iter_ndjson_lines(request):
+            try:
+                yield index, json.loads(line)
+            except ValueError as e:
+                yield index, ValueError(f"Invalid JSON: {e}")
+            index += 1
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}") from e
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of links")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def validate_item(index: int, raw: object, seen: set[str]) -> CreateLinkRequest | dict:
+    """Возвращает валидный запрос или результат с ошибкой для элемента"""
+    if isinstance(raw, ValueError):
+        return {"index": index, "status": "invalid", "errors": str(raw)}
+    try:
+        item = CreateLinkRequest.model_validate(raw)
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False)
+        return {"index": index, "status": "invalid", "errors": errors}
+
+    if item.short_name:
+        key = item.short_name.lower()
+        if key in seen:
+            return {"index": index, "status": "conflict", "short_name": item.short_name}
+        seen.add(key)
+    return item
+
+
+async def insert_chunk(
+    session: AsyncSession, chunk: list[tuple[int, CreateLinkRequest]], results: list[dict]
+) -> None:
+    pending = chunk
+    for _ in range(MAX_ALLOCATION_ATTEMPTS):
+        now = datetime.utcnow()
+        rows = []
+        for _, item in pending:
+            short_name = item.short_name or await short_name_allocator.allocate(session)
+            rows.append(
+                {
+                    "short_name": short_name,
+                    "original_url": item.original_url,
+                    "created_at": now,
+                    "clicks": 0,
+                }
+            )
+
+        inserted = await bulk_create_links(
+            session, rows, change_origin=link_change_bus.change_origin
+        )
+        created = {name.lower(): link_id for link_id, name in inserted}
+
+        retry = []
+        for (index, item), row in zip(pending, rows, strict=True):
+            short_name = row["short_name"]
+            link_id = created.get(short_name.lower())
+            if link_id is not None:
+                short_name_filter.add(short_name)
+                results.append(
+                    {
+                        "index": index,
+                        "status": "created",
+                        "id": link_id,
+                        "short_name": short_name,
+                        "short_url": f"/r/{short_name}",
+                    }
+                )
+            elif item.short_name:
+                results.append({"index": index, "status": "conflict", "short_name": short_name})
+            else:
+                # Сгенерированное имя совпало с заданным вручную — берём следующее
+                retry.append((index, item))
+
+        pending = retry
+        if not pending:
+            break
+
+    for index, _ in pending:
+        results.append({"index": index, "status": "error", "detail": "Failed to allocate name"})
+
+
+async def iter_text_lines(request: Request) -> AsyncIterator[str]:
+    async for line in iter_ndjson_lines(request):
+        yield line.decode("utf-8", errors="replace")
+
+
+@router.post("/links/import")
+async def import_links_endpoint(
+    request: Request,
+    format: str | None = Query(None, pattern="^(csv|ndjson)$"),
+    session: AsyncSession = Depends(get_session),
+):
+    """Импортировать ссылки из CSV или NDJSON, сохраняя заданные short_name"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    format = format or ("csv" if content_type == "text/csv" else "ndjson")
+    logger.info(f"POST /api/links/import - format: {format}")
+
+    importer = LinkImporter(
+        batch_size=settings.import_batch_size,
+        transaction_size=settings.import_transaction_size,
+    )
+    try:
+        return await importer.run(session, iter_raw_records(iter_text_lines(request), format))
+    except Exception as e:
+        logger.error(f"Failed to import links: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to import links") from e
+
+
+EXPORT_FIELDS = (
+    "id",
+    "short_name",
+    "original_url",
+    "short_url",
+    "created_at",
+    "clicks",
+    "last_accessed_at",
+)
+
+
+def export_record(row) -> dict:
+    return {
+        "id": row.id,
+        "short_name": row.short_name,
+        "original_url": row.original_url,
+        "short_url": f"/r/{row.short_name}",
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "clicks": row.clicks,
+        "last_accessed_at": row.last_accessed_at.isoformat() if row.last_accessed_at else None,
+    }
+
+
+async def export_ndjson(connection: AsyncConnection) -> AsyncIterator[str]:
+    async for batch in iter_link_batches(connection, settings.export_batch_size):
+        yield "".join(json.dumps(export_record(row)) + "\n" for row in batch)
+
+
+async def export_csv(connection: AsyncConnection) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    async for batch in iter_link_batches(connection, settings.export_batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(export_record(row) for row in batch)
+        yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
+
+
+@router.get("/links/export")
+async def export_links(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    connection: AsyncConnection = Depends(get_read_connection),
+):
+    """Выгрузить все ссылки потоком в NDJSON или CSV"""
+    logger.info(f"GET /api/links/export - format: {format}")
+
+    generator, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        generator(connection),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="links.{format}"'},
+    )
+
+
+@router.post("/links/bulk")
+async def bulk_create(request: Request, session: AsyncSession = Depends(get_session)):
+    """Массово создать ссылки из JSON-массива или NDJSON-потока"""
+    logger.info("POST /api/links/bulk")
+    started = time.perf_counter()
+
+    try:
+        results: list[dict] = []
+        seen: set[str] = set()
+        chunk: list[tuple[int, CreateLinkRequest]] = []
+
+        async for index, raw in iter_bulk_items(request):
+            item = validate_item(index, raw, seen)
+            if isinstance(item, dict):
+                results.append(item)
+                continue
+
+            chunk.append((index, item))
+            if len(chunk) >= settings.bulk_chunk_size:
+                await insert_chunk(session, chunk, results)
+                chunk = []
+
+        if chunk:
+            await insert_chunk(session, chunk, results)
+
+        results.sort(key=lambda result: result["index"])
+        summary = dict.fromkeys(("created", "conflict", "invalid", "error"), 0)
+        for result in results:
+            summary[result["status"]] += 1
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Bulk create finished: {summary} in {elapsed:.3f}s "
+            f"({len(results) / elapsed if elapsed else 0:.0f} items/s)"
+        )
+        return {**summary, "total": len(results), "results": results}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to bulk create links: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to bulk create links") from e
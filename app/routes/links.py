@@ -1,34 +1,51 @@
 import logging
-import random
-import string
+from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from pydantic import BaseModel, Field, ValidationError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 
+from app.allocator import short_name_allocator
+from app.bloom import short_name_filter
+from app.cache import redirect_cache
+from app.clicks import click_tracker
 from app.database import (
     create_link,
     delete_link,
-    get_all_links,
+    delete_links,
+    get_click_rollups,
     get_link_by_id,
-    get_link_by_short_name,
+    get_paginated_links,
+    get_read_connection,
+    get_redirect_target,
     get_session,
     update_link,
 )
-from app.models import ShortenedLink
+from app.filters import (
+    FilterError,
+    build_link_conditions,
+    parse_filter,
+    parse_ids,
+    parse_sort,
+)
+from app.invalidation import link_change_bus
+from app.models import SHORT_NAME_PATTERN, ShortenedLink
 
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Редирект подключается в корень приложения, остальные маршруты — под /api
+redirect_router = APIRouter()
+
 
 class CreateLinkRequest(BaseModel):
-    """Модель для создания сокращенной ссылки"""
+    """Модель для создания сокращенной ссылки (без short_name имя генерируется)"""
 
     original_url: str = Field(..., min_length=1)
-    short_name: str = Field(..., min_length=1, max_length=255)
+    short_name: str | None = Field(None, min_length=1, max_length=255, pattern=SHORT_NAME_PATTERN)
 
     class Config:
         json_schema_extra = {
@@ -43,7 +60,7 @@ class UpdateLinkRequest(BaseModel):
     """Модель для обновления ссылки"""
 
     original_url: str = Field(..., min_length=1)
-    short_name: str = Field(..., min_length=1, max_length=255)
+    short_name: str = Field(..., min_length=1, max_length=255, pattern=SHORT_NAME_PATTERN)
 
 
 class LinkResponse(BaseModel):
@@ -58,28 +75,67 @@ class LinkResponse(BaseModel):
         from_attributes = True
 
 
-def generate_short_name(length: int = 8) -> str:
-    """Генерирует случайное короткое имя"""
-    characters = string.ascii_letters + string.digits
-    short_name = "".join(random.choice(characters) for _ in range(length))
-    logger.debug(f"Generated short_name: {short_name}")
-    return short_name
+class LinkDetailResponse(LinkResponse):
+    """Модель ответа со ссылкой и статистикой переходов"""
+
+    clicks: int = 0
+    last_accessed_at: datetime | None = None
+
+
+MAX_ALLOCATION_ATTEMPTS = 5
+
+
+async def create_link_with_generated_name(
+    session: AsyncSession, original_url: str
+) -> ShortenedLink:
+    """Создаёт ссылку с именем из последовательности"""
+    for _ in range(MAX_ALLOCATION_ATTEMPTS):
+        short_name = await short_name_allocator.allocate(session)
+        logger.debug(f"Generated short_name: {short_name}")
+        created = await create_link(
+            session,
+            ShortenedLink(short_name=short_name, original_url=original_url),
+            change_origin=link_change_bus.change_origin,
+        )
+        if created:
+            return created
+        # Сгенерированное имя может совпасть только с заданным вручную
+        logger.warning(f"Generated short_name is taken by a custom link: {short_name}")
+
+    raise HTTPException(status_code=500, detail="Failed to allocate short name")
 
 
-@router.get("/r/{short_name}")
-async def redirect_to_original(short_name: str, session: AsyncSession = Depends(get_session)):
+@redirect_router.get("/r/{short_name}")
+async def redirect_to_original(
+    short_name: str, connection: AsyncConnection = Depends(get_read_connection)
+):
     """Редирект по короткой ссылке на оригинальный URL"""
     logger.info(f"GET /r/{short_name}")
 
     try:
-        link = await get_link_by_short_name(session, short_name)
+        cached = redirect_cache.get(short_name)
+        if cached:
+            click_tracker.record(cached.link_id)
+            logger.info(f"Redirecting {short_name} to {cached.original_url} (cached)")
+            return RedirectResponse(url=cached.original_url, status_code=301)
+
+        if not short_name_filter.might_contain(short_name):
+            logger.warning(f"Short link not found (filtered): {short_name}")
+            raise HTTPException(status_code=404, detail="Short link not found")
 
-        if not link:
+        generation = redirect_cache.generation
+        target = await get_redirect_target(connection, short_name)
+
+        if not target:
             logger.warning(f"Short link not found: {short_name}")
             raise HTTPException(status_code=404, detail="Short link not found")
 
-        logger.info(f"Redirecting {short_name} to {link.original_url}")
-        return RedirectResponse(url=link.original_url, status_code=301)
+        link_id, original_url = target
+        redirect_cache.set(short_name, link_id, original_url, generation)
+        click_tracker.record(link_id)
+
+        logger.info(f"Redirecting {short_name} to {original_url}")
+        return RedirectResponse(url=original_url, status_code=301)
     except HTTPException:
         raise
     except Exception as e:
@@ -87,39 +143,54 @@ async def redirect_to_original(short_name: str, session: AsyncSession = Depends(
         raise HTTPException(status_code=500, detail="Failed to redirect") from e
 
 
+def parse_range(range: str | None) -> tuple[int, int | None]:
+    """Разбирает `range=[start,end]`; некорректный диапазон означает весь список"""
+    if not range:
+        return 0, None
+    try:
+        start, end = map(int, range.strip("[]").split(","))
+        logger.debug(f"Parsed range: start={start}, end={end}")
+        return start, end
+    except (ValueError, IndexError) as e:
+        logger.warning(f"Failed to parse range '{range}': {e}")
+        return 0, None
+
+
 @router.get("/links")
 async def get_links(
-    session: AsyncSession = Depends(get_session),
+    connection: AsyncConnection = Depends(get_read_connection),
     range: str = Query(None),
     filter: str = Query(None),
     sort: str = Query(None),
+    after_id: int | None = Query(None, ge=0),
 ):
-    """Получить все сокращенные ссылки с поддержкой пагинации"""
+    """Получить сокращенные ссылки с пагинацией на стороне БД"""
     try:
-        logger.debug(f"GET /api/links - range: {range}, filter: {filter}, sort: {sort}")
-
-        links = await get_all_links(session)
-        logger.debug(f"Total links fetched: {len(links)}")
+        logger.debug(
+            f"GET /api/links - range: {range}, filter: {filter}, sort: {sort}, after_id: {after_id}"
+        )
 
-        total = len(links)
+        start, end = parse_range(range)
 
-        start = 0
-        end = total
+        try:
+            conditions = build_link_conditions(parse_filter(filter))
+            sort_field, descending = parse_sort(sort)
+            if after_id is not None and sort_field != "id":
+                raise FilterError("after_id is only supported when sorting by id")
+        except FilterError as e:
+            logger.warning(f"Invalid filter '{filter}' or sort '{sort}': {e}")
+            raise HTTPException(status_code=400, detail=str(e)) from e
 
-        if range:
-            try:
-                range_str = range.strip("[]")
-                start, end = map(int, range_str.split(","))
-                logger.debug(f"Parsed range: start={start}, end={end}")
-            except (ValueError, IndexError) as e:
-                logger.warning(f"Failed to parse range '{range}': {e}")
-                pass
+        links, total = await get_paginated_links(
+            connection, start, end, after_id, conditions, sort_field, descending
+        )
+        logger.debug(f"Paginated links count: {len(links)}")
 
-        paginated_links = links[start:end]
-        logger.debug(f"Paginated links count: {len(paginated_links)}")
+        if end is None:
+            end = total
 
         response_data = []
-        for link in paginated_links:
+        for link in links:
             try:
                 response_data.append(
                     LinkResponse(
@@ -136,12 +207,16 @@ async def get_links(
             f"Returning {len(response_data)} links with range=[{start},{end}], total={total}"
         )
 
-        from fastapi.responses import JSONResponse
+        headers = {"Content-Range": f"items {start}-{end}/{total}"}
+        if links and len(links) == end - start and sort_field == "id":
+            headers["X-Next-After-Id"] = str(links[-1].id)
 
         return JSONResponse(
             content=[link.model_dump() for link in response_data],
-            headers={"Content-Range": f"items {start}-{end}/{total}"},
+            headers=headers,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch links: {e}", exc_info=True)
         import traceback
@@ -165,14 +240,19 @@ async def create_short_link(
 
         logger.info(f"Creating short link: {short_name} -> {original_url}")
 
-        # Проверяем, не занято ли имя
-        existing = await get_link_by_short_name(session, short_name)
-        if existing:
-            logger.warning(f"Short name already exists: {short_name}")
-            raise HTTPException(status_code=400, detail=f"Short name '{short_name}' already exists")
+        if short_name is None:
+            created_link = await create_link_with_generated_name(session, original_url)
+        else:
+            link = ShortenedLink(short_name=short_name, original_url=original_url)
+            created_link = await create_link(
+                session, link, change_origin=link_change_bus.change_origin
+            )
+            if not created_link:
+                raise HTTPException(
+                    status_code=400, detail=f"Short name '{short_name}' already exists"
+                )
 
-        link = ShortenedLink(short_name=short_name, original_url=original_url)
-        created_link = await create_link(session, link)
+        short_name_filter.add(created_link.short_name)
 
         response = LinkResponse(
             id=created_link.id,
@@ -181,7 +261,9 @@ async def create_short_link(
             short_url=f"/r/{created_link.short_name}",
         )
 
-        logger.info(f"Link created successfully: id={created_link.id}, short_name={short_name}")
+        logger.info(
+            f"Link created successfully: id={created_link.id}, short_name={created_link.short_name}"
+        )
         return response
 
     except HTTPException:
@@ -198,22 +280,30 @@ async def create_short_link(
 
 
 @router.get("/links/{link_id}")
-async def get_link(link_id: int, session: AsyncSession = Depends(get_session)):
+async def get_link(link_id: int, connection: AsyncConnection = Depends(get_read_connection)):
     """Получить информацию о ссылке по ID"""
     logger.info(f"GET /api/links/{link_id}")
 
     try:
-        link = await get_link_by_id(session, link_id)
+        link = await get_link_by_id(connection, link_id)
 
         if not link:
             logger.warning(f"Link not found: {link_id}")
             raise HTTPException(status_code=404, detail="Link not found")
 
-        return LinkResponse(
+        # Добавляем клики, которые ещё не сброшены в БД
+        pending_clicks, pending_accessed_at = click_tracker.pending(link.id)
+        last_accessed_at = link.last_accessed_at
+        if pending_accessed_at and (not last_accessed_at or pending_accessed_at > last_accessed_at):
+            last_accessed_at = pending_accessed_at
+
+        return LinkDetailResponse(
             id=link.id,
             short_name=link.short_name,
             original_url=link.original_url,
             short_url=f"/r/{link.short_name}",
+            clicks=link.clicks + pending_clicks,
+            last_accessed_at=last_accessed_at,
         )
     except HTTPException:
         raise
@@ -222,6 +312,61 @@ async def get_link(link_id: int, session: AsyncSession = Depends(get_session)):
         raise HTTPException(status_code=500, detail="Failed to fetch link") from e
 
 
+STATS_GRANULARITIES = {
+    "minute": lambda dt: dt.replace(second=0, microsecond=0),
+    "hour": lambda dt: dt.replace(minute=0, second=0, microsecond=0),
+    "day": lambda dt: dt.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+
+@router.get("/links/{link_id}/stats")
+async def get_link_stats(
+    link_id: int,
+    granularity: str = Query("hour", pattern="^(minute|hour|day)$"),
+    start: datetime | None = Query(None, alias="from"),
+    end: datetime | None = Query(None, alias="to"),
+    connection: AsyncConnection = Depends(get_read_connection),
+):
+    """Получить временной ряд переходов по ссылке"""
+    logger.info(f"GET /api/links/{link_id}/stats - granularity: {granularity}")
+
+    try:
+        end = (end or datetime.utcnow()).replace(tzinfo=None)
+        start = (start or end - timedelta(days=1)).replace(tzinfo=None)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'")
+
+        link = await get_link_by_id(connection, link_id)
+        if not link:
+            logger.warning(f"Link not found: {link_id}")
+            raise HTTPException(status_code=404, detail="Link not found")
+
+        # Минутные бакеты старше окна хранения уже свёрнуты в часовые,
+        # поэтому складываем оба вида в бакеты запрошенной гранулярности
+        truncate = STATS_GRANULARITIES[granularity]
+        series: dict[datetime, int] = {}
+        for bucket, clicks in await get_click_rollups(connection, link_id, start, end):
+            key = truncate(bucket)
+            series[key] = series.get(key, 0) + clicks
+
+        return {
+            "link_id": link_id,
+            "granularity": granularity,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "total": sum(series.values()),
+            "buckets": [
+                {"bucket": bucket.isoformat(), "clicks": clicks}
+                for bucket, clicks in sorted(series.items())
+            ],
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to fetch stats for link {link_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch link stats") from e
+
+
 @router.put("/links/{link_id}")
 async def update_link_endpoint(
     link_id: int, request: UpdateLinkRequest, session: AsyncSession = Depends(get_session)
@@ -237,12 +382,21 @@ async def update_link_endpoint(
         original_url = request.original_url
         short_name = request.short_name
 
-        updated = await update_link(session, link_id, original_url, short_name)
+        updated = await update_link(
+            session,
+            link_id,
+            original_url,
+            short_name,
+            change_origin=link_change_bus.change_origin,
+        )
 
         if not updated:
             logger.warning(f"Link not found: {link_id}")
             raise HTTPException(status_code=404, detail="Link not found")
 
+        redirect_cache.invalidate(link_id=link_id, short_name=short_name)
+        short_name_filter.add(short_name)
+
         return LinkResponse(
             id=updated.id,
             short_name=updated.short_name,
@@ -259,19 +413,59 @@ async def update_link_endpoint(
         raise HTTPException(status_code=500, detail="Failed to update link") from e
 
 
+@router.delete("/links")
+async def delete_links_endpoint(
+    filter: str = Query(..., description='{"id": [1, 2, 3]}'),
+    session: AsyncSession = Depends(get_session),
+):
+    """Удалить несколько ссылок одним запросом (deleteMany в react-admin)"""
+    logger.info(f"DELETE /api/links - filter: {filter}")
+
+    try:
+        filters = parse_filter(filter)
+        if set(filters) != {"id"}:
+            raise FilterError('Bulk delete requires exactly an "id" filter')
+        link_ids = parse_ids(filters["id"])
+    except FilterError as e:
+        logger.warning(f"Invalid bulk delete filter '{filter}': {e}")
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    try:
+        deleted = (
+            await delete_links(session, link_ids, change_origin=link_change_bus.change_origin)
+            if link_ids
+            else []
+        )
+
+        for link_id, short_name in deleted:
+            redirect_cache.invalidate(link_id=link_id, short_name=short_name)
+            click_tracker.discard(link_id)
+            short_name_filter.remove(short_name)
+
+        logger.info(f"Deleted {len(deleted)} links")
+        return [link_id for link_id, _ in deleted]
+    except Exception as e:
+        logger.error(f"Failed to delete links: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to delete links") from e
+
+
 @router.delete("/links/{link_id}", status_code=204)
 async def delete_link_endpoint(link_id: int, session: AsyncSession = Depends(get_session)):
     """Удалить ссылку"""
     logger.info(f"DELETE /api/links/{link_id}")
 
     try:
-        link = await get_link_by_id(session, link_id)
+        short_name = await delete_link(
+            session, link_id, change_origin=link_change_bus.change_origin
+        )
 
-        if not link:
+        if short_name is None:
             logger.warning(f"Link not found: {link_id}")
             raise HTTPException(status_code=404, detail="Link not found")
 
-        await delete_link(session, link_id)
+        redirect_cache.invalidate(link_id=link_id, short_name=short_name)
+        click_tracker.discard(link_id)
+        short_name_filter.remove(short_name)
         logger.info(f"Link deleted: {link_id}")
         return None
     except HTTPException:
@@ -0,0 +1,138 @@
+"""Продакшен-запуск нескольких воркеров uvicorn: python -m app.serve --workers 4"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import tempfile
+
+from app.config import settings
+from app.profiling import profiling_enabled
+
+
+logger = logging.getLogger(__name__)
+
+
+# Каждый воркер держит свой пул соединений с БД, поэтому по умолчанию их немного
+MAX_DEFAULT_WORKERS = 4
+
+CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+
+
+def cgroup_cpu_limit(path: str) -> int | None:
+    """Квота CPU контейнера из cgroup v2, округлённая вверх; None — квоты нет"""
+    try:
+        with open(path) as f:
+            quota, period = f.read().split()[:2]
+        if quota == "max":
+            return None
+        return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        return None
+
+
+def worker_count(requested: int = 0) -> int:
+    """WEB_CONCURRENCY или доступные процессу ядра, но не больше MAX_DEFAULT_WORKERS"""
+    if requested > 0:
+        return requested
+    # В отличие от os.cpu_count() учитывает привязку к ядрам (taskset, cpuset)
+    cpus = os.process_cpu_count() or 1
+    limit = cgroup_cpu_limit(CGROUP_CPU_MAX)
+    if limit is not None:
+        cpus = min(cpus, limit)
+    return min(cpus, MAX_DEFAULT_WORKERS)
+
+
+async def prepare_database() -> None:
+    # Импорт здесь, чтобы родительский процесс не держал соединения после подготовки
+    from app.database import engine, init_db, read_engine
+
+    try:
+        await init_db()
+    finally:
+        await engine.dispose()
+        if read_engine is not engine:
+            await read_engine.dispose()
+
+
+def prepare_metrics_dir() -> str:
+    """Каталог, через который /metrics любого воркера суммирует значения всех воркеров"""
+    directory = settings.metrics_dir or tempfile.mkdtemp(prefix="shortener-metrics-")
+    os.makedirs(directory, exist_ok=True)
+    # Файлы прошлого запуска принадлежат завершённым процессам
+    for name in os.listdir(directory):
+        if name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+    return directory
+
+
+def prepare_profiling_dir() -> str:
+    """Каталог профилей, общий для воркеров: профиль доступен через любой из них"""
+    directory = settings.profiling_dir or tempfile.mkdtemp(prefix="shortener-profiles-")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def uvicorn_options(args: argparse.Namespace) -> dict:
+    options = {
+        "workers": worker_count(args.workers),
+        "timeout_keep_alive": args.keepalive_timeout,
+        "proxy_headers": True,
+        "forwarded_allow_ips": "*",
+        "log_level": args.log_level,
+        "access_log": args.access_log,
+    }
+    if args.port:
+        options.update(host=args.host, port=args.port)
+    else:
+        os.makedirs(os.path.dirname(args.uds) or ".", exist_ok=True)
+        # uvicorn не удаляет сокет, оставшийся после падения, и не может на нём слушать
+        if os.path.exists(args.uds):
+            os.remove(args.uds)
+        options["uds"] = args.uds
+    return options
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run uvicorn workers behind nginx")
+    parser.add_argument("--workers", type=int, default=settings.web_concurrency)
+    parser.add_argument("--uds", default=settings.uvicorn_socket, help="Unix socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="listen on TCP instead of the Unix socket")
+    parser.add_argument(
+        "--keepalive-timeout",
+        type=int,
+        default=settings.uvicorn_keepalive_timeout,
+        help="must exceed keepalive_timeout of the nginx upstream",
+    )
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=True)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    # Миграции и триггеры создаются один раз, а не параллельно в каждом воркере
+    asyncio.run(prepare_database())
+    os.environ["DB_INIT_ON_STARTUP"] = "false"
+    settings.db_init_on_startup = False
+    if settings.metrics_enabled:
+        os.environ["METRICS_DIR"] = settings.metrics_dir = prepare_metrics_dir()
+    if profiling_enabled():
+        os.environ["PROFILING_DIR"] = settings.profiling_dir = prepare_profiling_dir()
+
+    options = uvicorn_options(args)
+    logger.info(f"Starting {options['workers']} uvicorn workers")
+    if settings.database_url.startswith("postgresql"):
+        connections = options["workers"] * (settings.db_pool_size + settings.db_max_overflow)
+        logger.info(f"Workers may open up to {connections} connections, keep max_connections above")
+
+    import uvicorn
+
+    uvicorn.run("app.main:app", **options)
+
+
+if __name__ == "__main__":
+    main()
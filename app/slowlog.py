@@ -0,0 +1,251 @@
+"""Журнал медленных SQL-запросов с автоматическим EXPLAIN"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_GUARD = "slow_query_explain"
+EXPLAINABLE = ("select", "with", "update", "delete")
+MAX_PARAMETERS_LENGTH = 200
+MAX_FINGERPRINTS = 500
+DURATIONS_PER_FINGERPRINT = 1000
+EXPLAIN_TIMEOUT = 5.0
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Нормализует запрос: литералы и параметры — `?`, списки IN и VALUES — `(...)`"""
+    normalized = _STRING.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _LIST.sub("(...)", normalized)
+    normalized = _ROWS.sub("(...), ...", normalized)
+    return _SPACE.sub(" ", normalized).strip()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@dataclass(slots=True)
+class SlowQuery:
+    statement: str
+    fingerprint: str
+    duration_ms: float
+    engine: str
+    parameters: str
+    executed_at: datetime = field(default_factory=datetime.utcnow)
+    plan: list[str] | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "statement": self.statement,
+            "fingerprint": self.fingerprint,
+            "duration_ms": round(self.duration_ms, 3),
+            "engine": self.engine,
+            "parameters": self.parameters,
+            "executed_at": self.executed_at.isoformat(),
+            "plan": self.plan,
+        }
+
+
+class FingerprintStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.durations: deque[float] = deque(maxlen=DURATIONS_PER_FINGERPRINT)
+        self.plan: list[str] | None = None
+        self.explaining = False
+
+    def record(self, duration_ms: float) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.durations.append(duration_ms)
+
+
+class SlowQueryLog:
+    """Кольцевой буфер SQL-запросов дольше порога и агрегаты по их отпечаткам
+
+    Время меряется событиями before/after_cursor_execute движка, поэтому обычные
+    запросы платят только за два вызова perf_counter. Для нового отпечатка план
+    снимается в фоне отдельным соединением; EXPLAIN помечает соединение в
+    connection.info, и его собственные запросы в журнал не попадают.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = 100.0,
+        capacity: int = 200,
+        explain: bool = True,
+    ):
+        self.threshold_ms = threshold_ms
+        self.capacity = capacity
+        self.explain = explain
+        self.entries: deque[SlowQuery] = deque(maxlen=capacity)
+        self.fingerprints: OrderedDict[str, FingerprintStats] = OrderedDict()
+        self.explain_failures = 0
+        self._explain_tasks: set[asyncio.Task] = set()
+
+    def instrument(
+        self, engine: AsyncEngine, name: str, explain_engine: AsyncEngine | None = None
+    ) -> None:
+        """Подключает журнал к движку; EXPLAIN выполняется через explain_engine"""
+        explain_engine = explain_engine or engine
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._slowlog_started = time.perf_counter()
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "_slowlog_started", None)
+            if started is None or conn.info.get(EXPLAIN_GUARD):
+                return
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= self.threshold_ms:
+                self.record(statement, parameters, duration_ms, name, executemany, explain_engine)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+    def record(
+        self,
+        statement: str,
+        parameters,
+        duration_ms: float,
+        engine_name: str,
+        executemany: bool = False,
+        explain_engine: AsyncEngine | None = None,
+    ) -> SlowQuery:
+        key = fingerprint(statement)
+        entry = SlowQuery(
+            statement=statement,
+            fingerprint=key,
+            duration_ms=duration_ms,
+            engine=engine_name,
+            parameters=repr(parameters)[:MAX_PARAMETERS_LENGTH],
+        )
+        self.entries.append(entry)
+
+        stats = self.fingerprints.get(key)
+        if stats is None:
+            stats = self.fingerprints[key] = FingerprintStats()
+            if len(self.fingerprints) > MAX_FINGERPRINTS:
+                self.fingerprints.popitem(last=False)
+        else:
+            self.fingerprints.move_to_end(key)
+        stats.record(duration_ms)
+        logger.warning(f"Slow query ({duration_ms:.1f} ms, {engine_name}): {key[:200]}")
+
+        if (
+            self.explain
+            and explain_engine is not None
+            and not executemany
+            and stats.plan is None
+            and not stats.explaining
+            and statement.lstrip()[:6].lower().startswith(EXPLAINABLE)
+        ):
+            self._schedule_explain(explain_engine, entry, stats, parameters)
+        elif stats.plan is not None:
+            entry.plan = stats.plan
+        return entry
+
+    def _schedule_explain(self, engine: AsyncEngine, entry: SlowQuery, stats, parameters) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        stats.explaining = True
+        task = loop.create_task(self._explain(engine, entry, stats, parameters))
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, engine: AsyncEngine, entry: SlowQuery, stats, parameters) -> None:
+        try:
+            plan = await asyncio.wait_for(
+                explain_statement(engine, entry.statement, parameters), EXPLAIN_TIMEOUT
+            )
+        except Exception as e:
+            self.explain_failures += 1
+            logger.warning(f"Failed to explain slow query: {e}")
+            # Не повторяем EXPLAIN для отпечатка при каждом медленном выполнении
+            plan = [f"EXPLAIN failed: {e}"]
+        finally:
+            stats.explaining = False
+        entry.plan = stats.plan = plan
+
+    async def wait_for_explains(self) -> None:
+        if self._explain_tasks:
+            await asyncio.gather(*self._explain_tasks, return_exceptions=True)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.fingerprints.clear()
+        self.explain_failures = 0
+
+    def snapshot(self, limit: int = 50) -> dict:
+        fingerprints = sorted(
+            self.fingerprints.items(), key=lambda item: item[1].total_ms, reverse=True
+        )
+        return {
+            "threshold_ms": self.threshold_ms,
+            "capacity": self.capacity,
+            "explain": self.explain,
+            "explain_failures": self.explain_failures,
+            "fingerprints": [
+                {
+                    "fingerprint": key,
+                    "count": stats.count,
+                    "total_ms": round(stats.total_ms, 3),
+                    "p50_ms": round(percentile(list(stats.durations), 0.5), 3),
+                    "p99_ms": round(percentile(list(stats.durations), 0.99), 3),
+                    "max_ms": round(stats.max_ms, 3),
+                    "plan": stats.plan,
+                }
+                for key, stats in fingerprints[:limit]
+            ],
+            "recent": [entry.to_dict() for entry in reversed(list(self.entries)[-limit:])],
+        }
+
+
+async def explain_statement(engine: AsyncEngine, statement: str, parameters) -> list[str]:
+    """План запроса: EXPLAIN в Postgres, EXPLAIN QUERY PLAN в SQLite"""
+    async with engine.connect() as connection:
+        connection.info[EXPLAIN_GUARD] = True
+        try:
+            if connection.dialect.name == "sqlite":
+                result = await connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+                return [row[-1] for row in result]
+            result = await connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+            return [row[0] for row in result]
+        finally:
+            connection.info.pop(EXPLAIN_GUARD, None)
+            await connection.rollback()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.slow_query_threshold_ms,
+    capacity=settings.slow_query_log_size,
+    explain=settings.slow_query_explain,
+)
@@ -0,0 +1,239 @@
+"""Нагрузочный тест: пропускная способность редиректов в зависимости от числа воркеров
+
+Запуск: python benchmarks/load.py [--workers 1,2,4] [--duration 10] [--concurrency 64]
+
+Для каждого числа воркеров запускает `python -m app.serve` на Unix-сокете с SQLite
+во временном каталоге, создаёт ссылки через /api/links/bulk и нагружает GET /r/{name}
+из нескольких клиентских процессов. С `--url http://localhost` нагружает уже запущенный
+сервер (например, через nginx) без запуска своего.
+
+Клиенты работают на тех же ядрах, что и сервер, поэтому прирост ниже линейного;
+для точных цифр запускайте клиентов на отдельной машине или используйте wrk.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def make_client(base_url: str, uds: str | None):
+    import httpx
+
+    transport = httpx.AsyncHTTPTransport(uds=uds) if uds else None
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    return httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=30)
+
+
+async def wait_until_ready(base_url: str, uds: str | None, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with make_client(base_url, uds) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/ping")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+async def seed(base_url: str, uds: str | None, links: int) -> list[str]:
+    prefix = f"load{int(time.time())}"
+    items = [
+        {"short_name": f"{prefix}-{i}", "original_url": f"https://example.com/{i}"}
+        for i in range(links)
+    ]
+    async with make_client(base_url, uds) as client:
+        response = await client.post("/api/links/bulk", json=items)
+        response.raise_for_status()
+    return [item["short_name"] for item in items]
+
+
+async def open_stream(base_url: str, uds: str | None):
+    if uds:
+        return await asyncio.open_unix_connection(uds)
+    url = urlsplit(base_url)
+    return await asyncio.open_connection(url.hostname, url.port or 80)
+
+
+async def fetch_status(reader, writer, host: str, path: str) -> int:
+    """Один запрос по keep-alive соединению; httpx на клиенте съедал бы больше CPU, чем сервер"""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            await reader.readexactly(int(line.split(b":", 1)[1]))
+    return status
+
+
+async def hammer(
+    base_url: str, uds: str | None, names: list[str], concurrency: int, duration: float
+) -> tuple[int, int, list[float]]:
+    host = urlsplit(base_url).netloc
+    deadline = time.monotonic() + duration
+    latencies: list[float] = []
+    errors = 0
+
+    async def user(offset: int) -> None:
+        nonlocal errors
+        reader, writer = await open_stream(base_url, uds)
+        i = offset
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                status = await fetch_status(reader, writer, host, f"/r/{names[i % len(names)]}")
+                latencies.append(time.perf_counter() - started)
+                if status != 301:
+                    errors += 1
+                i += concurrency
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(user(offset) for offset in range(concurrency)))
+    return len(latencies), errors, latencies
+
+
+def client_process(args: tuple) -> tuple[int, int, list[float]]:
+    return asyncio.run(hammer(*args))
+
+
+def run_load(
+    base_url: str,
+    uds: str | None,
+    names: list[str],
+    clients: int,
+    concurrency: int,
+    duration: float,
+) -> dict:
+    per_client = max(1, concurrency // clients)
+    with multiprocessing.get_context("spawn").Pool(clients) as pool:
+        results = pool.map(
+            client_process,
+            [(base_url, uds, names, per_client, duration)] * clients,
+        )
+
+    requests = sum(count for count, _, _ in results)
+    latencies = sorted(latency for _, _, samples in results for latency in samples)
+    return {
+        "requests": requests,
+        "errors": sum(errors for _, errors, _ in results),
+        "rps": requests / duration,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+def start_server(directory: Path, workers: int) -> tuple[subprocess.Popen, str]:
+    uds = str(directory / "uvicorn.sock")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{directory / 'load.db'}",
+        "WEB_CONCURRENCY": str(workers),
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "app.serve",
+            "--uds",
+            uds,
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return process, uds
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def print_row(label: str, result: dict, baseline: float | None) -> None:
+    speedup = f"x{result['rps'] / baseline:.2f}" if baseline else "—"
+    print(
+        f"{label:<10}{result['rps']:>10.0f}{result['p50_ms']:>10.2f}"
+        f"{result['p99_ms']:>10.2f}{result['errors']:>8}{speedup:>9}"
+    )
+
+
+def settings_poll_interval() -> float:
+    sys.path.insert(0, str(PROJECT_ROOT))
+    from app.config import settings
+
+    return settings.invalidation_poll_interval_ms / 1000
+
+
+def default_worker_counts() -> str:
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return ",".join(map(str, counts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=default_worker_counts(), help="e.g. 1,2,4")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--links", type=int, default=1000)
+    parser.add_argument("--url", help="load an already running server instead")
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}, clients: {args.clients}, concurrency: {args.concurrency}")
+    print(f"{'workers':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'speedup':>9}")
+
+    if args.url:
+        names = asyncio.run(seed(args.url, None, args.links))
+        result = run_load(args.url, None, names, args.clients, args.concurrency, args.duration)
+        print_row("external", result, None)
+        return
+
+    baseline = None
+    for workers in map(int, args.workers.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            process, uds = start_server(Path(directory), workers)
+            try:
+                base_url = "http://load"
+                asyncio.run(wait_until_ready(base_url, uds))
+                names = asyncio.run(seed(base_url, uds, args.links))
+                # Имена, созданные одним воркером, остальные узнают через шину инвалидации
+                time.sleep(2 * settings_poll_interval())
+                result = run_load(
+                    base_url, uds, names, args.clients, args.concurrency, args.duration
+                )
+            finally:
+                stop_server(process)
+        baseline = baseline or result["rps"]
+        print_row(str(workers), result, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Накладные расходы ProfilingMiddleware на запрос
+
+Запуск: python benchmarks/profiling.py [--requests 200000] [--repeats 5]
+
+Сквозной бенчмарк redirect.py не различает единицы микросекунд, поэтому здесь
+минимальное ASGI-приложение вызывается напрямую:
+
+- "disabled" — приложение как есть: без PROFILING_TOKEN и PROFILING_SAMPLE_RATE
+  middleware не подключается, что проверяется по стеку app.main;
+- "armed" — middleware с токеном, запросы без заголовка X-Profile;
+- "profiled" — каждый запрос под cProfile (PROFILING_SAMPLE_RATE=1).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+SCOPE = {"type": "http", "method": "GET", "path": "/r/bench", "headers": [(b"host", b"bench")]}
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 301, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, requests: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(SCOPE, receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def check_disabled_stack() -> None:
+    from app.main import app
+    from app.profiling import ProfilingMiddleware, profiling_enabled
+
+    assert not profiling_enabled(), "unset PROFILING_TOKEN and PROFILING_SAMPLE_RATE"
+    assert ProfilingMiddleware not in [middleware.cls for middleware in app.user_middleware]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(directory) / 'bench.db'}"
+        check_disabled_stack()
+
+    from app.config import settings
+    from app.profiling import ProfileStore, ProfilingMiddleware
+
+    logging.disable(logging.INFO)
+    settings.profiling_token = "bench"
+    armed = ProfilingMiddleware(endpoint, store=ProfileStore())
+    settings.profiling_token = ""
+    settings.profiling_sample_rate = 1.0
+    profiled = ProfilingMiddleware(endpoint, store=ProfileStore())
+
+    variants = {"disabled": (endpoint, args.requests), "armed": (armed, args.requests)}
+    # cProfile на каждом запросе в сотни раз дороже, хватит меньшей выборки
+    variants["profiled"] = (profiled, max(1, args.requests // 100))
+
+    results = {}
+    for name, (app, requests) in variants.items():
+        asyncio.run(measure(app, requests // 10))  # прогрев
+        results[name] = statistics.median(
+            asyncio.run(measure(app, requests)) for _ in range(args.repeats)
+        )
+
+    print(f"{'variant':<12}{'us/req':>10}{'overhead us':>14}")
+    for name, cost in results.items():
+        print(f"{name:<12}{cost:>10.3f}{cost - results['disabled']:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Стоимость чтения ссылки и страницы списка: ORM-сессия против Core-соединения
+
+Запуск: python benchmarks/read_path.py [--links 1000] [--iterations 5000]
+
+"session per request" воспроизводит прежний get_session: новый async_sessionmaker на
+каждый запрос и ORM-select с identity map. "read connection" — get_read_connection и
+Core-select, которые сейчас используют GET-обработчики. Оба варианта выполняют один и
+тот же SQL на одной SQLite-базе во временном каталоге.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+
+PAGE_SIZE = 25
+
+
+def page_statement(entity_or_columns, offset: int):
+    from sqlmodel import select
+
+    from app.models import ShortenedLink
+
+    return select(*entity_or_columns).order_by(ShortenedLink.id).offset(offset).limit(PAGE_SIZE)
+
+
+async def session_get_link(link_id: int):
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from sqlmodel import select
+
+    from app.database import read_engine
+    from app.models import ShortenedLink
+
+    session_maker = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_maker() as session:
+        result = await session.execute(select(ShortenedLink).where(ShortenedLink.id == link_id))
+        return result.scalar_one_or_none()
+
+
+async def session_get_page(offset: int):
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+    from app.database import read_engine
+    from app.models import ShortenedLink
+
+    session_maker = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_maker() as session:
+        result = await session.execute(page_statement([ShortenedLink], offset))
+        return result.scalars().all()
+
+
+async def connection_get_link(link_id: int):
+    from app.database import get_link_by_id, read_engine
+
+    # То же, что делает зависимость get_read_connection
+    async with read_engine.connect() as connection:
+        return await get_link_by_id(connection, link_id)
+
+
+async def connection_get_page(offset: int):
+    from app.database import read_engine
+    from app.models import ShortenedLink
+
+    async with read_engine.connect() as connection:
+        result = await connection.execute(page_statement(ShortenedLink.__table__.c, offset))
+        return result.all()
+
+
+async def measure(function, links: int, iterations: int) -> tuple[float, float]:
+    for i in range(100):
+        await function(i % links + 1)
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        await function(i % links + 1)
+    latency_us = (time.perf_counter() - started) / iterations * 1_000_000
+
+    tracemalloc.start()
+    peaks = []
+    for i in range(min(iterations, 500)):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await function(i % links + 1)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    return latency_us, sum(peaks) / len(peaks) / 1024
+
+
+async def run(links: int, iterations: int) -> None:
+    from app.database import async_session_maker, bulk_create_links, engine, init_db, read_engine
+
+    logging.disable(logging.INFO)
+    await init_db()
+    async with async_session_maker() as session:
+        rows = [
+            {"short_name": f"bench{i}", "original_url": f"https://example.com/{i}"}
+            for i in range(links)
+        ]
+        await bulk_create_links(session, rows)
+
+    cases = [
+        ("get link", session_get_link, connection_get_link),
+        (f"page of {PAGE_SIZE}", session_get_page, connection_get_page),
+    ]
+    print(f"{'query':<14}{'variant':<22}{'us/op':>10}{'peak KiB':>10}")
+    for name, old, new in cases:
+        old_latency, old_memory = await measure(old, links, iterations)
+        new_latency, new_memory = await measure(new, links, iterations)
+        print(f"{name:<14}{'session per request':<22}{old_latency:>10.1f}{old_memory:>10.1f}")
+        print(f"{'':<14}{'read connection':<22}{new_latency:>10.1f}{new_memory:>10.1f}")
+        print(
+            f"{'':<14}{'reduction':<22}{1 - new_latency / old_latency:>10.0%}"
+            f"{1 - new_memory / old_memory:>10.0%}"
+        )
+
+    await read_engine.dispose()
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(directory) / 'bench.db'}"
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+        asyncio.run(run(args.links, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
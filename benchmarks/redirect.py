@@ -0,0 +1,111 @@
+"""Сравнение пропускной способности /r/{short_name}: маршрут FastAPI и ASGI fast path
+
+Запуск: python benchmarks/redirect.py [--links 1000] [--requests 20000] [--concurrency 32]
+
+"fast path, no metrics" показывает, во сколько обходится MetricsMiddleware и события
+SQLAlchemy для метрик.
+
+Каждый вариант запускается в отдельном процессе со своей SQLite-базой; запросы идут
+через httpx.ASGITransport, поэтому измеряется стоимость приложения без сети.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+VARIANTS = {
+    "route": {"REDIRECT_FAST_PATH": "false"},
+    "fast path": {"REDIRECT_FAST_PATH": "true"},
+    "route, no cache": {"REDIRECT_FAST_PATH": "false", "REDIRECT_CACHE_SIZE": "0"},
+    "fast path, no cache": {"REDIRECT_FAST_PATH": "true", "REDIRECT_CACHE_SIZE": "0"},
+    "fast path, no metrics": {"REDIRECT_FAST_PATH": "true", "METRICS_ENABLED": "false"},
+}
+
+
+async def measure(links: int, requests: int, concurrency: int) -> dict:
+    from httpx import ASGITransport, AsyncClient
+
+    from app.main import app
+
+    logging.disable(logging.INFO)
+    async with app.router.lifespan_context(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            payload = [
+                {"original_url": f"https://example.com/{i}", "short_name": f"bench{i}"}
+                for i in range(links)
+            ]
+            await client.post("/api/links/bulk", json=payload)
+
+            async def worker(offset: int) -> None:
+                for i in range(offset, requests, concurrency):
+                    response = await client.get(f"/r/bench{i % links}", follow_redirects=False)
+                    assert response.status_code == 301, response.text
+
+            await worker(0)  # прогрев
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+    return {"requests_per_second": requests / elapsed, "latency_ms": elapsed / requests * 1000}
+
+
+def run_variant(env: dict, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        variant_env = {
+            **os.environ,
+            **env,
+            "DATABASE_URL": f"sqlite:///{Path(directory) / 'bench.db'}",
+        }
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", *sys.argv[1:]],
+            env=variant_env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+        result = asyncio.run(measure(args.links, args.requests, args.concurrency))
+        print(json.dumps(result))
+        return
+
+    results = {name: run_variant(env, args) for name, env in VARIANTS.items()}
+    print(f"{'variant':<22}{'req/s':>10}{'ms/req':>10}")
+    for name, result in results.items():
+        print(f"{name:<22}{result['requests_per_second']:>10.0f}{result['latency_ms']:>10.3f}")
+    for mode in ("", ", no cache"):
+        gain = (
+            results[f"fast path{mode}"]["requests_per_second"]
+            / results[f"route{mode}"]["requests_per_second"]
+        )
+        print(f"fast path{mode} gain: x{gain:.2f}")
+    overhead = (
+        results["fast path, no metrics"]["requests_per_second"]
+        / results["fast path"]["requests_per_second"]
+        - 1
+    )
+    print(f"metrics overhead on fast path: {overhead:+.1%}")
+
+
+if __name__ == "__main__":
+    main()
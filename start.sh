@@ -19,8 +19,9 @@ nginx -g "daemon off;" &
 NGINX_PID=$!
 sleep 1
 
-log "Starting Uvicorn..."
-uvicorn app.main:app --host 127.0.0.1 --port 8000 &
+# WEB_CONCURRENCY воркеров (по умолчанию — доступные ядра с учётом квоты cgroup, не больше 4) на Unix-сокете, который слушает nginx
+log "Starting Uvicorn (workers: ${WEB_CONCURRENCY:-auto})..."
+python -m app.serve &
 UVICORN_PID=$!
 
 log "Services started. Nginx PID: $NGINX_PID, Uvicorn PID: $UVICORN_PID"
@@ -8,8 +8,13 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 from sqlalchemy.pool import StaticPool
 from sqlmodel import SQLModel
 
+from app.allocator import short_name_allocator
+from app.bloom import short_name_filter
+from app.cache import redirect_cache
+from app.clicks import click_tracker
 from app.config import settings
-from app.database import get_session
+from app.database import get_read_connection, get_session
+from app.fastpath import RedirectFastPath
 from app.main import app
 from app.models import ShortenedLink
 
@@ -18,6 +23,19 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 
+@pytest.fixture(autouse=True)
+def reset_in_memory_state():
+    redirect_cache.clear()
+    click_tracker.clear()
+    short_name_allocator.reset()
+    short_name_filter.reset()
+    yield
+    redirect_cache.clear()
+    click_tracker.clear()
+    short_name_allocator.reset()
+    short_name_filter.reset()
+
+
 @pytest.fixture
 async def async_session():
     engine = create_async_engine(
@@ -38,12 +56,32 @@ async def async_session():
     await engine.dispose()
 
 
+def configure_fast_path(connect) -> None:
+    for middleware in app.user_middleware:
+        if middleware.cls is RedirectFastPath:
+            if connect is None:
+                middleware.kwargs.pop("connect", None)
+            else:
+                middleware.kwargs["connect"] = connect
+    # Стек middleware пересобирается при следующем запросе
+    app.middleware_stack = None
+
+
+@pytest.fixture
+def fast_path_connection(async_session):
+    """Fast path редиректа не видит dependency_overrides, ему передаётся тестовая БД"""
+    configure_fast_path(async_session.bind.connect)
+    yield
+    configure_fast_path(None)
+
+
 @pytest.fixture
-def client(async_session):
+def client(async_session, fast_path_connection):
     def get_session_override():
         return async_session
 
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_connection] = get_session_override
 
     with TestClient(app) as test_client:
         yield test_client
@@ -52,11 +90,12 @@ def client(async_session):
 
 
 @pytest.fixture
-async def async_client(async_session):
+async def async_client(async_session, fast_path_connection):
     def get_session_override():
         return async_session
 
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_connection] = get_session_override
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as test_client:
@@ -0,0 +1,85 @@
+from itertools import pairwise
+
+import pytest
+
+from app.allocator import (
+    SCRAMBLED_LENGTH,
+    SCRAMBLED_SPACE,
+    ShortNameAllocator,
+    encode_base36,
+    permute,
+)
+
+
+class TestEncodeBase36:
+    def test_encodes_zero(self):
+        assert encode_base36(0) == "0"
+
+    def test_encodes_with_padding(self):
+        assert encode_base36(35, length=3) == "00z"
+        assert encode_base36(36) == "10"
+
+    def test_rejects_negative(self):
+        with pytest.raises(ValueError):
+            encode_base36(-1)
+
+
+class TestShortNameAllocator:
+    def test_scrambled_names_are_unique(self):
+        allocator = ShortNameAllocator(secret="test")
+        names = {allocator.encode(value) for value in range(1, 10001)}
+
+        assert len({name.lower() for name in names}) == 10000
+        assert all(len(name) == SCRAMBLED_LENGTH for name in names)
+
+    def test_permutation_is_bijective(self):
+        for space in (1, 36, 1000, 36**3):
+            assert sorted(permute(value, b"key", space) for value in range(space)) == list(
+                range(space)
+            )
+
+    def test_consecutive_names_do_not_reveal_a_step(self):
+        allocator = ShortNameAllocator(secret="test")
+        values = [int(allocator.encode(value), 36) for value in range(1, 100)]
+        steps = {(b - a) % SCRAMBLED_SPACE for a, b in pairwise(values)}
+
+        assert len(steps) == len(values) - 1
+
+    def test_secret_changes_names(self):
+        assert ShortNameAllocator(secret="a").encode(1) != ShortNameAllocator(secret="b").encode(1)
+
+    def test_unscrambled_names_are_sequential(self):
+        allocator = ShortNameAllocator(scramble=False)
+
+        assert [allocator.encode(value) for value in (1, 2, 36)] == ["1", "2", "10"]
+
+    def test_unscrambled_names_do_not_collide_ignoring_case(self):
+        allocator = ShortNameAllocator(scramble=False)
+        names = [allocator.encode(value) for value in range(1, 2000)]
+
+        assert all(name == name.lower() for name in names)
+        assert len({name.lower() for name in names}) == len(names)
+
+    def test_values_beyond_scrambled_space_are_longer(self):
+        allocator = ShortNameAllocator()
+
+        assert len(allocator.encode(SCRAMBLED_SPACE)) == SCRAMBLED_LENGTH + 1
+
+    @pytest.mark.asyncio
+    async def test_allocates_from_reserved_blocks(self, async_session):
+        allocator = ShortNameAllocator(block_size=2, scramble=False)
+
+        names = [await allocator.allocate(async_session) for _ in range(5)]
+
+        assert names == ["1", "2", "3", "4", "5"]
+        assert allocator.reserved_blocks == 3
+
+    @pytest.mark.asyncio
+    async def test_workers_get_disjoint_blocks(self, async_session):
+        first = ShortNameAllocator(block_size=3, scramble=False)
+        second = ShortNameAllocator(block_size=3, scramble=False)
+
+        first_names = [await first.allocate(async_session) for _ in range(3)]
+        second_names = [await second.allocate(async_session) for _ in range(3)]
+
+        assert not set(first_names) & set(second_names)
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.bloom import BloomFilter, ShortNameFilter, short_name_filter
+from app.database import get_read_connection, get_session
+from app.main import app
+from app.models import ShortenedLink
+
+
+@pytest.fixture
+async def client(async_session, fast_path_connection):
+    def get_session_override():
+        return async_session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_connection] = get_session_override
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+    app.dependency_overrides.clear()
+
+
+class TestBloomFilter:
+    def test_added_keys_are_found(self):
+        bloom = BloomFilter(capacity=1000)
+        keys = [f"key{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        assert all(key in bloom for key in keys)
+
+    def test_false_positive_rate_is_bounded(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"key{i}")
+
+        false_positives = sum(f"other{i}" in bloom for i in range(10000))
+
+        assert false_positives < 300
+        assert bloom.false_positive_rate() < 0.02
+
+
+class TestShortNameFilter:
+    def test_not_ready_filter_passes_everything(self):
+        name_filter = ShortNameFilter()
+
+        assert name_filter.might_contain("anything")
+
+    @pytest.mark.asyncio
+    async def test_keys_fold_case_like_sqlite_lower(self, async_session):
+        async_session.add(ShortenedLink(short_name="Äpfel", original_url="https://a.com"))
+        await async_session.commit()
+        name_filter = ShortNameFilter(min_capacity=100)
+
+        await name_filter.rebuild(async_session)
+
+        assert name_filter.might_contain("ÄPFEL")
+        assert not name_filter.might_contain("äpfel")
+
+    @pytest.mark.asyncio
+    async def test_rebuild_loads_existing_names(self, async_session):
+        async_session.add(ShortenedLink(short_name="Exists", original_url="https://a.com"))
+        await async_session.commit()
+        name_filter = ShortNameFilter(min_capacity=100)
+
+        await name_filter.rebuild(async_session)
+
+        assert name_filter.might_contain("exists")
+        assert not name_filter.might_contain("missing")
+        stats = name_filter.stats()
+        assert stats["items"] == 1
+        assert stats["rejected"] == 1
+        assert stats["last_rebuild_seconds"] is not None
+
+    @pytest.mark.asyncio
+    async def test_overlapping_rebuilds_keep_added_names(self, async_session, monkeypatch):
+        name_filter = ShortNameFilter(min_capacity=100)
+        build = name_filter._build
+        release = {"first": asyncio.Event(), "second": asyncio.Event()}
+        order = iter(release)
+
+        async def slow_build(connection):
+            bloom = await build(connection)
+            await release[next(order)].wait()
+            return bloom
+
+        monkeypatch.setattr(name_filter, "_build", slow_build)
+        first = asyncio.create_task(name_filter.rebuild(async_session))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(name_filter.rebuild(async_session))
+        await asyncio.sleep(0)
+        name_filter.add("during-first")
+        release["second"].set()
+        await second
+        name_filter.add("during-both")
+        release["first"].set()
+        await first
+
+        assert name_filter.might_contain("during-first")
+        assert name_filter.might_contain("during-both")
+        assert name_filter._rebuild_adds == []
+
+
+class TestRedirectFiltering:
+    @pytest.mark.asyncio
+    async def test_filtered_miss_skips_database(self, client, async_session, monkeypatch):
+        await short_name_filter.rebuild(async_session)
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("database must not be queried")
+
+        monkeypatch.setattr("app.fastpath.get_redirect_target", fail)
+        monkeypatch.setattr("app.routes.links.get_redirect_target", fail)
+        response = await client.get("/r/nonexistent")
+
+        assert response.status_code == 404
+        assert short_name_filter.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_created_link_is_added_to_filter(self, client, async_session):
+        await short_name_filter.rebuild(async_session)
+
+        await client.post(
+            "/api/links", json={"original_url": "https://example.com", "short_name": "fresh"}
+        )
+        response = await client.get("/r/fresh", follow_redirects=False)
+
+        assert response.status_code == 301
+
+    @pytest.mark.asyncio
+    async def test_filter_stats_endpoint(self, client):
+        response = await client.get("/api/admin/filter")
+
+        assert response.status_code == 200
+        assert "false_positive_rate" in response.json()
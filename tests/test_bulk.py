@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.database import get_read_connection, get_session
+from app.main import app
+from app.models import ShortenedLink
+
+
+@pytest.fixture
+async def client(async_session, fast_path_connection):
+    def get_session_override():
+        return async_session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_connection] = get_session_override
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+    app.dependency_overrides.clear()
+
+
+class TestBulkCreate:
+    @pytest.mark.asyncio
+    async def test_bulk_create_json_array(self, client):
+        payload = [
+            {"original_url": f"https://example.com/{i}", "short_name": f"bulk{i}"} for i in range(3)
+        ]
+
+        response = await client.post("/api/links/bulk", json=payload)
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["created"] == 3
+        assert [result["short_name"] for result in data["results"]] == ["bulk0", "bulk1", "bulk2"]
+        assert (await client.get("/api/links")).headers["Content-Range"] == "items 0-3/3"
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_reports_conflicts_and_invalid_items(self, client, async_session):
+        async_session.add(ShortenedLink(short_name="existing", original_url="https://a.com"))
+        await async_session.commit()
+        payload = [
+            {"original_url": "https://example.com/1", "short_name": "EXISTING"},
+            {"original_url": "https://example.com/2", "short_name": "twice"},
+            {"original_url": "https://example.com/3", "short_name": "Twice"},
+            {"short_name": "no-url"},
+            {"original_url": "https://example.com/5"},
+        ]
+
+        response = await client.post("/api/links/bulk", json=payload)
+
+        data = response.json()
+        statuses = [result["status"] for result in data["results"]]
+        assert statuses == ["conflict", "created", "conflict", "invalid", "created"]
+        assert data["created"] == 2
+        assert data["conflict"] == 2
+        assert data["invalid"] == 1
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_ndjson(self, client):
+        lines = [
+            json.dumps({"original_url": "https://example.com/1", "short_name": "nd1"}),
+            "not json",
+            json.dumps({"original_url": "https://example.com/2"}),
+        ]
+
+        response = await client.post(
+            "/api/links/bulk",
+            content="\n".join(lines) + "\n",
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        data = response.json()
+        assert [result["status"] for result in data["results"]] == ["created", "invalid", "created"]
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_in_chunks(self, client, monkeypatch):
+        monkeypatch.setattr("app.routes.bulk.settings.bulk_chunk_size", 2)
+        payload = [{"original_url": f"https://example.com/{i}"} for i in range(5)]
+
+        response = await client.post("/api/links/bulk", json=payload)
+
+        data = response.json()
+        assert data["created"] == 5
+        assert len({result["short_name"] for result in data["results"]}) == 5
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_rejects_non_array(self, client):
+        response = await client.post("/api/links/bulk", json={"original_url": "https://a.com"})
+
+        assert response.status_code == 400
+
+
+class TestExport:
+    @pytest.mark.asyncio
+    async def test_export_ndjson(self, client, monkeypatch):
+        monkeypatch.setattr("app.routes.bulk.settings.export_batch_size", 2)
+        payload = [
+            {"original_url": f"https://example.com/{i}", "short_name": f"exp{i}"} for i in range(5)
+        ]
+        await client.post("/api/links/bulk", json=payload)
+
+        response = await client.get("/api/links/export")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [record["short_name"] for record in records] == [f"exp{i}" for i in range(5)]
+        assert records[0]["short_url"] == "/r/exp0"
+        assert records[0]["clicks"] == 0
+
+    @pytest.mark.asyncio
+    async def test_export_csv(self, client):
+        payload = [{"original_url": "https://example.com/a,b", "short_name": "csv1"}]
+        await client.post("/api/links/bulk", json=payload)
+
+        response = await client.get("/api/links/export", params={"format": "csv"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 1
+        assert rows[0]["short_name"] == "csv1"
+        assert rows[0]["original_url"] == "https://example.com/a,b"
+
+    @pytest.mark.asyncio
+    async def test_export_empty_csv_has_header(self, client):
+        response = await client.get("/api/links/export", params={"format": "csv"})
+
+        assert response.status_code == 200
+        assert response.text.strip().split(",")[0] == "id"
+
+    @pytest.mark.asyncio
+    async def test_export_rejects_unknown_format(self, client):
+        response = await client.get("/api/links/export", params={"format": "xml"})
+
+        assert response.status_code == 422
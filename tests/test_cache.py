@@ -0,0 +1,71 @@
+from app.cache import RedirectCache
+
+
+class TestRedirectCache:
+    def test_get_returns_cached_entry(self):
+        cache = RedirectCache(maxsize=10, ttl=60)
+        cache.set("Test", 1, "https://example.com")
+
+        entry = cache.get("test")
+
+        assert entry.link_id == 1
+        assert entry.original_url == "https://example.com"
+        assert cache.hits == 1
+
+    def test_miss_is_counted(self):
+        cache = RedirectCache(maxsize=10, ttl=60)
+
+        assert cache.get("missing") is None
+        assert cache.misses == 1
+
+    def test_lru_eviction(self):
+        cache = RedirectCache(maxsize=2, ttl=60)
+        cache.set("a", 1, "https://a.example.com")
+        cache.set("b", 2, "https://b.example.com")
+        cache.get("a")
+        cache.set("c", 3, "https://c.example.com")
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.stats()["evictions"] == 1
+
+    def test_expired_entry_is_dropped(self, monkeypatch):
+        cache = RedirectCache(maxsize=10, ttl=5)
+        monkeypatch.setattr("app.cache.time.monotonic", lambda: 100.0)
+        cache.set("a", 1, "https://a.example.com")
+        monkeypatch.setattr("app.cache.time.monotonic", lambda: 106.0)
+
+        assert cache.get("a") is None
+        assert cache.stats()["size"] == 0
+
+    def test_invalidate_by_link_id(self):
+        cache = RedirectCache(maxsize=10, ttl=60)
+        cache.set("a", 1, "https://a.example.com")
+
+        cache.invalidate(link_id=1)
+
+        assert cache.get("a") is None
+
+    def test_only_ascii_letters_are_case_folded(self):
+        cache = RedirectCache(maxsize=10, ttl=60)
+        cache.set("Äpfel", 1, "https://a.example.com")
+
+        assert cache.get("ÄPFEL").link_id == 1
+        assert cache.get("äpfel") is None
+
+    def test_fill_read_before_invalidation_is_skipped(self):
+        cache = RedirectCache(maxsize=10, ttl=60)
+        generation = cache.generation
+        cache.invalidate(link_id=1, short_name="a")
+
+        cache.set("a", 1, "https://old.example.com", generation)
+
+        assert cache.get("a") is None
+        assert cache.stats()["stale_fills"] == 1
+
+    def test_disabled_cache(self):
+        cache = RedirectCache(maxsize=0, ttl=60)
+        cache.set("a", 1, "https://a.example.com")
+
+        assert cache.get("a") is None
+        assert cache.stats()["enabled"] is False
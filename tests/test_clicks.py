@@ -0,0 +1,188 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlmodel import select
+
+from app.clicks import ClickTracker, click_tracker
+from app.database import get_read_connection, get_session, record_clicks
+from app.main import app
+from app.models import ClickRollup, ShortenedLink
+
+
+@pytest.fixture
+async def client(async_session, fast_path_connection):
+    def get_session_override():
+        return async_session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_connection] = get_session_override
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+async def link(async_session):
+    link = ShortenedLink(short_name="clicky", original_url="https://example.com")
+    async_session.add(link)
+    await async_session.commit()
+    await async_session.refresh(link)
+    return link
+
+
+class TestClickTracker:
+    def test_record_aggregates_in_memory(self):
+        tracker = ClickTracker()
+        tracker.record(1)
+        tracker.record(1)
+        tracker.record(2)
+
+        assert tracker.pending(1)[0] == 2
+        assert tracker.stats()["pending_clicks"] == 3
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_deltas(self, async_session, link):
+        tracker = ClickTracker()
+        tracker.record(link.id)
+        tracker.record(link.id)
+
+        flushed = await tracker.flush(async_session)
+        await async_session.refresh(link)
+
+        assert flushed == 2
+        assert link.clicks == 2
+        assert link.last_accessed_at is not None
+        assert tracker.pending(link.id) == (0, None)
+
+    @pytest.mark.asyncio
+    async def test_last_accessed_at_never_moves_backwards(self, async_session, link):
+        later = datetime(2024, 1, 1, 12, 0)
+
+        await record_clicks(async_session, [(link.id, 1, later)])
+        await record_clicks(async_session, [(link.id, 1, later - timedelta(minutes=5))])
+        await async_session.refresh(link)
+
+        assert link.clicks == 2
+        assert link.last_accessed_at == later
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_clicks(self, async_session, link, monkeypatch):
+        async def broken(*args, **kwargs):
+            raise RuntimeError("db down")
+
+        monkeypatch.setattr("app.clicks.record_clicks", broken)
+        tracker = ClickTracker()
+        tracker.record(link.id)
+
+        with pytest.raises(RuntimeError):
+            await tracker.flush(async_session)
+
+        assert tracker.pending(link.id)[0] == 1
+
+
+class TestClickEndpoints:
+    @pytest.mark.asyncio
+    async def test_redirect_records_click(self, client, link):
+        await client.get("/r/clicky", follow_redirects=False)
+        await client.get("/r/clicky", follow_redirects=False)
+
+        assert click_tracker.pending(link.id)[0] == 2
+
+    @pytest.mark.asyncio
+    async def test_get_link_includes_flushed_and_pending_clicks(self, client, async_session, link):
+        link_id = link.id
+        await client.get("/r/clicky", follow_redirects=False)
+        await click_tracker.flush(async_session)
+        async_session.expire_all()
+        await client.get("/r/clicky", follow_redirects=False)
+
+        data = (await client.get(f"/api/links/{link_id}")).json()
+
+        assert data["clicks"] == 2
+        assert data["last_accessed_at"] is not None
+
+
+class TestClickRollups:
+    @pytest.mark.asyncio
+    async def test_flush_writes_minute_buckets(self, async_session, link):
+        tracker = ClickTracker()
+        tracker.record(link.id)
+        tracker.record(link.id)
+        await tracker.flush(async_session)
+
+        result = await async_session.execute(select(ClickRollup))
+        rollups = result.scalars().all()
+
+        assert len(rollups) == 1
+        assert rollups[0].granularity == "minute"
+        assert rollups[0].clicks == 2
+
+    @pytest.mark.asyncio
+    async def test_stats_endpoint_groups_by_granularity(self, client, async_session, link):
+        base = datetime(2024, 1, 1, 10, 0)
+        await record_clicks(
+            async_session,
+            [(link.id, 3, base)],
+            [(link.id, base, 1), (link.id, base + timedelta(minutes=5), 2)],
+        )
+
+        response = await client.get(
+            f"/api/links/{link.id}/stats",
+            params={
+                "granularity": "hour",
+                "from": "2024-01-01T00:00:00",
+                "to": "2024-01-02T00:00:00",
+            },
+        )
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["total"] == 3
+        assert data["buckets"] == [{"bucket": "2024-01-01T10:00:00", "clicks": 3}]
+
+    @pytest.mark.asyncio
+    async def test_stats_endpoint_not_found(self, client):
+        response = await client.get("/api/links/999/stats")
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_compaction_rolls_minutes_into_hours(self, client, async_session, link):
+        old = datetime.utcnow() - timedelta(days=3)
+        minute = old.replace(second=0, microsecond=0)
+        await record_clicks(
+            async_session,
+            [(link.id, 3, old)],
+            [(link.id, minute, 1), (link.id, minute + timedelta(seconds=60), 2)],
+        )
+
+        compacted = await ClickTracker(minute_retention=timedelta(hours=24)).compact(async_session)
+
+        rows = (await async_session.execute(select(ClickRollup))).scalars().all()
+        assert compacted == 2
+        assert {row.granularity for row in rows} == {"hour"}
+        assert sum(row.clicks for row in rows) == 3
+
+    @pytest.mark.asyncio
+    async def test_repeated_compaction_does_not_double_count(self, async_session, link):
+        old = datetime.utcnow() - timedelta(days=3)
+        await record_clicks(
+            async_session, [(link.id, 2, old)], [(link.id, old.replace(second=0), 2)]
+        )
+        tracker = ClickTracker(minute_retention=timedelta(hours=24))
+
+        assert await tracker.compact(async_session) == 1
+        assert await tracker.compact(async_session) == 0
+
+        rows = (await async_session.execute(select(ClickRollup))).scalars().all()
+        assert [(row.granularity, row.clicks) for row in rows] == [("hour", 2)]
+
+    def test_first_compaction_waits_for_interval(self):
+        tracker = ClickTracker(compaction_interval=600)
+
+        assert time.monotonic() - tracker.last_compaction < 600
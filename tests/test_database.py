@@ -0,0 +1,407 @@
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel, select
+
+from app.database import (
+    POSTGRES_COUNT_FUNCTIONS,
+    POSTGRES_COUNT_TRIGGERS,
+    _postgres_count_trigger_statements,
+    create_link,
+    create_sqlite_engines,
+    delete_link,
+    delete_links,
+    get_link_by_short_name,
+    get_link_counter,
+    get_paginated_links,
+    migrate_schema,
+    refresh_link_counter,
+    update_link,
+)
+from app.filters import build_link_conditions
+from app.models import (
+    POSTGRES_ONLY_INDEXES,
+    RowCountDelta,
+    ShortenedLink,
+    short_name_lower_index,
+)
+
+
+LEGACY_SCHEMA = """
+CREATE TABLE links (
+    id INTEGER PRIMARY KEY,
+    short_name VARCHAR(255) NOT NULL UNIQUE,
+    original_url VARCHAR(2048) NOT NULL,
+    created_at DATETIME NOT NULL
+)
+"""
+
+
+@pytest.fixture
+async def legacy_engine():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text(LEGACY_SCHEMA))
+        # init_db всегда вызывает create_all перед migrate_schema: он создаёт новые
+        # таблицы, но не меняет существующую links
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+def _index_names(conn):
+    rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).all()
+    return {row[0] for row in rows}
+
+
+class TestShortNameLookup:
+    @pytest.mark.asyncio
+    async def test_lookup_is_case_insensitive(self, async_session):
+        async_session.add(ShortenedLink(short_name="MixedCase", original_url="https://a.com"))
+        await async_session.commit()
+
+        link = await get_link_by_short_name(async_session, "mixedcase")
+
+        assert link is not None
+        assert link.short_name == "MixedCase"
+
+    @pytest.mark.asyncio
+    async def test_lookup_does_not_treat_wildcards_as_patterns(self, async_session):
+        async_session.add(ShortenedLink(short_name="abc", original_url="https://a.com"))
+        await async_session.commit()
+
+        assert await get_link_by_short_name(async_session, "a%") is None
+        assert await get_link_by_short_name(async_session, "a_c") is None
+
+    @pytest.mark.asyncio
+    async def test_lookup_uses_lower_index(self, async_session):
+        result = await async_session.execute(
+            text("EXPLAIN QUERY PLAN SELECT id FROM links WHERE lower(short_name) = lower('x')")
+        )
+
+        plan = " ".join(str(row[-1]) for row in result.all())
+        assert short_name_lower_index.name in plan
+
+
+class TestListQueryPlans:
+    async def plan(self, session, statement) -> str:
+        compiled = statement.compile(
+            dialect=session.bind.dialect, compile_kwargs={"literal_binds": True}
+        )
+        result = await session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))
+        return " ".join(str(row[-1]) for row in result.all())
+
+    @pytest.mark.asyncio
+    async def test_short_name_prefix_uses_lower_index(self, async_session):
+        statement = select(ShortenedLink.id).where(*build_link_conditions({"short_name": "Ab"}))
+
+        plan = await self.plan(async_session, statement)
+
+        assert short_name_lower_index.name in plan
+
+    @pytest.mark.asyncio
+    async def test_sort_by_created_at_uses_index(self, async_session):
+        statement = (
+            select(ShortenedLink.id)
+            .order_by(ShortenedLink.created_at.desc(), ShortenedLink.id.desc())
+            .limit(10)
+        )
+
+        plan = await self.plan(async_session, statement)
+
+        assert "ix_links_created_at" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+class TestMigrateSchema:
+    @pytest.mark.asyncio
+    async def test_creates_lower_index_on_existing_table(self, legacy_engine):
+        async with legacy_engine.begin() as conn:
+            await conn.run_sync(migrate_schema)
+            indexes = await conn.run_sync(_index_names)
+
+        assert short_name_lower_index.name in indexes
+        assert {"ix_links_created_at", "ix_links_original_url"} <= indexes
+        assert not indexes & set(POSTGRES_ONLY_INDEXES)
+
+    def test_postgres_prefix_indexes_use_byte_collation(self):
+        ddl = sorted(
+            str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+            for index in ShortenedLink.__table__.indexes
+            if index.name in POSTGRES_ONLY_INDEXES
+        )
+
+        assert ddl == [
+            'CREATE INDEX ix_links_original_url_bytes ON links (original_url COLLATE "C")',
+            'CREATE INDEX ix_links_short_name_lower_bytes ON links (lower(short_name) COLLATE "C")',
+        ]
+
+    @pytest.mark.asyncio
+    async def test_adds_missing_columns(self, legacy_engine):
+        async with legacy_engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO links (short_name, original_url, created_at) "
+                    "VALUES ('old', 'https://a.com', '2024-01-01')"
+                )
+            )
+            await conn.run_sync(migrate_schema)
+            clicks = (await conn.execute(text("SELECT clicks FROM links"))).scalar()
+
+        assert clicks == 0
+
+    @pytest.mark.asyncio
+    async def test_skips_index_when_case_duplicates_exist(self, legacy_engine):
+        async with legacy_engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO links (short_name, original_url, created_at) VALUES "
+                    "('Dup', 'https://a.com', '2024-01-01'), ('dup', 'https://b.com', '2024-01-01')"
+                )
+            )
+            await conn.run_sync(migrate_schema)
+            indexes = await conn.run_sync(_index_names)
+
+        assert short_name_lower_index.name not in indexes
+
+    @pytest.mark.asyncio
+    async def test_recreates_changelog_without_autoincrement(self, legacy_engine):
+        async with legacy_engine.begin() as conn:
+            await conn.execute(text("DROP TABLE link_changes"))
+            await conn.execute(
+                text(
+                    "CREATE TABLE link_changes (id INTEGER PRIMARY KEY, origin VARCHAR(32), "
+                    "action VARCHAR(16), link_id INTEGER, short_name VARCHAR(255), "
+                    "created_at DATETIME)"
+                )
+            )
+            await conn.run_sync(migrate_schema)
+            ddl = (
+                await conn.execute(
+                    text("SELECT sql FROM sqlite_master WHERE name = 'link_changes'")
+                )
+            ).scalar()
+
+        assert "AUTOINCREMENT" in ddl
+
+
+class TestSqliteProfile:
+    @pytest.mark.asyncio
+    async def test_file_database_uses_wal_and_read_pool(self, tmp_path):
+        writer, reader = create_sqlite_engines(f"sqlite+aiosqlite:///{tmp_path / 'tuned.db'}")
+        try:
+            async with writer.connect() as conn:
+                journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+                synchronous = (await conn.execute(text("PRAGMA synchronous"))).scalar()
+            async with reader.connect() as conn:
+                query_only = (await conn.execute(text("PRAGMA query_only"))).scalar()
+
+            assert journal_mode == "wal"
+            assert synchronous == 1
+            assert query_only == 1
+            assert writer is not reader
+            assert writer.pool.size() == 1
+        finally:
+            await writer.dispose()
+            await reader.dispose()
+
+    @pytest.mark.asyncio
+    async def test_memory_database_shares_one_engine(self):
+        writer, reader = create_sqlite_engines("sqlite+aiosqlite:///:memory:")
+        try:
+            assert writer is reader
+        finally:
+            await writer.dispose()
+
+
+@pytest.fixture
+def captured_statements(async_session):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sync_engine = async_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(sync_engine, "before_cursor_execute", record)
+
+
+class TestCreateLink:
+    @pytest.mark.asyncio
+    async def test_create_is_single_statement(self, async_session, captured_statements):
+        statements = captured_statements
+        link = await create_link(
+            async_session, ShortenedLink(short_name="one", original_url="https://a.com")
+        )
+
+        assert link.id is not None
+        assert link.created_at is not None
+        assert len(statements) == 1
+        assert "ON CONFLICT DO NOTHING" in statements[0]
+
+    @pytest.mark.asyncio
+    async def test_conflict_returns_none(self, async_session):
+        await create_link(
+            async_session, ShortenedLink(short_name="Taken", original_url="https://a.com")
+        )
+
+        duplicate = await create_link(
+            async_session, ShortenedLink(short_name="taken", original_url="https://b.com")
+        )
+
+        assert duplicate is None
+
+
+class TestUpdateAndDeleteLink:
+    @pytest.fixture
+    async def link(self, async_session):
+        return await create_link(
+            async_session, ShortenedLink(short_name="target", original_url="https://a.com")
+        )
+
+    @pytest.mark.asyncio
+    async def test_update_is_single_statement(self, async_session, link, captured_statements):
+        updated = await update_link(async_session, link.id, "https://b.com", "renamed")
+
+        assert updated.short_name == "renamed"
+        assert updated.original_url == "https://b.com"
+        assert len(captured_statements) == 1
+        assert captured_statements[0].startswith("UPDATE")
+
+    @pytest.mark.asyncio
+    async def test_update_missing_returns_none(self, async_session):
+        assert await update_link(async_session, 999, "https://b.com", "renamed") is None
+
+    @pytest.mark.asyncio
+    async def test_delete_returns_short_name(self, async_session, link, captured_statements):
+        deleted = await delete_link(async_session, link.id)
+
+        assert deleted == "target"
+        assert captured_statements[0].startswith("DELETE FROM links")
+        assert await get_link_by_short_name(async_session, "target") is None
+
+    @pytest.mark.asyncio
+    async def test_delete_missing_is_single_statement(self, async_session, captured_statements):
+        assert await delete_link(async_session, 999) is None
+        assert len(captured_statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_many_is_single_links_statement(
+        self, async_session, link, captured_statements
+    ):
+        other = await create_link(
+            async_session, ShortenedLink(short_name="other", original_url="https://b.com")
+        )
+        captured_statements.clear()
+
+        deleted = await delete_links(async_session, [link.id, other.id, 999])
+
+        assert sorted(deleted) == sorted([(link.id, "target"), (other.id, "other")])
+        link_deletes = [s for s in captured_statements if s.startswith("DELETE FROM links")]
+        assert len(link_deletes) == 1
+        assert "IN" in link_deletes[0]
+
+
+class TestLinkCounter:
+    @pytest.fixture
+    async def migrated_session(self, async_session):
+        async_session.add(ShortenedLink(short_name="before", original_url="https://a.com"))
+        await async_session.commit()
+        connection = await async_session.connection()
+        await connection.run_sync(migrate_schema)
+        await async_session.commit()
+        return async_session
+
+    @pytest.mark.asyncio
+    async def test_counter_is_seeded_and_follows_writes(self, migrated_session):
+        session = migrated_session
+        assert await get_link_counter(session) == 1
+
+        created = await create_link(
+            session, ShortenedLink(short_name="after", original_url="https://b.com")
+        )
+        await create_link(session, ShortenedLink(short_name="AFTER", original_url="https://c.com"))
+        assert await get_link_counter(session) == 2
+
+        await delete_links(session, [created.id, 999])
+        assert await get_link_counter(session) == 1
+
+    @pytest.mark.asyncio
+    async def test_counter_mode_skips_count_scan(self, migrated_session, captured_statements):
+        links, total = await get_paginated_links(migrated_session, 0, 10)
+
+        assert total == 1
+        assert not any("count(" in statement.lower() for statement in captured_statements)
+
+    @pytest.mark.asyncio
+    async def test_exact_mode_counts_rows(self, migrated_session, captured_statements, monkeypatch):
+        monkeypatch.setattr("app.database.settings.link_count_mode", "exact")
+
+        links, total = await get_paginated_links(migrated_session, 0, 10)
+
+        assert total == 1
+        assert any("count(" in statement.lower() for statement in captured_statements)
+
+    @pytest.mark.asyncio
+    async def test_missing_counter_falls_back_to_count(self, async_session):
+        async_session.add(ShortenedLink(short_name="one", original_url="https://a.com"))
+        await async_session.commit()
+
+        links, total = await get_paginated_links(async_session, 0, 10)
+
+        assert await get_link_counter(async_session) is None
+        assert total == 1
+
+    @pytest.mark.asyncio
+    async def test_refresh_repairs_drift(self, migrated_session):
+        await migrated_session.execute(text("UPDATE row_counts SET value = 42"))
+        await migrated_session.commit()
+
+        assert await refresh_link_counter(migrated_session) == 1
+
+    @pytest.mark.asyncio
+    async def test_counter_includes_pending_deltas(self, migrated_session):
+        migrated_session.add(RowCountDelta(name="links", delta=3))
+        migrated_session.add(RowCountDelta(name="links", delta=-1))
+        await migrated_session.commit()
+
+        assert await get_link_counter(migrated_session) == 3
+
+    def test_postgres_triggers_do_not_lock_the_counter_row(self):
+        for function in POSTGRES_COUNT_FUNCTIONS:
+            assert "UPDATE row_counts" not in function
+            assert "INSERT INTO row_count_deltas" in function
+            assert "HAVING count(*) > 0" in function
+
+    def test_postgres_triggers_are_created_only_when_missing(self):
+        class Catalog:
+            def __init__(self, existing):
+                self.existing = existing
+
+            def execute(self, statement, parameters):
+                assert "pg_trigger" in str(statement)
+                return Result(self.existing)
+
+        class Result:
+            def __init__(self, rows):
+                self.rows = rows
+
+            def scalars(self):
+                return iter(self.rows)
+
+        fresh = _postgres_count_trigger_statements(Catalog([]))
+        restart = _postgres_count_trigger_statements(Catalog(list(POSTGRES_COUNT_TRIGGERS)))
+
+        assert [s for s in fresh if s.startswith("CREATE TRIGGER")] == list(
+            POSTGRES_COUNT_TRIGGERS.values()
+        )
+        assert not any(s.startswith("CREATE TRIGGER") for s in restart)
+        assert not any(s.startswith("DROP") for s in fresh + restart)
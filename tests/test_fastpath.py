@@ -0,0 +1,117 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.responses import PlainTextResponse
+
+from app import fastpath as app_fastpath
+from app.cache import redirect_cache
+from app.clicks import click_tracker
+from app.database import get_read_connection, get_session
+from app.fastpath import RedirectFastPath
+from app.main import app
+from app.models import ShortenedLink
+
+
+class FallbackApp:
+    """Приложение за быстрым путём: запоминает, какие запросы до него дошли"""
+
+    def __init__(self):
+        self.paths = []
+
+    async def __call__(self, scope, receive, send):
+        self.paths.append(scope["path"])
+        await PlainTextResponse("fallback")(scope, receive, send)
+
+
+@pytest.fixture
+def fallback():
+    return FallbackApp()
+
+
+@pytest.fixture
+async def fast_client(async_session, fallback):
+    fast_path = RedirectFastPath(fallback, connect=async_session.bind.connect)
+    transport = ASGITransport(app=fast_path)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.fixture
+async def link(async_session):
+    link = ShortenedLink(short_name="Fast", original_url="https://example.com/a b?q=1")
+    async_session.add(link)
+    await async_session.commit()
+    return link
+
+
+class TestRedirectFastPath:
+    @pytest.mark.asyncio
+    async def test_redirects_without_reaching_app(self, fast_client, fallback, link):
+        response = await fast_client.get("/r/fast", follow_redirects=False)
+
+        assert response.status_code == 301
+        assert response.headers["location"] == "https://example.com/a%20b?q=1"
+        assert fallback.paths == []
+        assert click_tracker.pending(link.id)[0] == 1
+
+    @pytest.mark.asyncio
+    async def test_second_request_is_served_from_cache(self, fast_client, async_session, link):
+        await fast_client.get("/r/Fast", follow_redirects=False)
+        await async_session.bind.dispose()
+
+        response = await fast_client.get("/r/Fast", follow_redirects=False)
+
+        assert response.status_code == 301
+        assert redirect_cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_invalidation_during_lookup_skips_cache_fill(
+        self, fast_client, link, monkeypatch
+    ):
+        lookup = app_fastpath.get_redirect_target
+
+        async def lookup_then_update(connection, short_name):
+            target = await lookup(connection, short_name)
+            # Ссылку изменили, пока редирект ждал ответа БД
+            redirect_cache.invalidate(link_id=link.id, short_name=link.short_name)
+            return target
+
+        monkeypatch.setattr(app_fastpath, "get_redirect_target", lookup_then_update)
+        response = await fast_client.get("/r/Fast", follow_redirects=False)
+
+        assert response.status_code == 301
+        assert redirect_cache.get("Fast") is None
+        assert redirect_cache.stats()["stale_fills"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_name_is_json_404(self, fast_client):
+        response = await fast_client.get("/r/missing")
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Short link not found"}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        ("method", "path"), [("GET", "/api/links"), ("POST", "/r/fast"), ("GET", "/r/a/b")]
+    )
+    async def test_other_requests_pass_through(self, fast_client, fallback, method, path):
+        response = await fast_client.request(method, path)
+
+        assert response.text == "fallback"
+        assert fallback.paths == [path]
+
+
+class TestMountedFastPath:
+    @pytest.mark.asyncio
+    async def test_app_uses_configured_connection(self, async_session, fast_path_connection, link):
+        app.dependency_overrides[get_session] = lambda: async_session
+        app.dependency_overrides[get_read_connection] = lambda: async_session
+        try:
+            transport = ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/r/fast", follow_redirects=False)
+                duplicate = await client.get("/api/r/fast", follow_redirects=False)
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 301
+        assert duplicate.status_code == 404
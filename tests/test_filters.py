@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.filters import (
+    MAX_FILTER_IDS,
+    FilterError,
+    build_link_conditions,
+    parse_filter,
+    parse_sort,
+)
+
+
+def compile_condition(condition) -> str:
+    return str(condition.compile(dialect=sqlite.dialect()))
+
+
+class TestParseFilter:
+    def test_empty_filter(self):
+        assert parse_filter(None) == {}
+        assert parse_filter("") == {}
+
+    def test_rejects_non_object(self):
+        with pytest.raises(FilterError):
+            parse_filter("[1, 2]")
+
+
+class TestBuildLinkConditions:
+    def test_id_list_becomes_in(self):
+        (condition,) = build_link_conditions({"id": [1, "2"]})
+
+        assert "links.id IN" in compile_condition(condition)
+        assert condition.right.value == [1, 2]
+
+    def test_single_id_for_many_reference(self):
+        (condition,) = build_link_conditions({"id": 5})
+
+        assert condition.right.value == [5]
+
+    def test_datetime_values_are_parsed(self):
+        (condition,) = build_link_conditions({"created_at": "2024-01-15T10:30:00"})
+
+        assert condition.right.value == datetime(2024, 1, 15, 10, 30)
+
+    def test_too_many_ids(self):
+        with pytest.raises(FilterError):
+            build_link_conditions({"id": list(range(MAX_FILTER_IDS + 1))})
+
+    def test_short_name_is_case_insensitive_prefix_range(self):
+        (condition,) = build_link_conditions({"short_name": "AbC"})
+
+        sql = compile_condition(condition)
+        assert "lower(links.short_name) >=" in sql
+        assert "lower(links.short_name) <" in sql
+        assert "LIKE" in sql
+
+    @pytest.mark.parametrize("field", ["short_name", "original_url"])
+    def test_prefix_compares_bytes_on_postgres(self, field):
+        (condition,) = build_link_conditions({field: "z"})
+
+        sql = str(condition.compile(dialect=postgresql.dialect()))
+        assert sql.count('COLLATE "C"') == 3
+        assert 'COLLATE "C"' not in compile_condition(condition)
+
+    def test_range_suffixes(self):
+        conditions = build_link_conditions(
+            {"created_at_gte": "2024-01-01T00:00:00", "created_at_lt": "2024-02-01T00:00:00"}
+        )
+
+        sql = [compile_condition(condition) for condition in conditions]
+        assert sql == ["links.created_at >= ?", "links.created_at < ?"]
+
+    def test_unknown_range_field(self):
+        with pytest.raises(FilterError):
+            build_link_conditions({"missing_gte": 1})
+
+
+class TestParseSort:
+    def test_default_is_id_ascending(self):
+        assert parse_sort(None) == ("id", False)
+
+    def test_descending(self):
+        assert parse_sort('["created_at","DESC"]') == ("created_at", True)
+
+    @pytest.mark.parametrize("raw", ['["clicks","ASC"]', '["id","UP"]', "id", '["id"]'])
+    def test_rejects_invalid_sort(self, raw):
+        with pytest.raises(FilterError):
+            parse_sort(raw)
@@ -0,0 +1,150 @@
+import json
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, select
+
+from app import importer
+from app.database import get_read_connection, get_session
+from app.importer import LinkImporter, iter_raw_records
+from app.main import app
+from app.models import ShortenedLink
+
+
+async def lines_of(text: str):
+    for line in text.splitlines(keepends=True):
+        yield line
+
+
+async def collect(records):
+    return [record async for record in records]
+
+
+@pytest.fixture
+async def client(async_session, fast_path_connection):
+    def get_session_override():
+        return async_session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_connection] = get_session_override
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+    app.dependency_overrides.clear()
+
+
+class TestParsing:
+    @pytest.mark.asyncio
+    async def test_csv_uses_header_and_drops_empty_cells(self):
+        text = 'short_name,original_url,created_at\r\nabc,"https://a.com/x,y",\r\n'
+
+        records = await collect(iter_raw_records(lines_of(text), "csv"))
+
+        assert records == [(2, {"short_name": "abc", "original_url": "https://a.com/x,y"})]
+
+    @pytest.mark.asyncio
+    async def test_csv_reports_wrong_column_count(self):
+        records = await collect(iter_raw_records(lines_of("short_name,original_url\nabc\n"), "csv"))
+
+        assert isinstance(records[0][1], ValueError)
+
+    @pytest.mark.asyncio
+    async def test_ndjson_skips_blank_lines_and_reports_bad_json(self):
+        text = '{"short_name": "a", "original_url": "https://a.com"}\n\n{oops\n'
+
+        records = await collect(iter_raw_records(lines_of(text), "ndjson"))
+
+        assert records[0] == (1, {"short_name": "a", "original_url": "https://a.com"})
+        assert records[1][0] == 3
+        assert isinstance(records[1][1], ValueError)
+
+
+class TestLinkImporter:
+    @pytest.mark.asyncio
+    async def test_imports_in_batches_and_skips_conflicts(self, async_session):
+        async_session.add(ShortenedLink(short_name="taken", original_url="https://old.com"))
+        await async_session.commit()
+        lines = [
+            json.dumps({"short_name": f"imp{i}", "original_url": f"https://e.com/{i}"})
+            for i in range(7)
+        ]
+        lines.append(json.dumps({"short_name": "TAKEN", "original_url": "https://new.com"}))
+        lines.append(json.dumps({"short_name": "no-url"}))
+
+        summary = await LinkImporter(batch_size=3, transaction_size=3).run(
+            async_session, iter_raw_records(lines_of("\n".join(lines)), "ndjson")
+        )
+
+        assert summary["total"] == 9
+        assert summary["inserted"] == 7
+        assert summary["skipped"] == 1
+        assert summary["invalid"] == 1
+        assert summary["errors"][0]["line"] == 9
+        names = (await async_session.execute(select(ShortenedLink.short_name))).scalars().all()
+        assert len(names) == 8
+
+    @pytest.mark.asyncio
+    async def test_keeps_created_at_and_clicks(self, async_session):
+        text = (
+            "short_name,original_url,created_at,clicks\nold,https://a.com,2020-01-02T03:04:05,42\n"
+        )
+
+        await LinkImporter().run(async_session, iter_raw_records(lines_of(text), "csv"))
+
+        link = (await async_session.execute(select(ShortenedLink))).scalar_one()
+        assert link.clicks == 42
+        assert link.created_at.year == 2020
+
+
+class TestImportEndpoint:
+    @pytest.mark.asyncio
+    async def test_import_csv_body(self, client):
+        body = "short_name,original_url\ncsv1,https://a.com\ncsv2,https://b.com\n"
+
+        response = await client.post(
+            "/api/links/import", content=body, headers={"Content-Type": "text/csv"}
+        )
+
+        assert response.status_code == 200
+        assert response.json()["inserted"] == 2
+        assert (await client.get("/r/csv2", follow_redirects=False)).status_code == 301
+
+    @pytest.mark.asyncio
+    async def test_export_then_import_round_trip(self, client, async_session):
+        async_session.add(ShortenedLink(short_name="round", original_url="https://a.com"))
+        await async_session.commit()
+        exported = (await client.get("/api/links/export")).text
+        await async_session.execute(ShortenedLink.__table__.delete())
+        await async_session.commit()
+
+        response = await client.post(
+            "/api/links/import",
+            content=exported,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+        assert response.json()["inserted"] == 1
+
+
+class TestImportFile:
+    @pytest.mark.asyncio
+    async def test_import_file_defers_indexes(self, tmp_path, monkeypatch):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'import.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+        async def init_db():
+            pass
+
+        monkeypatch.setattr(importer, "engine", engine)
+        monkeypatch.setattr(importer, "init_db", init_db)
+        source = tmp_path / "links.csv"
+        source.write_text("short_name,original_url\nfile1,https://a.com\n", encoding="utf-8")
+
+        summary = await importer.import_file(str(source), defer_indexes=True)
+
+        assert summary["inserted"] == 1
+        assert summary["rows_per_second"] >= 0
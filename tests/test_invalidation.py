@@ -0,0 +1,497 @@
+import asyncio
+import os
+import sys
+import textwrap
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import SQLModel, select
+
+import app.invalidation
+from app.bloom import ShortNameFilter
+from app.cache import RedirectCache
+from app.clicks import ClickTracker
+from app.database import (
+    MAX_NOTIFY_PAYLOAD_BYTES,
+    create_link,
+    create_sqlite_engines,
+    encode_link_changes,
+    stage_link_changes,
+    trim_link_changes,
+)
+from app.invalidation import LinkChangeBus, decode_notification
+from app.models import LinkChange, ShortenedLink
+
+
+project_root = Path(__file__).parent.parent
+
+
+def make_bus(engine=None, session_maker=None, poll_interval: float = 0.02) -> LinkChangeBus:
+    return LinkChangeBus(
+        RedirectCache(maxsize=100, ttl=60),
+        ShortNameFilter(min_capacity=100),
+        ClickTracker(),
+        engine=engine,
+        session_maker=session_maker,
+        poll_interval=poll_interval,
+    )
+
+
+async def add_link(engine, short_name: str, change_origin: str | None = None) -> ShortenedLink:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        link = ShortenedLink(short_name=short_name, original_url="https://example.com")
+        return await create_link(session, link, change_origin=change_origin)
+
+
+async def wait_for(predicate, timeout: float = 3.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+async def sqlite_file(tmp_path):
+    """Файл SQLite и пара движков writer/reader, как у одного воркера"""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'bus.db'}"
+    writer, reader = create_sqlite_engines(url)
+    async with writer.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield url, writer, reader
+    await writer.dispose()
+    await reader.dispose()
+
+
+class TestApply:
+    @pytest.mark.asyncio
+    async def test_update_drops_cached_entry_and_adds_name(self, async_session):
+        bus = make_bus()
+        await bus.name_filter.rebuild(async_session)
+        bus.cache.set("old", 1, "https://example.com/old")
+
+        bus.receive("other", [("updated", 1, "new")])
+
+        assert bus.cache.get("old") is None
+        assert bus.name_filter.might_contain("new")
+        assert bus.received == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_discards_pending_clicks(self):
+        bus = make_bus()
+        bus.cache.set("gone", 7, "https://example.com")
+        bus.tracker.record(7)
+
+        bus.receive("other", [("deleted", 7, "gone")])
+
+        assert bus.cache.get("gone") is None
+        assert bus.tracker.pending(7) == (0, None)
+
+    def test_own_changes_are_ignored(self):
+        bus = make_bus()
+        bus.cache.set("mine", 1, "https://example.com")
+
+        bus.receive(bus.origin, [("updated", 1, "mine")])
+
+        assert bus.cache.get("mine") is not None
+        assert bus.received == 0
+
+    @pytest.mark.asyncio
+    async def test_import_rebuilds_filter(self, async_session):
+        bus = make_bus(engine=async_session.bind)
+        await bus.start()
+        async_session.add(ShortenedLink(short_name="imported", original_url="https://a"))
+        await async_session.commit()
+        assert not bus.name_filter.might_contain("imported")
+
+        bus.receive("other", [("imported", None, None)])
+        await bus._rebuild_task
+
+        assert bus.name_filter.might_contain("imported")
+
+    @pytest.mark.asyncio
+    async def test_import_during_rebuild_triggers_another_one(self, async_session, monkeypatch):
+        bus = make_bus(engine=async_session.bind)
+        await bus.start()
+        rebuilds = 0
+
+        async def rebuild_filter():
+            nonlocal rebuilds
+            rebuilds += 1
+            await asyncio.sleep(0.01)
+
+        monkeypatch.setattr(bus, "_rebuild_filter", rebuild_filter)
+        bus.receive("other", [("imported", None, None)])
+        await asyncio.sleep(0)
+        bus.receive("other", [("imported", None, None)])
+        await bus._rebuild_task
+
+        assert rebuilds == 2
+
+
+class TestNotifications:
+    def test_round_trip(self):
+        changes = [("updated", 1, "a"), ("deleted", 2, "b")]
+
+        [payload] = encode_link_changes("origin", changes)
+
+        assert decode_notification(payload) == ("origin", changes)
+
+    def test_large_batches_are_split_under_notify_limit(self):
+        changes = [("created", i, f"name-{i:05d}") for i in range(2000)]
+
+        payloads = encode_link_changes("origin", changes)
+
+        assert len(payloads) > 1
+        assert all(len(payload.encode()) <= MAX_NOTIFY_PAYLOAD_BYTES for payload in payloads)
+        decoded = [change for payload in payloads for change in decode_notification(payload)[1]]
+        assert decoded == changes
+
+
+class TestStageChanges:
+    @pytest.mark.asyncio
+    async def test_sqlite_changes_go_to_changelog(self, async_session):
+        await stage_link_changes(
+            async_session, "origin", [("updated", 1, "a"), ("deleted", 2, "b")]
+        )
+        await async_session.commit()
+
+        rows = (await async_session.execute(select(LinkChange).order_by(LinkChange.id))).scalars()
+        assert [(row.origin, row.action, row.link_id, row.short_name) for row in rows] == [
+            ("origin", "updated", 1, "a"),
+            ("origin", "deleted", 2, "b"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_changes_share_the_write_transaction(self, async_session):
+        await stage_link_changes(async_session, "origin", [("updated", 1, "a")])
+        await async_session.rollback()
+
+        assert (await async_session.execute(select(LinkChange))).first() is None
+
+    @pytest.mark.asyncio
+    async def test_no_origin_records_nothing(self, async_session):
+        created = await add_link(async_session.bind, "quiet")
+
+        assert created is not None
+        assert (await async_session.execute(select(LinkChange))).first() is None
+
+    @pytest.mark.asyncio
+    async def test_change_origin_follows_mode(self, async_session, sqlite_file):
+        _, _, reader = sqlite_file
+        disabled = make_bus(engine=reader)
+        disabled.enabled = False
+
+        assert make_bus(engine=reader).change_origin is not None
+        assert make_bus(engine=async_session.bind).change_origin is None
+        assert disabled.change_origin is None
+
+    @pytest.mark.asyncio
+    async def test_old_entries_are_trimmed(self, async_session):
+        async_session.add(
+            LinkChange(
+                origin="x", action="updated", created_at=datetime.utcnow() - timedelta(days=1)
+            )
+        )
+        async_session.add(LinkChange(origin="y", action="updated", created_at=datetime.utcnow()))
+        await async_session.commit()
+
+        removed = await trim_link_changes(async_session, datetime.utcnow() - timedelta(hours=1))
+
+        assert removed == 1
+        origins = (await async_session.execute(select(LinkChange.origin))).scalars().all()
+        assert origins == ["y"]
+
+    @pytest.mark.asyncio
+    async def test_routes_record_changes(self, async_client, async_session):
+        response = await async_client.post(
+            "/api/links", json={"original_url": "https://example.com", "short_name": "routed"}
+        )
+        link_id = response.json()["id"]
+        await async_client.put(
+            f"/api/links/{link_id}",
+            json={"original_url": "https://example.com/new", "short_name": "renamed"},
+        )
+        await async_client.delete(f"/api/links/{link_id}")
+
+        rows = (await async_session.execute(select(LinkChange).order_by(LinkChange.id))).scalars()
+        assert [(row.action, row.link_id, row.short_name) for row in rows] == [
+            ("created", link_id, "routed"),
+            ("updated", link_id, "renamed"),
+            ("deleted", link_id, "renamed"),
+        ]
+
+
+class TestSqlitePolling:
+    @pytest.mark.asyncio
+    async def test_memory_database_is_not_polled(self, async_session):
+        bus = make_bus(engine=async_session.bind)
+
+        await bus.start()
+
+        assert bus.mode == "local"
+        assert bus.stats()["listening"] is False
+        assert bus.name_filter.ready
+
+    @pytest.mark.asyncio
+    async def test_change_reaches_other_worker(self, sqlite_file):
+        url, writer_a, reader_a = sqlite_file
+        writer_b, reader_b = create_sqlite_engines(url)
+        worker_a = make_bus(engine=reader_a)
+        worker_b = make_bus(engine=reader_b)
+        worker_b.cache.set("shared", 1, "https://example.com/old")
+        await worker_b.start()
+        try:
+            async with AsyncSession(writer_a) as session:
+                await stage_link_changes(session, worker_a.origin, [("updated", 1, "shared")])
+                await session.commit()
+
+            assert await wait_for(lambda: worker_b.cache.get("shared") is None)
+            assert worker_b.received == 1
+        finally:
+            await worker_b.stop()
+            await writer_b.dispose()
+            await reader_b.dispose()
+
+    @pytest.mark.asyncio
+    async def test_own_and_earlier_changes_are_skipped(self, sqlite_file):
+        _, writer, reader = sqlite_file
+        publisher = make_bus(engine=reader)
+        worker = make_bus(engine=reader)
+        async with AsyncSession(writer) as session:
+            await stage_link_changes(session, publisher.origin, [("deleted", 1, "before-start")])
+            await session.commit()
+        await worker.start()
+        try:
+            async with AsyncSession(writer) as session:
+                session.add(LinkChange(origin=worker.origin, action="updated", link_id=2))
+                await session.commit()
+            await asyncio.sleep(worker.poll_interval * 5)
+
+            assert worker.received == 0
+        finally:
+            await worker.stop()
+
+    @pytest.mark.asyncio
+    async def test_filter_covers_names_created_around_start(self, sqlite_file):
+        _, writer, reader = sqlite_file
+        worker = make_bus(engine=reader)
+        await add_link(writer, "before-start")
+        await worker.start()
+        try:
+            await add_link(writer, "after-start", change_origin="other")
+
+            assert worker.name_filter.might_contain("before-start")
+            assert await wait_for(lambda: worker.received == 1)
+            assert worker.name_filter.might_contain("after-start")
+        finally:
+            await worker.stop()
+
+    @pytest.mark.asyncio
+    async def test_change_after_trim_is_delivered(self, sqlite_file):
+        _, writer, reader = sqlite_file
+        worker = make_bus(engine=reader)
+        await worker.start()
+        try:
+            async with AsyncSession(writer) as session:
+                await stage_link_changes(session, "other", [("updated", 1, "first")])
+                await session.commit()
+            assert await wait_for(lambda: worker.received == 1)
+
+            async with AsyncSession(writer) as session:
+                await trim_link_changes(session, datetime.utcnow() + timedelta(seconds=1))
+                await stage_link_changes(session, "other", [("updated", 2, "second")])
+                await session.commit()
+
+            assert await wait_for(lambda: worker.received == 2)
+            assert worker.failures == 0
+        finally:
+            await worker.stop()
+
+    @pytest.mark.asyncio
+    async def test_reset_numbering_forces_resync(self, sqlite_file):
+        _, writer, reader = sqlite_file
+        worker = make_bus(engine=reader)
+        async with AsyncSession(writer) as session:
+            await stage_link_changes(session, "other", [("updated", 1, "a"), ("updated", 2, "b")])
+            await session.commit()
+        await worker.start()
+        try:
+            # Так ведёт себя журнал без AUTOINCREMENT после очистки
+            async with AsyncSession(writer) as session:
+                await session.execute(text("DELETE FROM link_changes"))
+                await session.execute(text("DELETE FROM sqlite_sequence"))
+                await session.commit()
+            await add_link(writer, "renumbered", change_origin="other")
+
+            assert await wait_for(lambda: worker.failures == 1 and worker.stats()["listening"])
+            assert worker.name_filter.might_contain("renumbered")
+        finally:
+            await worker.stop()
+
+    @pytest.mark.asyncio
+    async def test_resubscribe_rebuilds_filter(self, sqlite_file, monkeypatch):
+        _, writer, reader = sqlite_file
+        worker = make_bus(engine=reader)
+        await worker.start()
+        get_data_version = app.invalidation.get_data_version
+        broken = asyncio.Event()
+
+        async def flaky_data_version(connection):
+            if broken.is_set():
+                broken.clear()
+                raise ConnectionError("database is gone")
+            return await get_data_version(connection)
+
+        monkeypatch.setattr(app.invalidation, "get_data_version", flaky_data_version)
+        try:
+            # Изменение, о котором шина не узнала, например сделанное во время сбоя
+            await add_link(writer, "missed")
+            worker.cache.set("stale", 1, "https://example.com/old")
+            assert not worker.name_filter.might_contain("missed")
+            broken.set()
+
+            assert await wait_for(lambda: worker.failures == 1 and worker.stats()["listening"])
+            assert worker.name_filter.might_contain("missed")
+            assert worker.cache.get("stale") is None
+        finally:
+            await worker.stop()
+
+    @pytest.mark.asyncio
+    async def test_poller_trims_changelog(self, sqlite_file, monkeypatch):
+        _, writer, reader = sqlite_file
+        monkeypatch.setattr(app.invalidation, "TRIM_INTERVAL", 0)
+        async with AsyncSession(writer) as session:
+            session.add(
+                LinkChange(
+                    origin="x", action="updated", created_at=datetime.utcnow() - timedelta(days=1)
+                )
+            )
+            await session.commit()
+        worker = make_bus(engine=reader, session_maker=async_sessionmaker(writer))
+        await worker.start()
+        try:
+
+            async def changelog_is_empty():
+                async with AsyncSession(writer) as session:
+                    return (await session.execute(select(LinkChange))).first() is None
+
+            deadline = asyncio.get_running_loop().time() + 3
+            while not await changelog_is_empty():
+                assert asyncio.get_running_loop().time() < deadline
+                await asyncio.sleep(0.01)
+        finally:
+            await worker.stop()
+
+
+PUBLISHER_SCRIPT = textwrap.dedent(
+    """
+    import asyncio
+
+    from app.database import async_session_maker, engine, stage_link_changes
+    from app.invalidation import link_change_bus
+
+
+    async def main():
+        async with async_session_maker() as session:
+            await stage_link_changes(
+                session, link_change_bus.change_origin, [("updated", 1, "shared")]
+            )
+            await session.commit()
+        await engine.dispose()
+
+
+    asyncio.run(main())
+    """
+)
+
+
+class FakeListenerDriver:
+    def __init__(self, fail_unlisten: bool = False):
+        self.fail_unlisten = fail_unlisten
+        self.listeners = {}
+        self.termination_listeners = []
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def remove_listener(self, channel, callback):
+        if self.fail_unlisten:
+            raise ConnectionError("connection is closed")
+        if self.listeners.get(channel) is callback:
+            del self.listeners[channel]
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    def remove_termination_listener(self, callback):
+        self.termination_listeners.remove(callback)
+
+
+class FakeListenerConnection:
+    def __init__(self, driver: FakeListenerDriver):
+        self.driver_connection = driver
+        self.invalidated = False
+
+    async def get_raw_connection(self):
+        return self
+
+    async def invalidate(self):
+        self.invalidated = True
+
+
+class TestPostgresListener:
+    @pytest.mark.asyncio
+    async def test_failed_subscription_removes_listeners(self, monkeypatch):
+        bus = make_bus()
+        driver = FakeListenerDriver()
+        connection = FakeListenerConnection(driver)
+
+        async def failing_subscribed():
+            raise ConnectionError("rebuild failed")
+
+        monkeypatch.setattr(bus, "_subscribed", failing_subscribed)
+        with pytest.raises(ConnectionError):
+            await bus._listen(connection)
+
+        assert driver.listeners == {}
+        assert driver.termination_listeners == []
+        assert not connection.invalidated
+
+    @pytest.mark.asyncio
+    async def test_connection_is_discarded_when_unlisten_fails(self, monkeypatch):
+        bus = make_bus()
+        driver = FakeListenerDriver(fail_unlisten=True)
+        connection = FakeListenerConnection(driver)
+
+        async def subscribed():
+            driver.termination_listeners[0](None)
+
+        monkeypatch.setattr(bus, "_subscribed", subscribed)
+        with pytest.raises(ConnectionError, match="Listener connection closed"):
+            await bus._listen(connection)
+
+        assert connection.invalidated
+
+
+class TestTwoProcesses:
+    @pytest.mark.asyncio
+    async def test_change_from_another_process_invalidates_cache(self, sqlite_file, tmp_path):
+        _, _, reader = sqlite_file
+        worker = make_bus(engine=reader)
+        worker.cache.set("shared", 1, "https://example.com/old")
+        await worker.start()
+        try:
+            env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'bus.db'}"}
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-c", PUBLISHER_SCRIPT, cwd=project_root, env=env
+            )
+            assert await process.wait() == 0
+
+            assert await wait_for(lambda: worker.cache.get("shared") is None)
+        finally:
+            await worker.stop()
@@ -1,18 +1,22 @@
+from datetime import datetime
+
 import pytest
 from httpx import ASGITransport, AsyncClient
 
-from app.database import get_session
+from app.allocator import short_name_allocator
+from app.database import get_read_connection, get_session
 from app.main import app
 from app.models import ShortenedLink
 
 
 @pytest.fixture
-async def client(async_session):
+async def client(async_session, fast_path_connection):
 
     def get_session_override():
         return async_session
 
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_connection] = get_session_override
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://test") as ac:
@@ -50,11 +54,27 @@ class TestCreateLink:
         assert response.status_code == 422
 
     @pytest.mark.asyncio
-    async def test_create_link_missing_short_name(self, client):
+    async def test_create_link_generates_short_name(self, client):
+        payload = {"original_url": "https://example.com/article"}
+        first = await client.post("/api/links", json=payload)
+        second = await client.post("/api/links", json=payload)
+
+        assert first.status_code == 201
+        assert second.status_code == 201
+        assert len(first.json()["short_name"]) == 7
+        assert first.json()["short_name"] != second.json()["short_name"]
+
+    @pytest.mark.asyncio
+    async def test_create_link_generated_name_skips_custom_name(self, client, async_session):
+        taken = short_name_allocator.encode(1)
+        async_session.add(ShortenedLink(short_name=taken, original_url="https://example.com"))
+        await async_session.commit()
+
         payload = {"original_url": "https://example.com/article"}
         response = await client.post("/api/links", json=payload)
 
-        assert response.status_code == 422
+        assert response.status_code == 201
+        assert response.json()["short_name"] == short_name_allocator.encode(2)
 
     @pytest.mark.asyncio
     async def test_create_link_duplicate_short_name(self, client, async_session):
@@ -82,6 +102,14 @@ class TestCreateLink:
 
         assert response.status_code == 422
 
+    @pytest.mark.asyncio
+    async def test_create_link_non_ascii_short_name(self, client):
+        # SQLite lower() не сводит "Äpfel" и "äpfel" к одному имени
+        payload = {"original_url": "https://example.com", "short_name": "Äpfel"}
+        response = await client.post("/api/links", json=payload)
+
+        assert response.status_code == 422
+
 
 class TestGetLinks:
     @pytest.mark.asyncio
@@ -120,6 +148,123 @@ class TestGetLinks:
         assert len(data) == 2
         assert response.headers.get("Content-Range") == "items 0-2/5"
 
+    @pytest.mark.asyncio
+    async def test_get_links_with_offset_range(self, client, async_session):
+        for i in range(5):
+            link = ShortenedLink(short_name=f"link{i}", original_url=f"https://example.com/{i}")
+            async_session.add(link)
+        await async_session.commit()
+
+        response = await client.get("/api/links?range=[2,4]")
+
+        data = response.json()
+        assert [link["short_name"] for link in data] == ["link2", "link3"]
+        assert response.headers.get("Content-Range") == "items 2-4/5"
+
+    @pytest.mark.asyncio
+    async def test_get_links_with_after_id(self, client, async_session):
+        for i in range(5):
+            link = ShortenedLink(short_name=f"link{i}", original_url=f"https://example.com/{i}")
+            async_session.add(link)
+        await async_session.commit()
+
+        first_page = await client.get("/api/links?range=[0,2]")
+        cursor = first_page.headers["X-Next-After-Id"]
+        second_page = await client.get(f"/api/links?range=[0,2]&after_id={cursor}")
+
+        assert [link["short_name"] for link in second_page.json()] == ["link2", "link3"]
+
+    @pytest.mark.asyncio
+    async def test_get_links_filter_by_ids(self, client, async_session):
+        for i in range(5):
+            link = ShortenedLink(short_name=f"link{i}", original_url=f"https://example.com/{i}")
+            async_session.add(link)
+        await async_session.commit()
+
+        response = await client.get('/api/links?filter={"id":[2,4,99]}')
+
+        assert response.status_code == 200
+        assert [link["id"] for link in response.json()] == [2, 4]
+        assert response.headers.get("Content-Range") == "items 0-2/2"
+
+    @pytest.mark.asyncio
+    async def test_get_links_filter_by_field(self, client, async_session):
+        async_session.add(ShortenedLink(short_name="one", original_url="https://a.com"))
+        async_session.add(ShortenedLink(short_name="two", original_url="https://b.com"))
+        await async_session.commit()
+
+        response = await client.get('/api/links?filter={"original_url":"https://b.com"}')
+
+        assert [link["short_name"] for link in response.json()] == ["two"]
+
+    @pytest.mark.asyncio
+    async def test_get_links_search_by_prefix(self, client, async_session):
+        for name in ("alpha", "Alps", "a_x", "beta"):
+            async_session.add(ShortenedLink(short_name=name, original_url=f"https://{name}.com"))
+        await async_session.commit()
+
+        by_name = await client.get('/api/links?filter={"short_name":"AL"}')
+        escaped = await client.get('/api/links?filter={"short_name":"a_"}')
+        by_q = await client.get('/api/links?filter={"q":"https://beta"}')
+
+        assert [link["short_name"] for link in by_name.json()] == ["alpha", "Alps"]
+        assert [link["short_name"] for link in escaped.json()] == ["a_x"]
+        assert [link["short_name"] for link in by_q.json()] == ["beta"]
+
+    @pytest.mark.asyncio
+    async def test_get_links_created_at_range_and_sort(self, client, async_session):
+        for day in (1, 2, 3, 4):
+            async_session.add(
+                ShortenedLink(
+                    short_name=f"day{day}",
+                    original_url="https://a.com",
+                    created_at=datetime(2024, 1, day),
+                )
+            )
+        await async_session.commit()
+
+        response = await client.get(
+            "/api/links",
+            params={
+                "filter": '{"created_at_gte":"2024-01-02","created_at_lte":"2024-01-03T23:59:59"}',
+                "sort": '["created_at","DESC"]',
+            },
+        )
+
+        assert [link["short_name"] for link in response.json()] == ["day3", "day2"]
+        assert response.headers.get("Content-Range") == "items 0-2/2"
+
+    @pytest.mark.asyncio
+    async def test_get_links_after_id_descending(self, client, async_session):
+        for i in range(5):
+            async_session.add(ShortenedLink(short_name=f"link{i}", original_url="https://a.com"))
+        await async_session.commit()
+
+        first_page = await client.get('/api/links?range=[0,2]&sort=["id","DESC"]')
+        cursor = first_page.headers["X-Next-After-Id"]
+        second_page = await client.get(
+            f'/api/links?range=[0,2]&sort=["id","DESC"]&after_id={cursor}'
+        )
+
+        assert [link["id"] for link in first_page.json()] == [5, 4]
+        assert [link["id"] for link in second_page.json()] == [3, 2]
+
+    @pytest.mark.asyncio
+    async def test_get_links_after_id_requires_id_sort(self, client):
+        response = await client.get('/api/links?sort=["created_at","ASC"]&after_id=3')
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_get_links_invalid_sort(self, client):
+        assert (await client.get('/api/links?sort=["clicks","ASC"]')).status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_get_links_invalid_filter(self, client):
+        assert (await client.get("/api/links?filter=not-json")).status_code == 400
+        assert (await client.get('/api/links?filter={"missing":1}')).status_code == 400
+        assert (await client.get('/api/links?filter={"id":["x"]}')).status_code == 400
+
 
 class TestGetLink:
     @pytest.mark.asyncio
@@ -200,6 +345,60 @@ class TestDeleteLink:
 
         assert response.status_code == 404
 
+    @pytest.mark.asyncio
+    async def test_delete_many_links(self, client, async_session):
+        for i in range(3):
+            async_session.add(ShortenedLink(short_name=f"many{i}", original_url="https://a.com"))
+        await async_session.commit()
+        assert (await client.get("/r/many0", follow_redirects=False)).status_code == 301
+
+        response = await client.delete('/api/links?filter={"id":[1,3,99]}')
+
+        assert response.status_code == 200
+        assert sorted(response.json()) == [1, 3]
+        assert (await client.get("/r/many0", follow_redirects=False)).status_code == 404
+        remaining = await client.get("/api/links")
+        assert [link["short_name"] for link in remaining.json()] == ["many1"]
+
+    @pytest.mark.asyncio
+    async def test_delete_many_requires_id_filter(self, client):
+        assert (await client.delete("/api/links")).status_code == 422
+        assert (await client.delete('/api/links?filter={"short_name":"a"}')).status_code == 400
+        assert (await client.delete("/api/links?filter=oops")).status_code == 400
+
+
+class TestReadConnection:
+    @pytest.fixture
+    async def connection_client(self, async_session, fast_path_connection):
+        async def get_read_connection_override():
+            async with async_session.bind.connect() as connection:
+                yield connection
+
+        app.dependency_overrides[get_session] = lambda: async_session
+        app.dependency_overrides[get_read_connection] = get_read_connection_override
+
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as ac:
+            yield ac
+
+        app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_get_handlers_work_on_plain_connection(self, connection_client, async_session):
+        link = ShortenedLink(short_name="core", original_url="https://example.com")
+        async_session.add(link)
+        await async_session.commit()
+
+        listing = await connection_client.get("/api/links")
+        detail = await connection_client.get(f"/api/links/{link.id}")
+        stats = await connection_client.get(f"/api/links/{link.id}/stats")
+        redirect = await connection_client.get("/r/core", follow_redirects=False)
+
+        assert [item["short_name"] for item in listing.json()] == ["core"]
+        assert detail.json()["clicks"] == 0
+        assert stats.json()["total"] == 0
+        assert redirect.status_code == 301
+
 
 class TestRedirect:
     @pytest.mark.asyncio
@@ -219,6 +418,49 @@ class TestRedirect:
 
         assert response.status_code == 404
 
+    @pytest.mark.asyncio
+    async def test_redirect_is_cached(self, client, async_session):
+        link = ShortenedLink(short_name="cached", original_url="https://example.com/cached")
+        async_session.add(link)
+        await async_session.commit()
+
+        await client.get("/r/cached", follow_redirects=False)
+        response = await client.get("/r/CACHED", follow_redirects=False)
+
+        assert response.status_code == 301
+        assert response.headers["location"] == "https://example.com/cached"
+        stats = (await client.get("/api/admin/cache")).json()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    @pytest.mark.asyncio
+    async def test_redirect_cache_invalidated_on_update(self, client, async_session):
+        link = ShortenedLink(short_name="moving", original_url="https://example.com/old")
+        async_session.add(link)
+        await async_session.commit()
+        await async_session.refresh(link)
+
+        await client.get("/r/moving", follow_redirects=False)
+        payload = {"original_url": "https://example.com/new", "short_name": "moving"}
+        await client.put(f"/api/links/{link.id}", json=payload)
+        response = await client.get("/r/moving", follow_redirects=False)
+
+        assert response.headers["location"] == "https://example.com/new"
+
+    @pytest.mark.asyncio
+    async def test_redirect_cache_invalidated_on_delete(self, client, async_session):
+        link = ShortenedLink(short_name="gone", original_url="https://example.com/gone")
+        async_session.add(link)
+        await async_session.commit()
+        await async_session.refresh(link)
+
+        await client.get("/r/gone", follow_redirects=False)
+        await client.delete(f"/api/links/{link.id}")
+        response = await client.get("/r/gone", follow_redirects=False)
+
+        assert response.status_code == 404
+
 
 class TestHealth:
     @pytest.mark.asyncio
@@ -0,0 +1,181 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+from app.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    db_query_duration,
+    http_request_duration,
+    instrument_engine,
+    route_name,
+    statement_operation,
+)
+
+
+class TestRendering:
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry(worker="")
+        requests = registry.register(Counter("requests_total", "Requests", ("route",)))
+        in_flight = registry.register(Gauge("in_flight", "In flight"))
+
+        requests.inc(("list",))
+        requests.inc(("list",))
+        in_flight.inc()
+        in_flight.dec()
+
+        assert registry.render() == (
+            "# HELP requests_total Requests\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{route="list"} 2\n'
+            "# HELP in_flight In flight\n"
+            "# TYPE in_flight gauge\n"
+            "in_flight 0\n"
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry(worker="7")
+        latency = registry.register(Histogram("latency", "Latency", buckets=(0.1, 1.0)))
+
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value)
+
+        lines = registry.render().splitlines()
+        assert lines[2:] == [
+            'latency_bucket{le="0.1",worker="7"} 2',
+            'latency_bucket{le="1.0",worker="7"} 3',
+            'latency_bucket{le="+Inf",worker="7"} 4',
+            'latency_count{worker="7"} 4',
+            'latency_sum{worker="7"} 3.65',
+        ]
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry(worker="")
+        counter = registry.register(Counter("c", "C", ("value",)))
+
+        counter.inc(('a"b\\c\n',))
+
+        assert 'c{value="a\\"b\\\\c\\n"} 1' in registry.render()
+
+    def test_callback_is_read_at_scrape_time(self):
+        registry = MetricsRegistry(worker="")
+        state = {"value": 1}
+        registry.register(Gauge("g", "G", callback=lambda: [((), state["value"])]))
+
+        state["value"] = 5
+
+        assert registry.render().endswith("g 5\n")
+
+
+class TestMultiprocess:
+    def make_registry(self, worker: str, directory) -> tuple[MetricsRegistry, Counter, Gauge]:
+        registry = MetricsRegistry(worker=worker, directory=str(directory))
+        requests = registry.register(Counter("requests_total", "Requests", ("route",)))
+        in_flight = registry.register(Gauge("in_flight", "In flight"))
+        registry.register(Histogram("latency", "Latency", buckets=(0.1,)))
+        return registry, requests, in_flight
+
+    def test_scrape_sums_all_workers(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("app.metrics.process_alive", lambda pid: True)
+        first, first_requests, first_in_flight = self.make_registry("101", tmp_path)
+        second, second_requests, second_in_flight = self.make_registry("102", tmp_path)
+        first_requests.inc(("list",), 2)
+        second_requests.inc(("list",), 3)
+        first_in_flight.inc()
+        second_in_flight.inc()
+        second.metrics[2].observe(0.05)
+        second.write()
+
+        lines = first.render().splitlines()
+
+        assert 'requests_total{route="list"} 5' in lines
+        assert "in_flight 2" in lines
+        assert 'latency_bucket{le="0.1"} 1' in lines
+        assert not any("worker=" in line for line in lines)
+
+    def test_finished_worker_keeps_counters_but_not_gauges(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("app.metrics.process_alive", lambda pid: pid != 102)
+        first, _, _ = self.make_registry("101", tmp_path)
+        second, second_requests, second_in_flight = self.make_registry("102", tmp_path)
+        second_requests.inc(("list",))
+        second_in_flight.inc()
+        second.write()
+
+        lines = first.render().splitlines()
+
+        assert 'requests_total{route="list"} 1' in lines
+        assert "in_flight 1" not in lines
+
+    def test_own_values_are_read_from_memory(self, tmp_path):
+        registry, requests, _ = self.make_registry(str(os.getpid()), tmp_path)
+        registry.write()
+        requests.inc(("list",))
+
+        assert 'requests_total{route="list"} 1' in registry.render().splitlines()
+
+
+class TestRouteName:
+    @pytest.mark.parametrize(
+        ("method", "path", "expected"),
+        [
+            ("GET", "/r/abc", "redirect"),
+            ("GET", "/api/links", "list"),
+            ("POST", "/api/links", "create"),
+            ("POST", "/api/links/bulk", "bulk_create"),
+            ("GET", "/api/links/12", "get"),
+            ("GET", "/api/links/12/stats", "stats"),
+            ("PUT", "/api/links/12", "update"),
+            ("DELETE", "/api/links/12", "delete"),
+            ("DELETE", "/api/links", "delete"),
+            ("GET", "/api/links/export", "export"),
+            ("GET", "/api/links/abc", "other"),
+            ("GET", "/api/admin/cache", "admin"),
+            ("GET", "/wp-login.php", "other"),
+        ],
+    )
+    def test_routes(self, method, path, expected):
+        assert route_name(method, path) == expected
+
+
+class TestDatabaseMetrics:
+    @pytest.mark.parametrize(
+        ("statement", "expected"),
+        [
+            ("SELECT 1", "select"),
+            ("\n  insert into links", "insert"),
+            ("PRAGMA data_version", "other"),
+            ("", "other"),
+        ],
+    )
+    def test_statement_operation(self, statement, expected):
+        assert statement_operation(statement) == expected
+
+    @pytest.mark.asyncio
+    async def test_engine_events_observe_queries(self, async_session):
+        instrument_engine(async_session.bind, "test")
+        before = db_query_duration.count(("test", "select"))
+
+        await async_session.execute(text("SELECT 1"))
+
+        assert db_query_duration.count(("test", "select")) == before + 1
+
+
+class TestMetricsEndpoint:
+    @pytest.mark.asyncio
+    async def test_requests_are_counted_by_route(self, async_client, sample_links):
+        before = http_request_duration.count(("redirect",))
+
+        await async_client.get("/r/link1", follow_redirects=False)
+        await async_client.get("/api/links")
+        response = await async_client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert http_request_duration.count(("redirect",)) == before + 1
+        assert 'http_requests_total{route="redirect",method="GET",status="301"' in response.text
+        assert 'http_requests_total{route="list",method="GET",status="200"' in response.text
+        assert 'http_requests_in_progress{route="metrics"' in response.text
+        assert "redirect_cache_entries" in response.text
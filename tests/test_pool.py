@@ -0,0 +1,54 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.main import app
+from app.pool import InstrumentedAsyncQueuePool, describe_pool
+
+
+@pytest.fixture
+async def pooled_engine(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    yield engine
+    await engine.dispose()
+
+
+class TestInstrumentedPool:
+    @pytest.mark.asyncio
+    async def test_records_acquisitions(self, pooled_engine):
+        async with pooled_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            info = describe_pool(pooled_engine.pool)
+
+        assert info["pool_class"] == "InstrumentedAsyncQueuePool"
+        assert info["size"] == 1
+        assert info["checked_out"] == 1
+        assert info["acquisitions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_counts_timeouts(self, pooled_engine):
+        async with pooled_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            with pytest.raises(exc.TimeoutError):
+                async with pooled_engine.connect():
+                    pass
+
+        assert describe_pool(pooled_engine.pool)["timeouts"] == 1
+
+
+class TestPoolEndpoint:
+    @pytest.mark.asyncio
+    async def test_pool_endpoint(self):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/admin/pool")
+
+        assert response.status_code == 200
+        assert "pool_class" in response.json()
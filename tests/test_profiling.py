@@ -0,0 +1,182 @@
+import marshal
+import os
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import settings
+from app.main import app
+from app.profiling import ProfileStore, ProfilingMiddleware, profile_store
+
+
+def busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+async def handler(scope, receive, send):
+    busy(1000)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+@pytest.fixture
+def profiled(monkeypatch):
+    def make(token: str = "", sample_rate: float = 0.0, capacity: int = 5):
+        monkeypatch.setattr(settings, "profiling_token", token)
+        monkeypatch.setattr(settings, "profiling_sample_rate", sample_rate)
+        store = ProfileStore(capacity=capacity)
+        middleware = ProfilingMiddleware(handler, store=store)
+        client = AsyncClient(transport=ASGITransport(app=middleware), base_url="http://test")
+        return client, store
+
+    return make
+
+
+class TestProfilingMiddleware:
+    @pytest.mark.asyncio
+    async def test_profiles_request_with_token(self, profiled):
+        client, store = profiled(token="secret")
+
+        async with client:
+            response = await client.get("/api/links", headers={"X-Profile": "secret"})
+
+        assert response.status_code == 200
+        entry = store.get(response.headers["x-profile-id"])
+        assert entry.to_dict()["path"] == "/api/links"
+        assert entry.trigger == "header"
+        assert entry.status == 200
+        assert "busy" in entry.report()
+
+    @pytest.mark.asyncio
+    async def test_wrong_or_missing_token_is_not_profiled(self, profiled):
+        client, store = profiled(token="secret")
+
+        async with client:
+            wrong = await client.get("/", headers={"X-Profile": "guess"})
+            missing = await client.get("/")
+
+        assert "x-profile-id" not in wrong.headers
+        assert "x-profile-id" not in missing.headers
+        assert list(store.profiles) == []
+
+    @pytest.mark.asyncio
+    async def test_sample_rate(self, profiled):
+        client, store = profiled(sample_rate=1.0)
+
+        async with client:
+            await client.get("/")
+            await client.get("/api/admin/profiles")
+
+        assert [entry.trigger for entry in store.profiles] == ["sample"]
+
+    @pytest.mark.asyncio
+    async def test_store_is_bounded(self, profiled):
+        client, store = profiled(sample_rate=1.0, capacity=2)
+
+        async with client:
+            for _ in range(4):
+                await client.get("/")
+
+        assert [entry["id"] for entry in store.snapshot()["profiles"]] == [
+            f"{os.getpid()}-4",
+            f"{os.getpid()}-3",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_dump_is_pstats_file(self, profiled):
+        client, store = profiled(sample_rate=1.0)
+
+        async with client:
+            await client.get("/")
+
+        stats = marshal.loads(store.profiles[0].dump())
+        assert any(function == "busy" for _, _, function in stats)
+
+    @pytest.mark.asyncio
+    async def test_profile_is_readable_from_another_worker(self, profiled, tmp_path):
+        client, store = profiled(sample_rate=1.0)
+        store.directory = str(tmp_path)
+        other_worker = ProfileStore(directory=str(tmp_path))
+
+        async with client:
+            response = await client.get("/api/links")
+
+        profile_id = response.headers["x-profile-id"]
+        entry = other_worker.get(profile_id)
+        assert entry.path == "/api/links"
+        assert "busy" in entry.report()
+        assert any(function == "busy" for _, _, function in marshal.loads(entry.dump()))
+        assert [meta["id"] for meta in other_worker.snapshot()["profiles"]] == [profile_id]
+
+    @pytest.mark.asyncio
+    async def test_shared_directory_is_bounded(self, profiled, tmp_path):
+        client, store = profiled(sample_rate=1.0, capacity=2)
+        store.directory = str(tmp_path)
+
+        async with client:
+            for _ in range(3):
+                await client.get("/")
+
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            f"{os.getpid()}-2.json",
+            f"{os.getpid()}-2.prof",
+            f"{os.getpid()}-3.json",
+            f"{os.getpid()}-3.prof",
+        ]
+        store.clear()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_shared_directory_rejects_foreign_ids(self, tmp_path):
+        (tmp_path / "secret.json").write_text("{}")
+
+        assert ProfileStore(directory=str(tmp_path)).get("../secret") is None
+
+    def test_disabled_by_default(self):
+        assert settings.profiling_token == ""
+        assert settings.profiling_sample_rate == 0
+        assert ProfilingMiddleware not in [middleware.cls for middleware in app.user_middleware]
+
+
+class TestProfileEndpoints:
+    @pytest.fixture
+    async def stored_profile(self, monkeypatch):
+        monkeypatch.setattr(settings, "profiling_sample_rate", 1.0)
+        profile_store.clear()
+        middleware = ProfilingMiddleware(handler)
+        async with AsyncClient(transport=ASGITransport(app=middleware), base_url="http://x") as c:
+            response = await c.get("/api/links")
+        yield response.headers["x-profile-id"]
+        profile_store.clear()
+
+    @pytest.mark.asyncio
+    async def test_list_report_and_dump(self, async_client, stored_profile):
+        listing = await async_client.get("/api/admin/profiles")
+        assert listing.json()["profiles"][0]["id"] == stored_profile
+
+        report = await async_client.get(
+            f"/api/admin/profiles/{stored_profile}", params={"sort": "tottime", "limit": 5}
+        )
+        assert report.status_code == 200
+        assert report.headers["content-type"].startswith("text/plain")
+        assert "function calls" in report.text
+
+        dump = await async_client.get(f"/api/admin/profiles/{stored_profile}/pstats")
+        assert dump.status_code == 200
+        assert marshal.loads(dump.content)
+
+    @pytest.mark.asyncio
+    async def test_unknown_profile_and_sort(self, async_client, stored_profile):
+        missing = await async_client.get("/api/admin/profiles/1-999999")
+        assert missing.status_code == 404
+
+        bad_sort = await async_client.get(
+            f"/api/admin/profiles/{stored_profile}", params={"sort": "nope"}
+        )
+        assert bad_sort.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_clear(self, async_client, stored_profile):
+        response = await async_client.delete("/api/admin/profiles")
+
+        assert response.status_code == 204
+        assert profile_store.snapshot()["profiles"] == []
@@ -0,0 +1,99 @@
+import argparse
+import os
+
+from app.serve import (
+    MAX_DEFAULT_WORKERS,
+    cgroup_cpu_limit,
+    prepare_metrics_dir,
+    uvicorn_options,
+    worker_count,
+)
+
+
+def make_args(**overrides) -> argparse.Namespace:
+    defaults = {
+        "workers": 0,
+        "uds": "/tmp/app.sock",
+        "host": "127.0.0.1",
+        "port": None,
+        "keepalive_timeout": 75,
+        "log_level": "info",
+        "access_log": True,
+    }
+    return argparse.Namespace(**{**defaults, **overrides})
+
+
+class TestWorkerCount:
+    def test_explicit_count_wins(self):
+        assert worker_count(3) == 3
+
+    def test_defaults_to_available_cpus(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("os.process_cpu_count", lambda: 2)
+        monkeypatch.setattr("app.serve.CGROUP_CPU_MAX", str(tmp_path / "missing"))
+
+        assert worker_count(0) == 2
+
+    def test_default_is_capped(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("os.process_cpu_count", lambda: 64)
+        monkeypatch.setattr("app.serve.CGROUP_CPU_MAX", str(tmp_path / "missing"))
+
+        assert worker_count(0) == MAX_DEFAULT_WORKERS
+
+    def test_container_quota_limits_default(self, monkeypatch, tmp_path):
+        cpu_max = tmp_path / "cpu.max"
+        cpu_max.write_text("150000 100000\n")
+        monkeypatch.setattr("os.process_cpu_count", lambda: 64)
+        monkeypatch.setattr("app.serve.CGROUP_CPU_MAX", str(cpu_max))
+
+        assert worker_count(0) == 2
+
+    def test_unlimited_cgroup_has_no_quota(self, tmp_path):
+        cpu_max = tmp_path / "cpu.max"
+        cpu_max.write_text("max 100000\n")
+
+        assert cgroup_cpu_limit(str(cpu_max)) is None
+
+
+class TestUvicornOptions:
+    def test_unix_socket_replaces_stale_file(self, tmp_path):
+        socket_path = tmp_path / "run" / "uvicorn.sock"
+        socket_path.parent.mkdir()
+        socket_path.write_text("left over after a crash")
+
+        options = uvicorn_options(make_args(workers=4, uds=str(socket_path)))
+
+        assert options["uds"] == str(socket_path)
+        assert options["workers"] == 4
+        assert not socket_path.exists()
+
+    def test_socket_directory_is_created(self, tmp_path):
+        socket_path = tmp_path / "missing" / "uvicorn.sock"
+
+        uvicorn_options(make_args(uds=str(socket_path)))
+
+        assert socket_path.parent.is_dir()
+
+    def test_port_switches_to_tcp(self):
+        options = uvicorn_options(make_args(port=8000))
+
+        assert (options["host"], options["port"]) == ("127.0.0.1", 8000)
+        assert "uds" not in options
+        assert options["timeout_keep_alive"] == 75
+
+
+class TestMetricsDir:
+    def test_stale_worker_files_are_removed(self, tmp_path, monkeypatch):
+        (tmp_path / "4242.json").write_text("{}")
+        (tmp_path / "keep.txt").write_text("")
+        monkeypatch.setattr("app.serve.settings.metrics_dir", str(tmp_path))
+
+        assert prepare_metrics_dir() == str(tmp_path)
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["keep.txt"]
+
+    def test_temporary_directory_by_default(self, monkeypatch):
+        monkeypatch.setattr("app.serve.settings.metrics_dir", "")
+
+        directory = prepare_metrics_dir()
+
+        assert os.path.isdir(directory)
+        os.rmdir(directory)
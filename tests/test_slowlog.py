@@ -0,0 +1,163 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.slowlog import SlowQueryLog, fingerprint, slow_query_log
+
+
+class TestFingerprint:
+    @pytest.mark.parametrize(
+        ("statement", "expected"),
+        [
+            (
+                "SELECT * FROM links WHERE short_name = 'abc' AND id > 10",
+                "SELECT * FROM links WHERE short_name = ? AND id > ?",
+            ),
+            (
+                "SELECT id FROM links WHERE id IN (?, ?, ?)",
+                "SELECT id FROM links WHERE id IN (...)",
+            ),
+            (
+                "SELECT id FROM links WHERE id IN ($1, $2)",
+                "SELECT id FROM links WHERE id IN (...)",
+            ),
+            (
+                "INSERT INTO links (a, b) VALUES (?, ?), (?, ?), (?, ?)",
+                "INSERT INTO links (a, b) VALUES (...), ...",
+            ),
+            ("SELECT\n  1\n   FROM t", "SELECT ? FROM t"),
+        ],
+    )
+    def test_normalization(self, statement, expected):
+        assert fingerprint(statement) == expected
+
+    def test_list_length_does_not_split_fingerprints(self):
+        assert fingerprint("SELECT 1 WHERE x IN (?, ?)") == fingerprint(
+            "SELECT 1 WHERE x IN (?, ?, ?, ?)"
+        )
+
+
+class TestSlowQueryLog:
+    def test_ring_buffer_keeps_latest_entries(self):
+        log = SlowQueryLog(threshold_ms=0, capacity=3, explain=False)
+
+        for i in range(5):
+            log.record(f"SELECT {i}", (), float(i), "main")
+
+        recent = log.snapshot()["recent"]
+        assert [entry["statement"] for entry in recent] == ["SELECT 4", "SELECT 3", "SELECT 2"]
+
+    def test_aggregates_by_fingerprint(self):
+        log = SlowQueryLog(threshold_ms=0, capacity=10, explain=False)
+
+        for duration in range(1, 101):
+            log.record(f"SELECT * FROM t WHERE id = {duration}", (), float(duration), "main")
+        log.record("DELETE FROM t", (), 5000.0, "main")
+
+        fingerprints = log.snapshot()["fingerprints"]
+        assert [item["fingerprint"] for item in fingerprints] == [
+            "SELECT * FROM t WHERE id = ?",
+            "DELETE FROM t",
+        ]
+        assert fingerprints[0]["count"] == 100
+        assert fingerprints[0]["p50_ms"] == 51.0
+        assert fingerprints[0]["p99_ms"] == 100.0
+        assert fingerprints[0]["max_ms"] == 100.0
+
+    def test_clear(self):
+        log = SlowQueryLog(threshold_ms=0, explain=False)
+        log.record("SELECT 1", (), 1.0, "main")
+
+        log.clear()
+
+        assert log.snapshot()["recent"] == []
+        assert log.snapshot()["fingerprints"] == []
+
+
+class TestEngineInstrumentation:
+    @pytest.fixture
+    async def engine(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'slow.db'}")
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+            await conn.execute(text("CREATE INDEX ix_items_name ON items (name)"))
+        yield engine
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_captures_plan_once_per_fingerprint(self, engine):
+        log = SlowQueryLog(threshold_ms=0, capacity=50)
+        log.instrument(engine, "test")
+
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT id FROM items WHERE name = :name"), {"name": "a"})
+            await log.wait_for_explains()
+            await conn.execute(text("SELECT id FROM items WHERE name = :name"), {"name": "b"})
+            await log.wait_for_explains()
+
+        snapshot = log.snapshot()
+        # Запросы самого EXPLAIN в журнал не попадают
+        assert all(not entry["statement"].startswith("EXPLAIN") for entry in snapshot["recent"])
+        (stats,) = [
+            item for item in snapshot["fingerprints"] if item["fingerprint"].startswith("SELECT id")
+        ]
+        assert stats["count"] == 2
+        assert any("ix_items_name" in line for line in stats["plan"])
+        assert snapshot["recent"][0]["plan"] == stats["plan"]
+        assert snapshot["explain_failures"] == 0
+
+    @pytest.mark.asyncio
+    async def test_fast_queries_are_not_recorded(self, engine):
+        log = SlowQueryLog(threshold_ms=10_000)
+        log.instrument(engine, "test")
+
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+        assert log.snapshot()["recent"] == []
+
+    @pytest.mark.asyncio
+    async def test_executemany_and_inserts_are_not_explained(self, engine):
+        log = SlowQueryLog(threshold_ms=0)
+        log.instrument(engine, "test")
+
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("INSERT INTO items (name) VALUES (:name)"), [{"name": "a"}, {"name": "b"}]
+            )
+            await conn.execute(
+                text("UPDATE items SET name = :new WHERE name = :old"),
+                [{"new": "c", "old": "a"}, {"new": "d", "old": "b"}],
+            )
+        await log.wait_for_explains()
+
+        assert all(item["plan"] is None for item in log.snapshot()["fingerprints"])
+
+    @pytest.mark.asyncio
+    async def test_explain_failure_is_recorded(self, engine):
+        log = SlowQueryLog(threshold_ms=0)
+
+        log.record("SELECT * FROM missing_table", (), 1.0, "test", explain_engine=engine)
+        await log.wait_for_explains()
+
+        (stats,) = log.snapshot()["fingerprints"]
+        assert stats["plan"][0].startswith("EXPLAIN failed")
+        assert log.explain_failures == 1
+
+
+class TestSlowQueryEndpoint:
+    @pytest.mark.asyncio
+    async def test_snapshot_and_clear(self, async_client):
+        slow_query_log.clear()
+        slow_query_log.record("SELECT * FROM links WHERE id = 1", (), 250.0, "main")
+
+        response = await async_client.get("/api/admin/slow-queries", params={"limit": 5})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["fingerprints"][0]["fingerprint"] == "SELECT * FROM links WHERE id = ?"
+        assert data["recent"][0]["duration_ms"] == 250.0
+
+        response = await async_client.delete("/api/admin/slow-queries")
+        assert response.status_code == 204
+        assert slow_query_log.snapshot()["recent"] == []